@@ -0,0 +1,195 @@
+# === File: schedules-ai/api/admission.py ===
+
+"""
+Admission Control for Schedule Generation Endpoints.
+
+Every generation runs a CP-SAT solve and usually LLM calls; admitting an
+unbounded burst makes all of them slow instead of some of them fast. The
+`AdmissionController` of each API worker process:
+
+- runs at most `max_concurrent` generations at once,
+- lets one user hold at most `max_per_user` of those slots (running or
+  waiting); further requests get `429 Too Many Requests`,
+- parks requests over capacity in a bounded FIFO wait queue; when the queue is
+  full, or a request waited `queue_timeout_seconds`, it gets
+  `503 Service Unavailable`.
+
+Rejections carry a `Retry-After` estimate derived from the recent service
+time, so clients back off instead of retrying immediately. Because admitted
+requests never share the worker with more than `max_concurrent` others, their
+latency stays bounded under overload; the excess is shed up front.
+"""
+
+import asyncio
+import logging
+import math
+import time as time_module
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AdmissionRejected(Exception):
+    """The request was not admitted; answer with `status_code` and `Retry-After`."""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int) -> None:
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class AdmissionTicket:
+    """One admitted request; `release` is idempotent."""
+
+    controller: "AdmissionController" = field(repr=False)
+    user_id: Optional[Hashable]
+    admitted_at: float
+    queue_wait: float = 0.0
+    released: bool = False
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """
+    Per-process concurrency limiter with per-user limits and a bounded wait queue.
+
+    Used from one event loop, so it needs no locks. A released slot is handed
+    directly to the oldest waiter, so waiting requests are served in order.
+    """
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Args:
+            config: Limits (see `admission` in `api.dependencies.app_config`).
+        """
+        config = config or {}
+        self.max_concurrent = max(1, int(config.get("max_concurrent", 8)))
+        self.max_per_user = max(1, int(config.get("max_per_user", 2)))
+        self.max_queued = max(0, int(config.get("max_queued", 32)))
+        self.queue_timeout = max(0.0, float(config.get("queue_timeout_seconds", 10.0)))
+        self._running = 0
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+        self._per_user: Dict[Hashable, int] = {}
+        self._service_seconds = 1.0  # Moving average of the slot hold time.
+        self._waits: Deque[float] = deque(maxlen=512)
+        self._admitted = 0
+        self._rejected = {"user_limit": 0, "queue_full": 0, "queue_timeout": 0}
+
+    # --- Public API ---
+
+    @asynccontextmanager
+    async def admit(self, user_id: Optional[Hashable] = None) -> AsyncIterator[AdmissionTicket]:
+        """Holds one generation slot for the duration of the block."""
+        ticket = await self.acquire(user_id)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    async def acquire(self, user_id: Optional[Hashable] = None) -> AdmissionTicket:
+        """
+        Waits for a generation slot; pair with `AdmissionTicket.release`.
+
+        Args:
+            user_id: Owner of the request for the per-user limit; None exempts
+                the request from it (e.g. multi-user bulk requests).
+
+        Raises:
+            AdmissionRejected: 429 over the per-user limit, 503 when the wait
+                queue is full or the wait timed out.
+        """
+        if user_id is not None and self._per_user.get(user_id, 0) >= self.max_per_user:
+            self._rejected["user_limit"] += 1
+            raise AdmissionRejected(
+                429, f"At most {self.max_per_user} concurrent generations per user.", self._retry_after(0)
+            )
+        if self._running < self.max_concurrent and not self._waiters:
+            self._running += 1
+            return self._admit(user_id, 0.0)
+        if len(self._waiters) >= self.max_queued:
+            self._rejected["queue_full"] += 1
+            raise AdmissionRejected(503, "Generation capacity exhausted.", self._retry_after(len(self._waiters)))
+
+        future: "asyncio.Future[None]" = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        if user_id is not None:
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        enqueued = time_module.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            self._forget_user(user_id)
+            if future.done() and not future.cancelled():
+                self._handoff()  # The slot arrived just now; pass it on.
+            else:
+                future.cancel()
+                self._waiters.remove(future)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self._rejected["queue_timeout"] += 1
+            raise AdmissionRejected(
+                503, f"No generation slot within {self.queue_timeout:g}s.", self._retry_after(len(self._waiters))
+            )
+        self._forget_user(user_id)  # Counted again by `_admit`.
+        return self._admit(user_id, time_module.monotonic() - enqueued)
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns running and queued requests, limits, counters and wait percentiles."""
+        waits = sorted(self._waits)
+        return {
+            "running": self._running,
+            "queued": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "admitted": self._admitted,
+            "rejected": dict(self._rejected),
+            "queue_wait_ms_p50": round(waits[len(waits) // 2] * 1000, 1) if waits else 0.0,
+            "queue_wait_ms_p99": round(waits[min(len(waits) - 1, int(len(waits) * 0.99))] * 1000, 1) if waits else 0.0,
+            "mean_service_seconds": round(self._service_seconds, 3),
+        }
+
+    # --- Internals ---
+
+    def _admit(self, user_id: Optional[Hashable], queue_wait: float) -> AdmissionTicket:
+        if user_id is not None:
+            self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+        self._admitted += 1
+        self._waits.append(queue_wait)
+        return AdmissionTicket(self, user_id, time_module.monotonic(), queue_wait)
+
+    def _release(self, ticket: AdmissionTicket) -> None:
+        held = time_module.monotonic() - ticket.admitted_at
+        self._service_seconds = 0.8 * self._service_seconds + 0.2 * held
+        self._forget_user(ticket.user_id)
+        self._handoff()
+
+    def _handoff(self) -> None:
+        """Passes a freed slot to the oldest live waiter, or returns it."""
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                future.set_result(None)
+                return
+        self._running -= 1
+
+    def _forget_user(self, user_id: Optional[Hashable]) -> None:
+        if user_id is None:
+            return
+        remaining = self._per_user.get(user_id, 0) - 1
+        if remaining > 0:
+            self._per_user[user_id] = remaining
+        else:
+            self._per_user.pop(user_id, None)
+
+    def _retry_after(self, ahead: int) -> int:
+        """Seconds until a slot is likely free for a request behind `ahead` waiters."""
+        return max(1, math.ceil(self._service_seconds * (ahead + 1) / self.max_concurrent))
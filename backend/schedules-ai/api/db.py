@@ -6,9 +6,10 @@ Database module for the API.
 This module provides functions to connect to the PostgreSQL database and execute queries.
 """
 
+import json
 import logging
 import os
-from typing import Optional
+from typing import Any, Dict, Optional
 
 import asyncpg
 
@@ -231,6 +232,104 @@ async def delete_schedule_from_db(schedule_id, user_id):
         logger.error(f"Error deleting schedule from database: {e}")
         return False
 
+# --- Pre-generated Schedule Operations ---
+
+async def save_pregenerated_schedule(user_id, target_date, input_hash, schedule_data):
+    """
+    Save (or replace) a pre-generated schedule for a user and date.
+
+    Args:
+        user_id: The ID of the user.
+        target_date: The date the schedule applies to.
+        input_hash: Fingerprint of the inputs the schedule was generated from.
+        schedule_data: The schedule data as a JSON-serializable dict.
+
+    Returns:
+        True if the schedule was saved successfully, False otherwise.
+    """
+    pool = await get_db_pool()
+    try:
+        async with pool.acquire() as conn:
+            await conn.execute("""
+                INSERT INTO pregenerated_schedules (
+                    user_id,
+                    target_date,
+                    input_hash,
+                    schedule_data
+                ) VALUES (
+                    $1, $2, $3, $4
+                )
+                ON CONFLICT (user_id, target_date) DO UPDATE SET
+                    input_hash = $3,
+                    schedule_data = $4,
+                    updated_at = NOW()
+            """,
+            str(user_id),
+            target_date,
+            input_hash,
+            json.dumps(schedule_data, default=str))
+        logger.info(f"Pre-generated schedule for user {user_id} on {target_date} saved to database.")
+        return True
+    except Exception as e:
+        logger.error(f"Error saving pre-generated schedule to database: {e}")
+        return False
+
+
+async def get_pregenerated_schedule(user_id, target_date) -> Optional[Dict[str, Any]]:
+    """
+    Get a pre-generated schedule for a user and date.
+
+    Args:
+        user_id: The ID of the user.
+        target_date: The date the schedule applies to.
+
+    Returns:
+        A dict with `input_hash` and `schedule_data`, or None if not found.
+    """
+    pool = await get_db_pool()
+    try:
+        async with pool.acquire() as conn:
+            result = await conn.fetchrow("""
+                SELECT input_hash, schedule_data
+                FROM pregenerated_schedules
+                WHERE user_id = $1 AND target_date = $2
+            """, str(user_id), target_date)
+
+            if result:
+                schedule_data = result['schedule_data']
+                if isinstance(schedule_data, str):
+                    schedule_data = json.loads(schedule_data)
+                return {'input_hash': result['input_hash'], 'schedule_data': schedule_data}
+            return None
+    except Exception as e:
+        logger.error(f"Error getting pre-generated schedule from database: {e}")
+        return None
+
+
+async def delete_pregenerated_schedules(user_id, keep_input_hash=None):
+    """
+    Delete a user's pre-generated schedules, e.g. after their inputs changed.
+
+    Args:
+        user_id: The ID of the user.
+        keep_input_hash: If given, rows generated from this fingerprint are kept.
+
+    Returns:
+        The number of deleted rows (0 on error).
+    """
+    pool = await get_db_pool()
+    try:
+        async with pool.acquire() as conn:
+            result = await conn.execute("""
+                DELETE FROM pregenerated_schedules
+                WHERE user_id = $1 AND ($2::TEXT IS NULL OR input_hash <> $2)
+            """, str(user_id), keep_input_hash)
+
+            return int(result.split()[-1])
+    except Exception as e:
+        logger.error(f"Error deleting pre-generated schedules from database: {e}")
+        return 0
+
 # --- Database Schema ---
 
 async def create_tables():
@@ -264,6 +363,18 @@ async def create_tables():
                 )
             """)
 
+            await conn.execute("""
+                CREATE TABLE IF NOT EXISTS pregenerated_schedules (
+                    user_id TEXT NOT NULL,
+                    target_date DATE NOT NULL,
+                    input_hash TEXT NOT NULL,
+                    schedule_data JSONB NOT NULL,
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                    PRIMARY KEY (user_id, target_date)
+                )
+            """)
+
             logger.info("Database tables created or already exist.")
     except Exception as e:
         logger.error(f"Error creating database tables: {e}")
@@ -0,0 +1,195 @@
+# === File: schedules-ai/api/idempotency.py ===
+
+"""
+Idempotency Keys for Non-idempotent Endpoints.
+
+Mobile clients retry `POST` requests on flaky networks without knowing whether
+the first attempt reached the server. A client that sends an
+`Idempotency-Key` header gets at most one execution per key:
+
+- the first request runs and its successful (2xx) response is stored for
+  `ttl_seconds`,
+- a duplicate arriving while the first one still runs waits for it and gets
+  the same response,
+- a later duplicate gets the stored response replayed (marked with the
+  `Idempotent-Replayed: true` header) without running the endpoint again,
+- reusing a key with a different request body is rejected (422).
+
+Keys are scoped per endpoint and user. Failed requests (exceptions and non-2xx
+responses) are not stored, so the client can retry them with the same key;
+waiting duplicates then run the request themselves.
+
+The store is per process: duplicates hitting different API replicas are not
+coalesced.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import time as time_module
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# Response headers replayed together with the body.
+_REPLAYED_HEADERS = ("location", "retry-after")
+
+
+class IdempotencyKeyConflict(Exception):
+    """The key was already used with a different request."""
+
+
+def request_fingerprint(payload: Any) -> str:
+    """SHA-256 of the JSON-encoded request, used to detect key reuse."""
+    encoded = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class StoredResponse:
+    """A response captured for replay."""
+
+    status_code: int
+    body: Any
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def capture(cls, result: Any, status_code: int) -> "StoredResponse":
+        """
+        Captures an endpoint result.
+
+        Args:
+            result: A `Response` (JSON body) or a value FastAPI would serialize.
+            status_code: Status of the endpoint when it returns a plain value.
+        """
+        if isinstance(result, Response):
+            body = json.loads(result.body) if result.body else None
+            headers = {k: v for k, v in result.headers.items() if k.lower() in _REPLAYED_HEADERS}
+            return cls(status_code=result.status_code, body=body, headers=headers)
+        return cls(status_code=status_code, body=jsonable_encoder(result))
+
+    def to_response(self, replayed: bool) -> JSONResponse:
+        headers = dict(self.headers)
+        if replayed:
+            headers[REPLAYED_HEADER] = "true"
+        return JSONResponse(status_code=self.status_code, content=self.body, headers=headers)
+
+
+@dataclass
+class _Entry:
+    fingerprint: str
+    future: "asyncio.Future[Optional[StoredResponse]]" = field(repr=False)
+    expires_at: float = math.inf  # Set when the response is stored.
+
+
+class IdempotencyStore:
+    """
+    In-memory TTL store of responses keyed by (scope, idempotency key).
+
+    Used from one event loop, so it needs no locks. Holds at most
+    `max_entries` keys; the oldest are dropped first.
+    """
+
+    def __init__(self, ttl_seconds: float = 24 * 3600, max_entries: int = 10000) -> None:
+        """
+        Args:
+            ttl_seconds: How long a completed response is replayed.
+            max_entries: Maximum number of stored keys.
+        """
+        self._ttl = max(0.0, float(ttl_seconds))
+        self._max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._executed = 0
+        self._replayed = 0
+        self._coalesced = 0
+        self._conflicts = 0
+
+    async def run(
+        self,
+        scope: str,
+        key: str,
+        fingerprint: str,
+        produce: Callable[[], Awaitable[Any]],
+        status_code: int = 200,
+    ) -> Tuple[StoredResponse, bool]:
+        """
+        Runs `produce` once per (scope, key), or returns its stored response.
+
+        Args:
+            scope: Endpoint and user the key belongs to.
+            key: Client-supplied idempotency key.
+            fingerprint: `request_fingerprint` of the request.
+            produce: Runs the endpoint; exceptions propagate and nothing is stored.
+            status_code: Status of `produce` results that are not a `Response`.
+
+        Raises:
+            IdempotencyKeyConflict: The key was used with a different request.
+
+        Returns:
+            The response and whether it is a replay.
+        """
+        entry_key = (scope, key)
+        while True:
+            entry = self._lookup(entry_key)
+            if entry is None:
+                break
+            if entry.fingerprint != fingerprint:
+                self._conflicts += 1
+                raise IdempotencyKeyConflict(f"{IDEMPOTENCY_HEADER} was already used with a different request.")
+            if not entry.future.done():
+                self._coalesced += 1
+            stored = await asyncio.shield(entry.future)
+            if stored is not None:
+                self._replayed += 1
+                return stored, True
+            # The first request failed and was forgotten; run it (again) here.
+
+        entry = _Entry(fingerprint, asyncio.get_running_loop().create_future())
+        self._entries[entry_key] = entry
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+        self._executed += 1
+        try:
+            stored = StoredResponse.capture(await produce(), status_code)
+        except BaseException:
+            self._forget(entry_key, entry)
+            entry.future.set_result(None)
+            raise
+        if 200 <= stored.status_code < 300:
+            entry.expires_at = time_module.monotonic() + self._ttl
+            entry.future.set_result(stored)
+        else:
+            self._forget(entry_key, entry)
+            entry.future.set_result(None)
+        return stored, False
+
+    def stats(self) -> Dict[str, int]:
+        """Stored keys, executions, replays, coalesced duplicates and key conflicts."""
+        return {
+            "entries": len(self._entries),
+            "executed": self._executed,
+            "replayed": self._replayed,
+            "coalesced": self._coalesced,
+            "conflicts": self._conflicts,
+        }
+
+    def _lookup(self, entry_key: Tuple[str, str]) -> Optional[_Entry]:
+        entry = self._entries.get(entry_key)
+        if entry is not None and entry.expires_at <= time_module.monotonic():
+            del self._entries[entry_key]
+            return None
+        return entry
+
+    def _forget(self, entry_key: Tuple[str, str], entry: _Entry) -> None:
+        if self._entries.get(entry_key) is entry:
+            del self._entries[entry_key]
@@ -0,0 +1,30 @@
+# === File: schedules-ai/api/jobs/__init__.py ===
+
+"""
+Background Jobs Package for the Scheduler Core API.
+
+This package contains long-running jobs started from the application lifespan,
+such as off-peak schedule pre-generation and the asynchronous generation job queue.
+"""
+
+from api.jobs.generation_queue import (
+    GenerationJob,
+    GenerationJobQueue,
+    JobStatus,
+    QueueFullError,
+)
+from api.jobs.pregeneration import (
+    ActiveUserRegistry,
+    PregenerationJob,
+    input_fingerprint,
+)
+
+__all__ = [
+    "ActiveUserRegistry",
+    "GenerationJob",
+    "GenerationJobQueue",
+    "JobStatus",
+    "PregenerationJob",
+    "QueueFullError",
+    "input_fingerprint",
+]
@@ -0,0 +1,342 @@
+# === File: schedules-ai/api/jobs/pregeneration.py ===
+
+"""
+Week-ahead Schedule Pre-generation.
+
+Most users open the app in the morning, so schedule generation sees a sharp
+traffic spike. This job pre-computes next-day (or next-N-day) schedules for
+recently active users during off-peak hours and persists them via `api.db`, so
+`GET /v1/schedule/{user_id}/{target_date}` can serve them directly.
+
+The inputs for a user are taken from their latest interactive generation
+request. A pre-generated schedule is only served while its input fingerprint
+matches the user's current one; rows are deleted when the inputs or
+preferences change. Generation is rate limited and pauses while interactive
+requests are in flight, so it never starves interactive traffic.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import time as time_module
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass, replace
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from src.core.scheduler import GeneratedSchedule, ScheduleInputData, Scheduler
+from src.services.llm_limits import LLMPriority, llm_priority
+
+logger = logging.getLogger(__name__)
+
+
+def input_fingerprint(payload: Dict[str, Any]) -> str:
+    """
+    Computes a stable fingerprint of date-independent generation inputs.
+
+    Args:
+        payload: JSON-serializable request data (without the target date).
+
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    encoded = json.dumps(payload, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def schedule_to_record(schedule: GeneratedSchedule) -> Dict[str, Any]:
+    """Converts a GeneratedSchedule into a JSON-serializable dict for storage."""
+    record = asdict(schedule)
+    record["user_id"] = str(schedule.user_id)
+    record["schedule_id"] = str(schedule.schedule_id)
+    record["target_date"] = schedule.target_date.isoformat()
+    record["generation_timestamp"] = schedule.generation_timestamp.isoformat()
+    return record
+
+
+def schedule_from_record(record: Dict[str, Any]) -> GeneratedSchedule:
+    """Rebuilds a GeneratedSchedule from a dict produced by `schedule_to_record`."""
+    return GeneratedSchedule(
+        user_id=UUID(record["user_id"]),
+        target_date=date.fromisoformat(record["target_date"]),
+        schedule_id=UUID(record["schedule_id"]),
+        scheduled_items=record.get("scheduled_items", []),
+        metrics=record.get("metrics", {}),
+        explanations=record.get("explanations", {}),
+        generation_timestamp=datetime.fromisoformat(record["generation_timestamp"]),
+        warnings=record.get("warnings", []),
+        version=record.get("version", 1),
+        refinement_status=record.get("refinement_status"),
+    )
+
+
+@dataclass
+class ActiveUser:
+    """Latest known generation inputs of a recently active user."""
+
+    template: ScheduleInputData
+    input_hash: str
+    last_seen: datetime
+
+
+class ActiveUserRegistry:
+    """
+    In-process registry of recently active users and their latest inputs.
+
+    Bounded in size; the least recently seen users are dropped first.
+    """
+
+    def __init__(self, max_users: int = 10000) -> None:
+        self._max_users = max(1, int(max_users))
+        self._users: "OrderedDict[UUID, ActiveUser]" = OrderedDict()
+
+    def record(self, input_data: ScheduleInputData, input_hash: str) -> bool:
+        """
+        Records the inputs of an interactive request.
+
+        Returns:
+            bool: True if the user's inputs changed (or the user was unknown).
+        """
+        previous = self._users.get(input_data.user_id)
+        self._users[input_data.user_id] = ActiveUser(
+            template=input_data,
+            input_hash=input_hash,
+            last_seen=datetime.now(timezone.utc),
+        )
+        self._users.move_to_end(input_data.user_id)
+        while len(self._users) > self._max_users:
+            self._users.popitem(last=False)
+        return previous is None or previous.input_hash != input_hash
+
+    def forget(self, user_id: UUID) -> None:
+        """Drops a user, e.g. after their preferences changed."""
+        self._users.pop(user_id, None)
+
+    def current_hash(self, user_id: UUID) -> Optional[str]:
+        """Returns the fingerprint of the user's latest inputs, if known."""
+        user = self._users.get(user_id)
+        return user.input_hash if user else None
+
+    def active_since(self, since: datetime) -> List[Tuple[UUID, ActiveUser]]:
+        """Returns users seen at or after `since`, most recent last."""
+        return [(uid, u) for uid, u in self._users.items() if u.last_seen >= since]
+
+    def __len__(self) -> int:
+        return len(self._users)
+
+
+class PregenerationJob:
+    """
+    Off-peak background job pre-generating upcoming schedules for active users.
+
+    Storage goes through `api.db` (`save_pregenerated_schedule`,
+    `get_pregenerated_schedule`, `delete_pregenerated_schedules`); another
+    object exposing the same coroutines can be passed instead.
+    """
+
+    def __init__(
+        self,
+        scheduler_factory: Callable[[], Scheduler],
+        config: Optional[Dict[str, Any]] = None,
+        registry: Optional[ActiveUserRegistry] = None,
+        storage: Optional[Any] = None,
+    ) -> None:
+        """
+        Args:
+            scheduler_factory: Builds the Scheduler used for background generation.
+            config: Job configuration (see `pregeneration` in `api.dependencies.app_config`).
+            registry: Registry of active users (created if omitted).
+            storage: Persistence backend; defaults to the `api.db` module.
+        """
+        config = config or {}
+        self.enabled = bool(config.get("enabled", False))
+        self.days_ahead = max(1, int(config.get("days_ahead", 1)))
+        self.active_window = timedelta(days=float(config.get("active_window_days", 7)))
+        self.off_peak_start_hour = int(config.get("off_peak_start_hour", 1))
+        self.off_peak_end_hour = int(config.get("off_peak_end_hour", 5))
+        self.interval_seconds = float(config.get("interval_seconds", 600))
+        max_per_minute = float(config.get("max_per_minute", 30))
+        self._min_spacing = 60.0 / max_per_minute if max_per_minute > 0 else 0.0
+        self.batch_size = max(1, int(config.get("batch_size", 1)))
+
+        self._scheduler_factory = scheduler_factory
+        self.registry = registry or ActiveUserRegistry(config.get("max_users", 10000))
+        if storage is None:
+            import api.db as storage
+        self._storage = storage
+
+        self._generated: Dict[Tuple[UUID, date], str] = {}
+        self._interactive_in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._next_generation = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    # --- Lifecycle ---
+
+    def start(self) -> None:
+        """Starts the background loop (no-op if disabled or already running)."""
+        if not self.enabled or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run_loop())
+        logger.info(
+            f"Pre-generation job started ({self.days_ahead} day(s) ahead, off-peak "
+            f"{self.off_peak_start_hour:02d}:00-{self.off_peak_end_hour:02d}:00 UTC)."
+        )
+
+    async def stop(self) -> None:
+        """Stops the background loop."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        logger.info("Pre-generation job stopped.")
+
+    # --- Interactive Request Hooks ---
+
+    @asynccontextmanager
+    async def interactive(self) -> AsyncIterator[None]:
+        """Marks an interactive generation as in flight; background work pauses meanwhile."""
+        self._interactive_in_flight += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self._interactive_in_flight -= 1
+            if self._interactive_in_flight == 0:
+                self._idle.set()
+
+    async def note_request(self, input_data: ScheduleInputData, input_hash: str) -> None:
+        """
+        Records a user's latest inputs and drops pre-generated schedules built from older ones.
+
+        Args:
+            input_data: Inputs of the interactive request.
+            input_hash: Fingerprint from `input_fingerprint`.
+        """
+        if not self.enabled:
+            return
+        if self.registry.record(input_data, input_hash):
+            try:
+                deleted = await self._storage.delete_pregenerated_schedules(
+                    input_data.user_id, keep_input_hash=input_hash
+                )
+            except Exception as e:
+                # Stale rows are still filtered by fingerprint in `get_fresh`.
+                logger.warning(f"Could not invalidate pre-generated schedules for user {input_data.user_id}: {e}")
+                return
+            if deleted:
+                logger.info(f"Invalidated {deleted} stale pre-generated schedule(s) for user {input_data.user_id}.")
+
+    async def invalidate_user(self, user_id: UUID) -> None:
+        """Drops all pre-generated schedules of a user (e.g. after a preferences update)."""
+        if not self.enabled:
+            return
+        self.registry.forget(user_id)
+        self._generated = {k: v for k, v in self._generated.items() if k[0] != user_id}
+        await self._storage.delete_pregenerated_schedules(user_id)
+
+    async def get_fresh(self, user_id: UUID, target_date: date) -> Optional[GeneratedSchedule]:
+        """
+        Returns a stored pre-generated schedule if it still matches the user's inputs.
+
+        Returns:
+            Optional[GeneratedSchedule]: The schedule, or None if missing or stale.
+        """
+        if not self.enabled:
+            return None
+        row = await self._storage.get_pregenerated_schedule(user_id, target_date)
+        if row is None:
+            return None
+        current_hash = self.registry.current_hash(user_id)
+        if current_hash is not None and row["input_hash"] != current_hash:
+            logger.debug(f"Pre-generated schedule for user {user_id} on {target_date} is stale.")
+            return None
+        return schedule_from_record(row["schedule_data"])
+
+    # --- Generation ---
+
+    def in_off_peak(self, now: Optional[datetime] = None) -> bool:
+        """Returns True if `now` (UTC) falls into the configured off-peak window."""
+        hour = (now or datetime.now(timezone.utc)).hour
+        start, end = self.off_peak_start_hour, self.off_peak_end_hour
+        if start <= end:
+            return start <= hour < end
+        return hour >= start or hour < end
+
+    async def run_once(self, today: Optional[date] = None) -> int:
+        """
+        Pre-generates missing schedules for all active users.
+
+        Args:
+            today: Reference date (defaults to today in UTC).
+
+        Returns:
+            int: Number of schedules generated and stored.
+        """
+        today = today or datetime.now(timezone.utc).date()
+        since = datetime.now(timezone.utc) - self.active_window
+        generated = 0
+        scheduler: Optional[Scheduler] = None
+        work = [
+            (user_id, user, today + timedelta(days=offset))
+            for user_id, user in self.registry.active_since(since)
+            for offset in range(1, self.days_ahead + 1)
+            if self._generated.get((user_id, today + timedelta(days=offset))) != user.input_hash
+        ]
+        for start in range(0, len(work), self.batch_size):
+            chunk = work[start:start + self.batch_size]
+            await self._throttle(len(chunk))
+            # Inputs may have changed while we were waiting.
+            chunk = [item for item in chunk if self.registry.current_hash(item[0]) == item[1].input_hash]
+            if not chunk:
+                continue
+            scheduler = scheduler or self._scheduler_factory()
+            # Run concurrently so the LLM engine can batch the refinements.
+            with llm_priority(LLMPriority.BACKGROUND):
+                schedules = await asyncio.gather(*(
+                    scheduler.generate_schedule(replace(user.template, target_date=target_date), defer_refinement=False)
+                    for _, user, target_date in chunk
+                ))
+            for (user_id, user, target_date), schedule in zip(chunk, schedules):
+                if schedule.metrics.get("status") == "failed":
+                    logger.warning(f"Pre-generation failed for user {user_id} on {target_date}.")
+                    continue
+                saved = await self._storage.save_pregenerated_schedule(
+                    user_id, target_date, user.input_hash, schedule_to_record(schedule)
+                )
+                if saved:
+                    self._generated[(user_id, target_date)] = user.input_hash
+                    generated += 1
+        self._generated = {k: v for k, v in self._generated.items() if k[1] > today}
+        if generated:
+            logger.info(f"Pre-generated {generated} schedule(s).")
+        return generated
+
+    async def _throttle(self, count: int = 1) -> None:
+        """Waits until no interactive request is in flight and the rate limit allows `count` more runs."""
+        while True:
+            await self._idle.wait()
+            wait = self._next_generation - time_module.monotonic()
+            if wait <= 0:
+                break
+            await asyncio.sleep(wait)
+        self._next_generation = time_module.monotonic() + self._min_spacing * count
+
+    async def _run_loop(self) -> None:
+        while True:
+            try:
+                if self.in_off_peak():
+                    await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Pre-generation run failed.")
+            await asyncio.sleep(self.interval_seconds)
@@ -9,11 +9,18 @@ and deployment systems.
 """
 
 import logging
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 
-from fastapi import APIRouter, status
+from fastapi import APIRouter, Depends, status
 from pydantic import BaseModel, Field
 
+from api.dependencies import (
+    get_admission_controller,
+    get_generation_queue,
+    get_idempotency_store,
+    get_llm_metrics,
+)
+
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
@@ -70,3 +77,28 @@ async def get_basic_health() -> HealthStatus:
     """
     logger.debug("Basic health check endpoint '/health' called.")
     return HealthStatus()
+
+
+@router.get(
+    "/metrics",
+    status_code=status.HTTP_200_OK,
+    summary="LLM Call Metrics",
+    description="Returns in-process aggregates of LLM calls per provider/model (attempts, "
+                "queue wait, TTFB, total time, tokens, cost, cache hits, outcomes) together "
+                "with rate limiter and circuit breaker state, the generation job queue and "
+                "admission control (running and queued generations, rejections) and idempotency "
+                "key replays.",
+    tags=["Health"],
+)
+async def get_llm_call_metrics(metrics: Dict[str, Any] = Depends(get_llm_metrics)) -> Dict[str, Any]:
+    """
+    Provides LLM telemetry collected since the process started.
+
+    Latency figures cover the most recent calls of each model (rolling window).
+    """
+    return {
+        "llm": metrics,
+        "jobs": get_generation_queue().stats(),
+        "admission": get_admission_controller().stats(),
+        "idempotency": get_idempotency_store().stats(),
+    }
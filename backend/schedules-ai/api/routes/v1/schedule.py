@@ -7,21 +7,46 @@ Provides endpoints to generate new personalized schedules based on user input
 and retrieve previously generated schedules.
 """
 
+import json
 import logging
-from datetime import date, time, timedelta
-from typing import Any, Dict, List, Optional
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Any, AsyncGenerator, Dict, List, Optional
 from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field, validator
+from starlette.background import BackgroundTask
 
-from api.dependencies import get_scheduler
+from api.admission import AdmissionController, AdmissionRejected
+from api.dependencies import (
+    create_background_scheduler,
+    get_admission_controller,
+    get_generation_queue,
+    get_idempotency_store,
+    get_llm_engine,
+    get_pregeneration_job,
+    get_refinement_store,
+    get_scheduler,
+)
+from api.idempotency import (
+    IDEMPOTENCY_HEADER,
+    IdempotencyKeyConflict,
+    IdempotencyStore,
+    request_fingerprint,
+)
+from api.jobs.generation_queue import GenerationJob, GenerationJobQueue, QueueFullError
+from api.jobs.pregeneration import PregenerationJob, input_fingerprint
+from src.core.refinement import RefinementRecord, RefinementStore
 from src.core.scheduler import (
     GeneratedSchedule,
     ScheduleInputData,
     Scheduler,
 )
+from src.core.simulation import ScheduleVariant, VariantOutcome, simulate
+from src.core.task_prioritizer import EnergyLevel, TaskPriority
 from src.core.task_prioritizer import Task as InternalTask
+from src.services.llm_engine import LLMEngine
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -96,6 +121,13 @@ class ScheduleGenerationRequest(BaseModel):
         description="Optional user profile information (e.g., age, MEQ score, typical sleep patterns) relevant for scheduling.",
         examples=[{"age": 35, "chronotype_preference": "moderate_evening"}],
     )
+    defer_refinement: Optional[bool] = Field(
+        default=None,
+        description="If true, the deterministic solver schedule is returned immediately (version 1) "
+                    "and LLM refinement continues in the background. Poll "
+                    "`/v1/schedule/refinements/{schedule_id}` or subscribe to its `/events` stream "
+                    "for the refined version. Defaults to the server configuration.",
+    )
 
     class Config:
         json_schema_extra = {
@@ -117,6 +149,45 @@ class ScheduleGenerationRequest(BaseModel):
         }
 
 
+class BulkScheduleGenerationRequest(BaseModel):
+    """Request payload for generating many schedules in one call."""
+
+    requests: List[ScheduleGenerationRequest] = Field(
+        ..., min_length=1, max_length=200,
+        description="Individual schedule generation requests (e.g. several users or several dates).",
+    )
+    defer_refinement: Optional[bool] = Field(
+        default=None,
+        description="Applied to every item; see `ScheduleGenerationRequest.defer_refinement`.",
+    )
+
+
+class TaskChangeInput(BaseModel):
+    """Changes to one base task in a what-if variant (unset fields stay as in the base)."""
+    task_id: str = Field(..., description="ID of the base task to change.")
+    preferred_start_time: Optional[time] = Field(default=None, description="New preferred start time.")
+    duration_minutes: Optional[int] = Field(default=None, gt=0, description="New duration in minutes.")
+    priority: Optional[int] = Field(default=None, ge=1, le=5, description="New priority (1=Lowest, 5=Highest).")
+
+
+class ScheduleVariantInput(BaseModel):
+    """A what-if variant expressed as a delta against the base request."""
+    name: str = Field(..., description="Label of the variant.", examples=["Gym in the morning"])
+    remove_task_ids: List[str] = Field(default_factory=list, description="IDs of base tasks to drop.")
+    add_tasks: List[TaskInput] = Field(default_factory=list, description="Tasks to add.")
+    task_changes: List[TaskChangeInput] = Field(default_factory=list, description="Changes to base tasks.")
+    remove_fixed_event_ids: List[str] = Field(default_factory=list, description="IDs of base fixed events to drop.")
+    add_fixed_events: List[FixedEventInput] = Field(default_factory=list, description="Fixed events to add.")
+    preferences: Dict[str, Any] = Field(default_factory=dict, description="Preference overrides merged over the base preferences.")
+
+
+class ScheduleSimulationRequest(BaseModel):
+    """Request payload for comparing what-if variants of one schedule."""
+    base: ScheduleGenerationRequest = Field(..., description="Base schedule inputs.")
+    variants: List[ScheduleVariantInput] = Field(..., min_length=1, max_length=20, description="Variants to compare against the base.")
+    use_llm: bool = Field(default=False, description="Refine base and variants with the LLM (slower; off by default).")
+
+
 # --- Response Models ---
 
 class ScheduledItem(BaseModel):
@@ -146,6 +217,287 @@ class ScheduleGenerationResponse(BaseModel):
         description="Explanations for scheduling decisions (e.g., why a task was placed at a specific time, warnings about conflicts).",
         examples=[{"task_placement_reasoning": "High-priority task scheduled during peak energy time."}],
     )
+    version: int = Field(default=1, description="Version of this schedule. Version 1 is the deterministic solver output; refined versions are numbered higher.")
+    refinement_status: Optional[str] = Field(
+        default=None,
+        description="Status of background LLM refinement, if deferred.",
+        examples=["pending", "running", "completed", "failed"],
+    )
+
+
+class RefinementStatusResponse(BaseModel):
+    """Status of a deferred (background) LLM refinement."""
+
+    schedule_id: UUID = Field(..., description="Identifier of the schedule being refined.")
+    status: str = Field(..., description="Refinement status.", examples=["pending", "running", "completed", "failed"])
+    version: int = Field(..., description="Latest available version of the schedule.")
+    schedule: Optional[ScheduleGenerationResponse] = Field(default=None, description="Latest available version of the schedule.")
+    error: Optional[str] = Field(default=None, description="Error message if refinement failed.")
+
+
+class JobAcceptedResponse(BaseModel):
+    """Acknowledgement of an asynchronous generation request."""
+
+    job_id: UUID = Field(..., description="Identifier of the queued generation job.")
+    status: str = Field(..., description="Job status.", examples=["queued"])
+    status_url: str = Field(..., description="Path to poll for the job status and result.")
+
+
+class JobStatusResponse(BaseModel):
+    """Status of an asynchronous generation job."""
+
+    job_id: UUID = Field(..., description="Identifier of the generation job.")
+    user_id: UUID = Field(..., description="User the schedule is generated for.")
+    status: str = Field(..., description="Job status.", examples=["queued", "running", "succeeded", "failed"])
+    result: Optional[ScheduleGenerationResponse] = Field(default=None, description="Generated schedule once the job succeeded.")
+    error: Optional[str] = Field(default=None, description="Error message if the job failed.")
+    created_at: datetime = Field(..., description="When the job was queued.")
+    updated_at: datetime = Field(..., description="When the status last changed.")
+
+
+class BulkScheduleResultLine(BaseModel):
+    """One NDJSON line of the bulk generation stream."""
+
+    index: int = Field(..., description="Position of the corresponding item in `requests`.")
+    user_id: UUID = Field(..., description="User of the corresponding request item.")
+    status: str = Field(..., description="Outcome for this item.", examples=["ok", "error"])
+    schedule: Optional[ScheduleGenerationResponse] = Field(default=None, description="Generated schedule if successful.")
+    error: Optional[str] = Field(default=None, description="Error message if the item failed.")
+
+
+class ItemChange(BaseModel):
+    """One difference between a variant and the base schedule."""
+    change: str = Field(..., description="Kind of change.", examples=["added", "removed", "moved"])
+    type: Optional[str] = Field(default=None, description="Item type.")
+    name: Optional[str] = Field(default=None, description="Item name.")
+    start_time: Optional[str] = Field(default=None, description="Start time in the variant (HH:MM).")
+    end_time: Optional[str] = Field(default=None, description="End time in the variant (HH:MM).")
+    previous_start_time: Optional[str] = Field(default=None, description="Start time in the base (HH:MM).")
+    previous_end_time: Optional[str] = Field(default=None, description="End time in the base (HH:MM).")
+
+
+class VariantResultResponse(BaseModel):
+    """Compact result of one what-if variant."""
+    name: str = Field(..., description="Label of the variant.")
+    status: str = Field(..., description="Outcome for this variant.", examples=["ok", "error"])
+    changes: List[ItemChange] = Field(default_factory=list, description="Item differences against the base schedule.")
+    metrics: Dict[str, Any] = Field(default_factory=dict, description="Metrics of the variant schedule.")
+    metrics_delta: Dict[str, float] = Field(default_factory=dict, description="Numeric metric differences (variant - base).")
+    warnings: List[str] = Field(default_factory=list, description="Warnings raised while generating the variant.")
+
+
+class ScheduleSimulationResponse(BaseModel):
+    """Base schedule together with compact per-variant results."""
+    base: ScheduleGenerationResponse = Field(..., description="The full base schedule.")
+    variants: List[VariantResultResponse] = Field(..., description="Variant results in request order.")
+
+
+class ScheduleExplanationRequest(ScheduleGenerationRequest):
+    """Request payload for explaining the items of a generated schedule."""
+    items: List[ScheduledItem] = Field(..., min_length=1, max_length=200, description="Items of the schedule to explain.")
+    item_ids: Optional[List[str]] = Field(
+        default=None, description="IDs of the items to explain; all items if omitted.",
+    )
+
+
+class ScheduleExplanationResponse(BaseModel):
+    """Explanations of schedule items, keyed by item ID."""
+    explanations: Dict[str, str] = Field(..., description="Explanation per item ID.")
+
+
+# --- Conversion Helpers ---
+
+def _parse_item_time(value: Any) -> Optional[time]:
+    """Parses an 'HH:MM' item time; '24:00' (end of day) maps to 23:59."""
+    if value is None or isinstance(value, time):
+        return value
+    text = str(value)
+    if text.startswith("24:00"):
+        return time(23, 59)
+    try:
+        return time.fromisoformat(text)
+    except ValueError:
+        return None
+
+
+def _build_input_data(request_data: ScheduleGenerationRequest) -> ScheduleInputData:
+    """
+    Converts the API request into the scheduler's internal input format.
+
+    Raises:
+        ValueError: If tasks or fixed events cannot be converted.
+    """
+    internal_tasks = [
+        InternalTask(
+            id=UUID(t.id) if t.id else uuid4(),
+            title=t.name,
+            duration=timedelta(minutes=t.duration_minutes),
+            priority=TaskPriority(t.priority),
+            energy_level=(
+                EnergyLevel((t.energy_level_required + 1) // 2)
+                if t.energy_level_required
+                else EnergyLevel.MEDIUM
+            ),
+            deadline=(
+                datetime.combine(t.deadline, time(23, 59), tzinfo=timezone.utc)
+                if t.deadline
+                else None
+            ),
+            earliest_start=t.preferred_start_time,
+            location=t.context,
+        )
+        for t in request_data.tasks
+    ]
+    internal_fixed_events = [
+        fe.model_dump(mode="json")
+        for fe in request_data.fixed_events
+    ]
+    return ScheduleInputData(
+        user_id=request_data.user_id,
+        target_date=request_data.target_date,
+        tasks=internal_tasks,
+        fixed_events_input=internal_fixed_events,
+        preferences=request_data.preferences,
+        user_profile_data=request_data.user_profile,
+    )
+
+
+def _build_variant(variant: ScheduleVariantInput) -> ScheduleVariant:
+    """
+    Converts an API what-if variant into the scheduler's delta format.
+
+    Raises:
+        ValueError: If IDs or values cannot be converted.
+    """
+    task_updates: Dict[UUID, Dict[str, Any]] = {}
+    for change in variant.task_changes:
+        updates: Dict[str, Any] = {}
+        if change.preferred_start_time is not None:
+            updates["earliest_start"] = change.preferred_start_time
+        if change.duration_minutes is not None:
+            updates["duration"] = timedelta(minutes=change.duration_minutes)
+        if change.priority is not None:
+            updates["priority"] = TaskPriority(change.priority)
+        task_updates[UUID(change.task_id)] = updates
+    added = _build_input_data(ScheduleGenerationRequest(
+        user_id=uuid4(), target_date=date.today(),
+        tasks=variant.add_tasks, fixed_events=variant.add_fixed_events,
+    ))
+    return ScheduleVariant(
+        name=variant.name,
+        remove_task_ids=tuple(UUID(task_id) for task_id in variant.remove_task_ids),
+        add_tasks=tuple(added.tasks),
+        task_updates=task_updates,
+        remove_fixed_event_ids=tuple(variant.remove_fixed_event_ids),
+        add_fixed_events=tuple(added.fixed_events_input),
+        preference_overrides=variant.preferences,
+    )
+
+
+def _build_variant_result(outcome: VariantOutcome) -> VariantResultResponse:
+    """Formats a simulated variant as a compact API result."""
+    schedule = outcome.schedule
+    return VariantResultResponse(
+        name=outcome.name,
+        status="error" if outcome.failed else "ok",
+        changes=[ItemChange(**change) for change in outcome.changes],
+        metrics=schedule.metrics,
+        metrics_delta=outcome.metrics_delta,
+        warnings=schedule.warnings,
+    )
+
+
+def _build_scheduled_item(item: Dict[str, Any]) -> Optional[ScheduledItem]:
+    """Formats one schedule item; returns None if its times are missing or invalid."""
+    start = _parse_item_time(item.get("start_time"))
+    end = _parse_item_time(item.get("end_time"))
+    if start is None or end is None:
+        return None
+    return ScheduledItem(
+        id=str(item.get("id") or item.get("task_id") or item.get("event_id") or uuid4()),
+        type=item.get("type", "unknown"),
+        name=item.get("name", "Unnamed Item"),
+        start_time=start,
+        end_time=end,
+        details=item.get("details"),
+    )
+
+
+def _build_response(generated_schedule: GeneratedSchedule) -> ScheduleGenerationResponse:
+    """Formats a GeneratedSchedule as the API response model."""
+    response_items = [
+        scheduled
+        for scheduled in map(_build_scheduled_item, generated_schedule.scheduled_items)
+        if scheduled is not None
+    ]
+    return ScheduleGenerationResponse(
+        schedule_id=generated_schedule.schedule_id,
+        user_id=generated_schedule.user_id,
+        target_date=generated_schedule.target_date,
+        scheduled_items=response_items,
+        metrics=generated_schedule.metrics,
+        explanations=generated_schedule.explanations,
+        version=generated_schedule.version,
+        refinement_status=generated_schedule.refinement_status,
+    )
+
+
+def _admission_error(rejection: AdmissionRejected) -> HTTPException:
+    """Maps an admission rejection to a 429/503 response with `Retry-After`."""
+    logger.warning(f"Generation request not admitted ({rejection.status_code}): {rejection.reason}")
+    return HTTPException(
+        status_code=rejection.status_code,
+        detail=rejection.reason,
+        headers={"Retry-After": str(rejection.retry_after)},
+    )
+
+
+def _build_job_response(job: GenerationJob) -> JobStatusResponse:
+    """Formats a generation job as the API status response."""
+    return JobStatusResponse(
+        job_id=job.job_id,
+        user_id=job.user_id,
+        status=job.status.value,
+        result=ScheduleGenerationResponse.model_validate(job.result) if job.result is not None else None,
+        error=job.error,
+        created_at=job.created_at,
+        updated_at=job.updated_at,
+    )
+
+
+async def run_generation_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Worker side of an asynchronous generation job (see `api.jobs.generation_queue`).
+
+    Args:
+        payload: `ScheduleGenerationRequest` as JSON.
+
+    Raises:
+        ValueError: If the scheduler could not generate a schedule.
+
+    Returns:
+        Dict[str, Any]: `ScheduleGenerationResponse` as JSON.
+    """
+    request_data = ScheduleGenerationRequest.model_validate(payload)
+    input_data = _build_input_data(request_data)
+    async with get_pregeneration_job().interactive():
+        generated_schedule = await create_background_scheduler().generate_schedule(
+            input_data, defer_refinement=request_data.defer_refinement
+        )
+    if generated_schedule.metrics.get("status") == "failed":
+        raise ValueError(generated_schedule.explanations.get("error") or "Schedule generation failed.")
+    return _build_response(generated_schedule).model_dump(mode="json")
+
+
+def _build_refinement_response(record: RefinementRecord) -> RefinementStatusResponse:
+    """Formats a refinement record as the API status response."""
+    return RefinementStatusResponse(
+        schedule_id=record.schedule_id,
+        status=record.status.value,
+        version=record.version,
+        schedule=_build_response(record.schedule) if record.schedule is not None else None,
+        error=record.error,
+    )
 
 
 # --- API Endpoints ---
@@ -157,31 +509,89 @@ class ScheduleGenerationResponse(BaseModel):
     summary="Generate a Personalized Schedule",
     description="Generates a personalized and optimized schedule for the specified user and date, "
     "considering tasks, fixed events, user preferences, and profile information. "
-    "Returns the ordered list of scheduled items along with metrics and explanations.",
+    "Returns the ordered list of scheduled items along with metrics and explanations. "
+    "With `mode=async` the request is queued instead and answered with `202 Accepted` and a job id; "
+    "poll `/v1/schedule/jobs/{job_id}` for the result. Retries carrying the same `Idempotency-Key` "
+    "header get the first response instead of a new generation.",
+    responses={
+        202: {"model": JobAcceptedResponse},
+        422: {"description": "Validation failed, or the `Idempotency-Key` was used with a different request."},
+        429: {"description": "Too many concurrent generations for this user."},
+        503: {"description": "Generation capacity or queue exhausted."},
+    },
     tags=["V1 - Schedule"],
 )
 async def generate_schedule(
     request_data: ScheduleGenerationRequest,
+    mode: str = Query("sync", pattern="^(sync|async)$", description="`async` queues the generation as a job."),
     scheduler: Scheduler = Depends(get_scheduler),
-) -> ScheduleGenerationResponse:
+    pregeneration: PregenerationJob = Depends(get_pregeneration_job),
+    queue: GenerationJobQueue = Depends(get_generation_queue),
+    admission: AdmissionController = Depends(get_admission_controller),
+    idempotency_key: Optional[str] = Header(
+        None, alias=IDEMPOTENCY_HEADER, max_length=255, description="Client key making retries safe."
+    ),
+    idempotency: IdempotencyStore = Depends(get_idempotency_store),
+) -> Any:
     """
     Handles the request to generate a personalized schedule.
 
     Args:
         request_data (ScheduleGenerationRequest): The input data containing tasks,
                                                   events, preferences, etc.
+        mode (str): `sync` generates within the request; `async` enqueues a job.
         scheduler (Scheduler): Dependency-injected scheduler service instance.
+        pregeneration (PregenerationJob): Records the user's inputs for off-peak
+                                          pre-generation and yields to this request.
+        queue (GenerationJobQueue): Queue of asynchronous generation jobs.
+        admission (AdmissionController): Limits concurrent generations (sync mode).
+        idempotency_key (Optional[str]): Makes retries of this request replay
+                                         its first response.
+        idempotency (IdempotencyStore): Stored responses per idempotency key.
 
     Raises:
         HTTPException (400 Bad Request): If the input data format is invalid
                                          (beyond Pydantic validation).
-        HTTPException (422 Unprocessable Entity): If Pydantic validation fails.
+        HTTPException (422 Unprocessable Entity): If Pydantic validation fails, or
+                                                  the idempotency key was used
+                                                  with a different request.
+        HTTPException (429 Too Many Requests): If the user already has the
+                                               maximum of concurrent generations.
         HTTPException (500 Internal Server Error): If an unexpected error occurs
                                                    during schedule generation.
+        HTTPException (503 Service Unavailable): If the generation capacity or
+                                                 the job queue is exhausted.
 
     Returns:
-        ScheduleGenerationResponse: The generated schedule details.
+        ScheduleGenerationResponse: The generated schedule details, or (async
+        mode) a `202 Accepted` response with a `JobAcceptedResponse` body.
     """
+    if idempotency_key is None:
+        return await _generate_schedule(request_data, mode, scheduler, pregeneration, queue, admission)
+    try:
+        stored, replayed = await idempotency.run(
+            scope=f"schedule.generate:{request_data.user_id}",
+            key=idempotency_key,
+            fingerprint=request_fingerprint({"mode": mode, "request": request_data}),
+            produce=lambda: _generate_schedule(request_data, mode, scheduler, pregeneration, queue, admission),
+            status_code=status.HTTP_201_CREATED,
+        )
+    except IdempotencyKeyConflict as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    if replayed:
+        logger.info(f"Replayed generation response for user {request_data.user_id} (idempotency key).")
+    return stored.to_response(replayed)
+
+
+async def _generate_schedule(
+    request_data: ScheduleGenerationRequest,
+    mode: str,
+    scheduler: Scheduler,
+    pregeneration: PregenerationJob,
+    queue: GenerationJobQueue,
+    admission: AdmissionController,
+) -> Any:
+    """Generates the schedule (or enqueues the job); see `generate_schedule`."""
     logger.info(
         f"Received schedule generation request for user '{request_data.user_id}', "
         f"target date '{request_data.target_date}' with {len(request_data.tasks)} tasks "
@@ -190,21 +600,7 @@ async def generate_schedule(
 
     # --- Input Data Preparation ---
     try:
-        internal_tasks = [
-            InternalTask(
-                id=t.id,
-                name=t.name,
-                duration=timedelta(minutes=t.duration_minutes),
-                priority=t.priority,
-                deadline=t.deadline,
-            )
-            for t in request_data.tasks
-        ]
-        internal_fixed_events = [
-             fe.model_dump()
-             for fe in request_data.fixed_events
-        ]
-
+        input_data = _build_input_data(request_data)
     except Exception as e:
         logger.error(
             f"Error converting request data to internal format for user {request_data.user_id}: {e}",
@@ -215,44 +611,47 @@ async def generate_schedule(
             detail="Invalid format for tasks or fixed events.",
         )
 
-    input_data = ScheduleInputData(
-        user_id=request_data.user_id,
-        target_date=request_data.target_date,
-        tasks=internal_tasks,
-        fixed_events_input=internal_fixed_events,
-        preferences=request_data.preferences,
-        user_profile=request_data.user_profile,
-    )
+    if mode == "async":
+        await pregeneration.note_request(
+            input_data,
+            input_fingerprint(request_data.model_dump(mode="json", exclude={"target_date", "defer_refinement"})),
+        )
+        try:
+            job = await queue.submit(request_data.user_id, request_data.model_dump(mode="json"))
+        except QueueFullError as e:
+            logger.warning(f"Rejecting async generation for user {request_data.user_id}: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Schedule generation queue is full; retry later.",
+                headers={"Retry-After": "5"},
+            )
+        status_url = f"/v1/schedule/jobs/{job.job_id}"
+        accepted = JobAcceptedResponse(job_id=job.job_id, status=job.status.value, status_url=status_url)
+        return JSONResponse(
+            status_code=status.HTTP_202_ACCEPTED,
+            content=accepted.model_dump(mode="json"),
+            headers={"Location": status_url},
+        )
+
+    # --- Admission ---
+    try:
+        ticket = await admission.acquire(request_data.user_id)
+    except AdmissionRejected as e:
+        raise _admission_error(e)
 
     # --- Call Scheduler Service ---
     try:
+        await pregeneration.note_request(
+            input_data,
+            input_fingerprint(request_data.model_dump(mode="json", exclude={"target_date", "defer_refinement"})),
+        )
         logger.debug(f"Calling scheduler service for user {request_data.user_id}...")
-        generated_schedule: GeneratedSchedule = await scheduler.generate_schedule(input_data)
-        logger.info(f"Schedule generated successfully for user {request_data.user_id}.")
-
-        # --- Format Response ---
-        response_items = [
-            ScheduledItem(
-                id=item.get("id", str(uuid4())),
-                type=item.get("type", "unknown"),
-                name=item.get("name", "Unnamed Item"),
-                start_time=item.get("start_time"),
-                end_time=item.get("end_time"),
-                details=item.get("details"),
+        async with pregeneration.interactive():
+            generated_schedule: GeneratedSchedule = await scheduler.generate_schedule(
+                input_data, defer_refinement=request_data.defer_refinement
             )
-            for item in generated_schedule.scheduled_items
-            if item.get("start_time") and item.get("end_time")
-        ]
-
-        response = ScheduleGenerationResponse(
-            schedule_id=generated_schedule.schedule_id,
-            user_id=generated_schedule.user_id,
-            target_date=generated_schedule.target_date,
-            scheduled_items=response_items,
-            metrics=generated_schedule.metrics,
-            explanations=generated_schedule.explanations,
-        )
-        return response
+        logger.info(f"Schedule generated successfully for user {request_data.user_id}.")
+        return _build_response(generated_schedule)
 
     # --- Error Handling ---
     except Exception as e:
@@ -263,6 +662,354 @@ async def generate_schedule(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="An internal error occurred during schedule generation.",
         )
+    finally:
+        ticket.release()
+
+
+@router.post(
+    "/generate/bulk",
+    summary="Generate Many Schedules (NDJSON Stream)",
+    description="Generates schedules for many users/dates in one call. Profile and sleep preparation "
+                "is shared per user, solver runs are fanned out in parallel and LLM refinements are "
+                "concurrency-limited. Results are streamed as newline-delimited JSON "
+                "(`BulkScheduleResultLine`) in completion order.",
+    tags=["V1 - Schedule"],
+)
+async def generate_schedules_bulk(
+    request_data: BulkScheduleGenerationRequest,
+    scheduler: Scheduler = Depends(get_scheduler),
+    admission: AdmissionController = Depends(get_admission_controller),
+) -> StreamingResponse:
+    """
+    Handles bulk schedule generation, streaming each result as soon as it is ready.
+
+    Items with an invalid format produce an `error` line instead of failing the
+    whole request. The whole request holds one admission slot (exempt from the
+    per-user limit) until the stream ends.
+
+    Raises:
+        HTTPException (503 Service Unavailable): If the generation capacity is exhausted.
+    """
+    logger.info(f"Received bulk schedule generation request with {len(request_data.requests)} items.")
+
+    inputs: List[ScheduleInputData] = []
+    input_indices: List[int] = []
+    invalid_lines: List[BulkScheduleResultLine] = []
+    for index, item in enumerate(request_data.requests):
+        try:
+            inputs.append(_build_input_data(item))
+            input_indices.append(index)
+        except Exception as e:
+            logger.warning(f"Bulk item {index} (user {item.user_id}) has an invalid format: {e}")
+            invalid_lines.append(BulkScheduleResultLine(
+                index=index, user_id=item.user_id, status="error",
+                error="Invalid format for tasks or fixed events.",
+            ))
+
+    try:
+        ticket = await admission.acquire()
+    except AdmissionRejected as e:
+        raise _admission_error(e)
+
+    async def result_stream() -> AsyncGenerator[str, None]:
+        for line in invalid_lines:
+            yield line.model_dump_json() + "\n"
+        results = scheduler.generate_many(inputs, defer_refinement=request_data.defer_refinement)
+        try:
+            async for position, generated in results:
+                index = input_indices[position]
+                failed = generated.metrics.get("status") == "failed"
+                line = BulkScheduleResultLine(
+                    index=index,
+                    user_id=generated.user_id,
+                    status="error" if failed else "ok",
+                    schedule=None if failed else _build_response(generated),
+                    error=generated.explanations.get("error") if failed else None,
+                )
+                yield line.model_dump_json() + "\n"
+        finally:
+            await results.aclose()
+            ticket.release()
+
+    # The background task also releases the slot if the stream never started.
+    return StreamingResponse(
+        result_stream(), media_type="application/x-ndjson", background=BackgroundTask(ticket.release)
+    )
+
+
+@router.post(
+    "/generate/stream",
+    summary="Generate Schedule (Server-Sent Events)",
+    description="Generates a schedule like `/generate`, but streams each LLM-refined item as an `item` "
+                "event as soon as the model has produced it. The final `schedule` event carries the "
+                "complete `ScheduleGenerationResponse`, which supersedes the streamed items.",
+    tags=["V1 - Schedule"],
+)
+async def stream_schedule_generation(
+    request_data: ScheduleGenerationRequest,
+    scheduler: Scheduler = Depends(get_scheduler),
+    pregeneration: PregenerationJob = Depends(get_pregeneration_job),
+    admission: AdmissionController = Depends(get_admission_controller),
+) -> StreamingResponse:
+    """
+    Handles schedule generation with progressive delivery via Server-Sent Events.
+
+    Raises:
+        HTTPException (400 Bad Request): If the input data format is invalid.
+        HTTPException (429/503): If the request is not admitted (see `api.admission`).
+    """
+    logger.info(f"Received streaming schedule generation request for user '{request_data.user_id}'.")
+    try:
+        input_data = _build_input_data(request_data)
+    except Exception as e:
+        logger.error(f"Invalid streaming request for user {request_data.user_id}: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid format for tasks or fixed events.",
+        )
+    await pregeneration.note_request(
+        input_data,
+        input_fingerprint(request_data.model_dump(mode="json", exclude={"target_date", "defer_refinement"})),
+    )
+
+    try:
+        ticket = await admission.acquire(request_data.user_id)
+    except AdmissionRejected as e:
+        raise _admission_error(e)
+
+    async def event_stream() -> AsyncGenerator[str, None]:
+        async with pregeneration.interactive():
+            results = scheduler.stream_schedule(input_data)
+            try:
+                async for kind, payload in results:
+                    if kind == "item":
+                        item = _build_scheduled_item(payload)
+                        if item is not None:
+                            yield f"event: item\ndata: {item.model_dump_json()}\n\n"
+                    else:
+                        yield f"event: schedule\ndata: {_build_response(payload).model_dump_json()}\n\n"
+            finally:
+                await results.aclose()
+                ticket.release()
+
+    return StreamingResponse(
+        event_stream(), media_type="text/event-stream", background=BackgroundTask(ticket.release)
+    )
+
+
+@router.post(
+    "/explain",
+    response_model=ScheduleExplanationResponse,
+    summary="Explain Schedule Items",
+    description="Explains why items of a schedule were placed at their times. All requested items are "
+                "explained in a single LLM call; explanations are cached per item, so re-explaining an "
+                "unchanged item does not call the model again.",
+    tags=["V1 - Schedule"],
+)
+async def explain_schedule_items(
+    request_data: ScheduleExplanationRequest,
+    scheduler: Scheduler = Depends(get_scheduler),
+    llm: Optional[LLMEngine] = Depends(get_llm_engine),
+) -> ScheduleExplanationResponse:
+    """
+    Handles batched explanation of schedule items.
+
+    Raises:
+        HTTPException (400 Bad Request): If the input data format is invalid.
+        HTTPException (503 Service Unavailable): If no LLM is configured.
+    """
+    if llm is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Schedule explanations require a configured LLM.",
+        )
+    try:
+        input_data = _build_input_data(request_data)
+    except Exception as e:
+        logger.error(f"Invalid explanation request for user {request_data.user_id}: {e}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid format for tasks or fixed events.",
+        )
+
+    items = [
+        {
+            "id": item.id,
+            "type": item.type,
+            "name": item.name,
+            "start_time": item.start_time.strftime("%H:%M"),
+            "end_time": item.end_time.strftime("%H:%M"),
+        }
+        for item in request_data.items
+    ]
+    indices = None
+    if request_data.item_ids is not None:
+        wanted = set(request_data.item_ids)
+        indices = [i for i, item in enumerate(request_data.items) if item.id in wanted]
+    schedule = GeneratedSchedule(
+        user_id=input_data.user_id, target_date=input_data.target_date, scheduled_items=items,
+    )
+    explanations = await scheduler.explain_schedule(input_data, schedule, indices)
+    return ScheduleExplanationResponse(
+        explanations={items[index]["id"]: text for index, text in explanations.items()}
+    )
+
+
+@router.post(
+    "/simulate",
+    response_model=ScheduleSimulationResponse,
+    summary="Compare What-if Schedule Variants",
+    description="Generates the base schedule and each variant (expressed as a delta against the base) "
+                "in one batch: profile and sleep preparation is shared and solver runs happen in "
+                "parallel. LLM refinement is skipped unless `use_llm` is set. Returns the full base "
+                "schedule plus compact item diffs and metric deltas per variant.",
+    tags=["V1 - Schedule"],
+)
+async def simulate_schedule_variants(
+    request_data: ScheduleSimulationRequest,
+    scheduler: Scheduler = Depends(get_scheduler),
+    admission: AdmissionController = Depends(get_admission_controller),
+) -> ScheduleSimulationResponse:
+    """
+    Handles a what-if simulation request.
+
+    Raises:
+        HTTPException (400 Bad Request): If the base or a variant cannot be converted
+                                         or references unknown tasks.
+        HTTPException (429/503): If the request is not admitted (see `api.admission`).
+        HTTPException (500 Internal Server Error): If an unexpected error occurs.
+    """
+    logger.info(
+        f"Received simulation request for user '{request_data.base.user_id}' "
+        f"with {len(request_data.variants)} variants."
+    )
+    try:
+        base_input = _build_input_data(request_data.base)
+        variants = [_build_variant(variant) for variant in request_data.variants]
+    except Exception as e:
+        logger.warning(f"Invalid simulation request for user {request_data.base.user_id}: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid format for tasks, fixed events or variants.",
+        )
+
+    try:
+        ticket = await admission.acquire(request_data.base.user_id)
+    except AdmissionRejected as e:
+        raise _admission_error(e)
+    try:
+        result = await simulate(scheduler, base_input, variants, use_llm=request_data.use_llm)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception:
+        logger.exception(f"Unexpected error during simulation for user {request_data.base.user_id}.")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="An internal error occurred during schedule simulation.",
+        )
+    finally:
+        ticket.release()
+
+    return ScheduleSimulationResponse(
+        base=_build_response(result.base),
+        variants=[_build_variant_result(outcome) for outcome in result.variants],
+    )
+
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=JobStatusResponse,
+    summary="Get Generation Job Status",
+    description="Returns the status of an asynchronous generation job (`POST /generate?mode=async`) "
+                "and, once it succeeded, the generated schedule.",
+    tags=["V1 - Schedule"],
+)
+async def get_generation_job(
+    job_id: UUID,
+    queue: GenerationJobQueue = Depends(get_generation_queue),
+) -> JobStatusResponse:
+    """
+    Pollable status of an asynchronous generation job.
+
+    Raises:
+        HTTPException (404 Not Found): If the job is unknown (or was evicted).
+    """
+    job = queue.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No generation job found with id {job_id}.",
+        )
+    return _build_job_response(job)
+
+
+@router.get(
+    "/refinements/{schedule_id}",
+    response_model=RefinementStatusResponse,
+    summary="Get Background Refinement Status",
+    description="Returns the status of a deferred LLM refinement together with the latest "
+                "available version of the schedule (deterministic until refinement completes).",
+    tags=["V1 - Schedule"],
+)
+async def get_refinement_status(
+    schedule_id: UUID,
+    store: RefinementStore = Depends(get_refinement_store),
+) -> RefinementStatusResponse:
+    """
+    Pollable status of a deferred LLM refinement.
+
+    Raises:
+        HTTPException (404 Not Found): If the schedule has no deferred refinement
+                                       (or it was evicted).
+    """
+    record = store.get(schedule_id)
+    if record is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No deferred refinement found for schedule {schedule_id}.",
+        )
+    return _build_refinement_response(record)
+
+
+@router.get(
+    "/refinements/{schedule_id}/events",
+    summary="Stream Background Refinement Updates (SSE)",
+    description="Server-Sent Events stream emitting a `refinement` event on every status change. "
+                "The stream closes once refinement completes or fails, or after `timeout` seconds.",
+    tags=["V1 - Schedule"],
+)
+async def stream_refinement_events(
+    schedule_id: UUID,
+    timeout: float = Query(60.0, gt=0, le=300, description="Maximum stream duration in seconds."),
+    store: RefinementStore = Depends(get_refinement_store),
+) -> StreamingResponse:
+    """
+    Notifies the client about refinement progress via Server-Sent Events.
+
+    Raises:
+        HTTPException (404 Not Found): If the schedule has no deferred refinement.
+    """
+    if store.get(schedule_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No deferred refinement found for schedule {schedule_id}.",
+        )
+
+    async def event_stream() -> AsyncGenerator[str, None]:
+        loop_deadline = datetime.now(timezone.utc) + timedelta(seconds=timeout)
+        record = store.get(schedule_id)
+        while record is not None:
+            payload = _build_refinement_response(record).model_dump(mode="json")
+            yield f"event: refinement\ndata: {json.dumps(payload)}\n\n"
+            remaining = (loop_deadline - datetime.now(timezone.utc)).total_seconds()
+            if record.status.is_terminal or remaining <= 0:
+                break
+            previous = (record.status, record.version)
+            record = await store.wait_for_change(schedule_id, timeout=remaining)
+            if record is not None and (record.status, record.version) == previous:
+                break  # Timed out without a change
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
 
 
 @router.get(
@@ -270,18 +1017,24 @@ async def generate_schedule(
     response_model=ScheduleGenerationResponse,
     summary="Get Existing Schedule by User and Date",
     description="Retrieves a previously generated schedule for a specific user and date. "
-                "**Note:** This is currently a placeholder and returns mock data.",
+                "Schedules pre-generated off-peak are served directly while their inputs are "
+                "unchanged. **Note:** Otherwise this is currently a placeholder and returns mock data.",
     tags=["V1 - Schedule"],
 )
-async def get_schedule(user_id: UUID, target_date: date) -> ScheduleGenerationResponse:
+async def get_schedule(
+    user_id: UUID,
+    target_date: date,
+    pregeneration: PregenerationJob = Depends(get_pregeneration_job),
+) -> ScheduleGenerationResponse:
     """
     Retrieves a previously generated schedule.
 
-    **(Placeholder Implementation)** - Needs integration with data storage.
+    **(Placeholder Implementation)** - Only pre-generated schedules are stored so far.
 
     Args:
         user_id (UUID): The identifier of the user.
         target_date (date): The target date of the schedule.
+        pregeneration (PregenerationJob): Source of pre-generated schedules.
 
     Raises:
         HTTPException (404 Not Found): If no schedule is found for the given user/date.
@@ -292,14 +1045,15 @@ async def get_schedule(user_id: UUID, target_date: date) -> ScheduleGenerationRe
     """
     logger.info(f"Received request to get schedule for user '{user_id}', date '{target_date}'.")
 
-    # --- TODO: Implement Database/Storage Logic ---
-    # Replace this mock implementation with actual database query
-    # schedule_record = await db.schedules.find_one({"user_id": user_id, "target_date": target_date})
-    schedule_record = None # Simulate not found for now, or create mock below
+    try:
+        schedule_record = await pregeneration.get_fresh(user_id, target_date)
+    except Exception as db_error:
+        logger.warning(f"Error accessing pre-generated schedules: {db_error}")
+        schedule_record = None
 
     if schedule_record:
-        logger.info(f"Schedule found for user '{user_id}', date '{target_date}'.")
-        pass 
+        logger.info(f"Serving pre-generated schedule for user '{user_id}', date '{target_date}'.")
+        return _build_response(schedule_record)
     else:
         # --- Mock Response (Remove when DB logic is added) ---
         logger.warning(f"No schedule found for user '{user_id}', date '{target_date}'. Returning mock data (placeholder).")
@@ -11,9 +11,13 @@ import logging
 from typing import Optional
 from uuid import UUID
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel, Field, HttpUrl
 
+from api.dependencies import get_pregeneration_job, get_profile_cache
+from api.jobs.pregeneration import PregenerationJob
+from src.core.profile_cache import ProfileCache
+
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
@@ -127,6 +131,8 @@ async def get_user_profile(
 async def update_user_preferences(
     user_id: UUID,
     update_data: UserPreferencesUpdateRequest,
+    profile_cache: ProfileCache = Depends(get_profile_cache),
+    pregeneration: PregenerationJob = Depends(get_pregeneration_job),
 ) -> UserProfileResponse:
     """
     Updates the preferences for a specific user.
@@ -134,6 +140,8 @@ async def update_user_preferences(
     Args:
         user_id: The unique identifier of the user whose preferences are to be updated.
         update_data: The new preference values.
+        profile_cache: Cached chronotype/sleep/energy data, invalidated for this user.
+        pregeneration: Pre-generation job whose stored schedules for this user become stale.
 
     Returns:
         The complete user profile including the updated preferences.
@@ -143,6 +151,10 @@ async def update_user_preferences(
         f"with data: {update_data.preferences.model_dump()}"
     )
 
+    # Derived profile data depends on preferences; drop it before anything else.
+    profile_cache.invalidate_user(user_id)
+    await pregeneration.invalidate_user(user_id)
+
     # TODO: Implement Database/Service Logic
     try:
         updated_profile_data = None
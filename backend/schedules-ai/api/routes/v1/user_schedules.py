@@ -10,12 +10,19 @@ import json
 import logging
 import os
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
 from pydantic import BaseModel, Field
 
+from api.dependencies import get_idempotency_store
+from api.idempotency import (
+    IDEMPOTENCY_HEADER,
+    IdempotencyKeyConflict,
+    IdempotencyStore,
+    request_fingerprint,
+)
 from api.middleware.jwt_auth import JWTBearer, get_user_from_token
 
 logger = logging.getLogger(__name__)
@@ -372,26 +379,49 @@ async def find_one(
     "",
     response_model=Schedule,
     summary="Create Schedule",
-    description="Creates a new schedule for the authenticated user.",
+    description="Creates a new schedule for the authenticated user. Retries carrying the same "
+                "`Idempotency-Key` header return the first created schedule instead of a duplicate.",
     status_code=status.HTTP_201_CREATED,
 )
 async def create(
     create_dto: CreateScheduleDto,
     token: str = Depends(jwt_bearer),
-) -> Schedule:
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER, max_length=255),
+    idempotency: IdempotencyStore = Depends(get_idempotency_store),
+) -> Any:
     """
     Creates a new schedule for the authenticated user.
 
     Args:
         create_dto: The schedule data
         token: JWT token from the authorization header
+        idempotency_key: Optional key making retries return the first response
+        idempotency: Stored responses per idempotency key
 
     Returns:
         The created schedule.
 
     Raises:
-        HTTPException: If authentication fails or an error occurs.
+        HTTPException: If authentication fails, the idempotency key was used
+            with a different request, or an error occurs.
     """
+    if idempotency_key is None:
+        return await _create_schedule(create_dto, token)
+    try:
+        stored, replayed = await idempotency.run(
+            scope=f"user-schedules.create:{get_user_from_token(token)}",
+            key=idempotency_key,
+            fingerprint=request_fingerprint(create_dto),
+            produce=lambda: _create_schedule(create_dto, token),
+            status_code=status.HTTP_201_CREATED,
+        )
+    except IdempotencyKeyConflict as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    return stored.to_response(replayed)
+
+
+async def _create_schedule(create_dto: CreateScheduleDto, token: str) -> Schedule:
+    """Creates and saves the schedule; see `create`."""
     logger.info("Received request to create a new schedule.")
 
     try:
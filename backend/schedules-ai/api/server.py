@@ -119,12 +119,18 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
             logger.error(f"Failed to initialize database: {e}")
             logger.warning("API will run without database support.")
 
+    await api.dependencies.init_llm_http_session()
+    api.dependencies.get_pregeneration_job().start()
+    await api.dependencies.get_generation_queue().start(schedule_v1.run_generation_job)
+
     logger.info("Application startup complete.")
 
     yield
 
     # --- Shutdown ---
     logger.info(f"Shutting down {app_config.get('app_name', 'Scheduler Core API')}...")
+    await api.dependencies.get_pregeneration_job().stop()
+    await api.dependencies.get_generation_queue().stop()
     disable_db = os.environ.get("DISABLE_DB", "false").lower() == "true"
     if not disable_db:
         try:
@@ -132,6 +138,8 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
             await close_db_pool()
         except Exception as e:
             logger.error(f"Error closing database connection: {e}")
+    api.dependencies.shutdown_solver_executor()
+    await api.dependencies.close_llm_http_session()
     logger.info("Application shutdown complete.")
 
 
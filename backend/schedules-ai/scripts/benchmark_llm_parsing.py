@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark of LLM response parsing.
+
+Parses every response in a corpus directory (one completion per `*.txt` file)
+with the tiered parser (`parse_llm_json_tiered`) and with the previous
+approach (balanced-brace scan + `json5`), and prints the tier used and the
+mean time per parse.
+
+Usage:
+    python scripts/benchmark_llm_parsing.py [--corpus DIR] [--repeat N]
+
+The default corpus is `tests/fixtures/llm_responses`; point `--corpus` at a
+directory of captured completions to measure production traffic.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+from pathlib import Path
+
+import json5
+
+# Add the parent directory to the path so we can import the src module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.llm_parsing import balanced_span, orjson, parse_llm_json_tiered
+
+DEFAULT_CORPUS = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "llm_responses"
+
+
+def legacy_parse(text: str):
+    """Previous approach: balanced span from the first bracket, then json5."""
+    starts = [position for position in (text.find("{"), text.find("[")) if position >= 0]
+    if not starts:
+        raise ValueError("No JSON object or array found in response")
+    return json5.loads(balanced_span(text, min(starts)))
+
+
+def time_per_call(function, text: str, repeat: int) -> float:
+    """Mean microseconds per call, or NaN if the call fails."""
+    try:
+        function(text)
+    except ValueError:
+        return float("nan")
+    return timeit.timeit(lambda: function(text), number=repeat) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LLM response parsing tiers.")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS, help="Directory of *.txt completions.")
+    parser.add_argument("--repeat", type=int, default=200, help="Parses per response.")
+    args = parser.parse_args()
+
+    files = sorted(args.corpus.glob("*.txt"))
+    if not files:
+        sys.exit(f"No *.txt responses in {args.corpus}")
+
+    print(f"Strict tier backend: {'orjson' if orjson is not None else 'json (stdlib)'}")
+    print(f"{'response':<34} {'chars':>7} {'tier':>9} {'tiered us':>10} {'legacy us':>10} {'speedup':>8}")
+    totals = {"tiered": 0.0, "legacy": 0.0}
+    for path in files:
+        text = path.read_text(encoding="utf-8")
+        try:
+            _, tier = parse_llm_json_tiered(text)
+        except ValueError:
+            tier = "failed"
+        tiered = time_per_call(parse_llm_json_tiered, text, args.repeat)
+        legacy = time_per_call(legacy_parse, text, args.repeat)
+        speedup = legacy / tiered if tiered == tiered and legacy == legacy else float("nan")
+        print(f"{path.name:<34} {len(text):>7} {tier:>9} {tiered:>10.1f} {legacy:>10.1f} {speedup:>7.1f}x")
+        if tiered == tiered and legacy == legacy:
+            totals["tiered"] += tiered
+            totals["legacy"] += legacy
+
+    if totals["tiered"]:
+        print(
+            f"\nParsed by both: tiered {totals['tiered']:.1f} us, legacy {totals['legacy']:.1f} us "
+            f"({totals['legacy'] / totals['tiered']:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark of LLM prompt rendering.
+
+Builds the refinement prompt (`LLMEngine._build_prompt`) for a realistic
+context and prints the mean time per render, split into precomputing the
+compact encodings (`compact_context`) and rendering the compiled template.
+The target is well under a millisecond per prompt.
+
+Usage:
+    python scripts/benchmark_prompt_rendering.py [--repeat N] [--tasks N]
+
+`--distinct-profiles` gives every render its own energy pattern and
+preferences, which measures the cost without the per-profile caches.
+"""
+
+import argparse
+import os
+import sys
+import timeit
+from datetime import date, time, timedelta
+from uuid import uuid4
+
+# Add the parent directory to the path so we can import the src module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.constraint_solver import ScheduledTaskInfo
+from src.core.task_prioritizer import Task
+from src.services.llm_engine import LLMEngine, ModelConfig, ScheduleGenerationContext
+from src.services.prompt_compaction import compact_context
+
+
+def make_context(tasks: int, variant: int = 0):
+    task_list = [Task(title=f"Task {n}", duration=timedelta(minutes=30 + 15 * (n % 4))) for n in range(tasks)]
+    skeleton = [
+        ScheduledTaskInfo(task_id=task.id, start_time=time(9 + n), end_time=time(9 + n, 45), task_date=date.today())
+        for n, task in enumerate(task_list[:8])
+    ]
+    context = ScheduleGenerationContext(
+        user_id=uuid4(),
+        user_name="Benchmark",
+        target_date=date.today(),
+        tasks=task_list,
+        fixed_events=[{"id": "standup", "name": "Standup", "start_time": "10:30", "end_time": "11:00"}],
+        preferences={
+            "meals": {"breakfast_time": "07:30", "lunch_time": f"12:{variant % 60:02d}"},
+            "activity_goals": [{"name": "Run", "duration_minutes": 30, "preferred_time": ["morning"]}],
+        },
+        energy_pattern={hour: round(0.3 + 0.6 * ((hour + variant) % 24) / 23, 2) for hour in range(24)},
+        wearable_insights={"sleep_quality": "Good", "readiness_score": 0.8, "steps_yesterday": 8500},
+        historical_insights={"typical_lunch": "12:30", "productive_hours": ["09:00", "14:00"]},
+    )
+    return context, skeleton
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark LLM prompt rendering.")
+    parser.add_argument("--repeat", type=int, default=2000, help="Renders to time.")
+    parser.add_argument("--tasks", type=int, default=12, help="Tasks in the context.")
+    parser.add_argument("--distinct-profiles", action="store_true", help="Defeat the per-profile caches.")
+    args = parser.parse_args()
+
+    engine = LLMEngine(ModelConfig(LLM_PROVIDER="openrouter", OPENROUTER_API_KEY="benchmark"))
+    template = engine._prompt_template_refine
+    contexts = [make_context(args.tasks, variant if args.distinct_profiles else 0) for variant in range(args.repeat)]
+    variables = [compact_context(context, skeleton) for context, skeleton in contexts]
+    for values in variables:
+        values.update(user_name="Benchmark", additional_context="", format_type="json")
+
+    iterator = iter(contexts)
+    precompute = timeit.timeit(lambda: compact_context(*next(iterator)), number=args.repeat) / args.repeat
+    iterator = iter(variables)
+    render = timeit.timeit(lambda: template.render(next(iterator), omit=set()), number=args.repeat) / args.repeat
+    iterator = iter(contexts)
+    build = timeit.timeit(
+        lambda: engine._build_prompt(template, next(iterator)[0], solver_schedule=contexts[0][1]), number=args.repeat
+    ) / args.repeat
+
+    prompt = engine._build_prompt(template, contexts[0][0], solver_schedule=contexts[0][1]) or ""
+    print(f"prompt: {len(prompt)} chars, {args.tasks} tasks, {'distinct' if args.distinct_profiles else 'shared'} profiles")
+    print(f"compact_context  {precompute * 1e6:8.1f} us")
+    print(f"template.render  {render * 1e6:8.1f} us")
+    print(f"_build_prompt    {build * 1e6:8.1f} us  ({'under' if build < 1e-3 else 'OVER'} the 1 ms target)")
+
+
+if __name__ == "__main__":
+    main()
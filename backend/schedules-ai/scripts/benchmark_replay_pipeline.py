@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Offline load test of the scheduling pipeline with LLM refinement.
+
+Runs `Scheduler.generate_schedule` (solver + LLM refinement) for many
+synthetic users against the record/replay provider (`src.services.llm_replay`),
+so retries, rate limiting and circuit breaking are exercised without network
+access, and prints end-to-end latency percentiles.
+
+Usage:
+    python scripts/benchmark_replay_pipeline.py [--requests N] [--concurrency C]
+        [--recordings FILE] [--latency SPEC] [--error-rate R] [--rate-limit-rate R]
+
+Without `--recordings` a temporary store is seeded with a fixture completion,
+which is replayed for every prompt. Record real traffic with
+`LLM_REPLAY_RECORD=true LLM_REPLAY_PATH=FILE` to replay it here.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from uuid import uuid4
+
+# Add the parent directory to the path so we can import the src module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+FIXTURE = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "llm_responses" / "01_bare.txt"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load-test the scheduling pipeline against replayed LLM responses.")
+    parser.add_argument("--requests", type=int, default=50, help="Schedules to generate.")
+    parser.add_argument("--concurrency", type=int, default=10, help="Schedules generated at once.")
+    parser.add_argument("--recordings", help="JSON Lines store of recorded responses.")
+    parser.add_argument("--latency", default="lognormal:1.5,0.5", help="Latency distribution, e.g. fixed:0.8.")
+    parser.add_argument("--error-rate", type=float, default=0.02, help="Fraction of HTTP 500 responses.")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.05, help="Fraction of HTTP 429 responses.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed of latency and fault injection.")
+    return parser.parse_args()
+
+
+def configure_environment(args) -> None:
+    """Points the LLM settings at the replay provider before the app config is loaded."""
+    recordings = args.recordings
+    if not recordings:
+        from src.services.llm_replay import ReplayStore
+
+        recordings = os.path.join(tempfile.mkdtemp(), "recordings.jsonl")
+        ReplayStore(recordings).record("seed", FIXTURE.read_text(encoding="utf-8"))
+    os.environ.update({
+        "LLM_PROVIDER": "replay",
+        "LLM_REPLAY_PATH": recordings,
+        "LLM_REPLAY_LATENCY": args.latency,
+        "LLM_REPLAY_ERROR_RATE": str(args.error_rate),
+        "LLM_REPLAY_RATE_LIMIT_RATE": str(args.rate_limit_rate),
+        "LLM_REPLAY_RETRY_AFTER": "1",
+        "LLM_REPLAY_SEED": str(args.seed),
+        "LLM_RETRY_DELAY": "0.5",
+    })
+
+
+def make_input(index: int):
+    from src.core.scheduler import ScheduleInputData
+    from src.core.task_prioritizer import EnergyLevel, Task, TaskPriority
+
+    tasks = [
+        Task(id=uuid4(), title=f"Task {index}-{n}", priority=TaskPriority.MEDIUM,
+             energy_level=EnergyLevel.MEDIUM, duration=timedelta(minutes=30 + 15 * n))
+        for n in range(4)
+    ]
+    return ScheduleInputData(
+        user_id=uuid4(),
+        target_date=date.today() + timedelta(days=1),
+        tasks=tasks,
+        fixed_events_input=[{"id": "standup", "start_time": "10:30", "end_time": "11:00"}],
+        user_profile_data={"age": 30, "meq_score": 40 + index % 30},
+    )
+
+
+def percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+async def run(args) -> None:
+    from api.dependencies import _llm_circuit_breakers, _llm_rate_limits, create_background_scheduler
+
+    scheduler = create_background_scheduler()
+    if scheduler.llm_engine is None:
+        sys.exit("LLM engine is not configured; refinement cannot be benchmarked.")
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, warned = [], 0
+
+    async def one(index: int) -> None:
+        nonlocal warned
+        async with semaphore:
+            started = time.perf_counter()
+            schedule = await scheduler.generate_schedule(make_input(index), defer_refinement=False)
+            latencies.append(time.perf_counter() - started)
+            warned += bool(schedule.warnings)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.requests} schedules in {elapsed:.1f}s ({args.requests / elapsed:.2f}/s), {warned} with warnings")
+    print(
+        f"latency p50 {percentile(latencies, 0.5):.2f}s  p95 {percentile(latencies, 0.95):.2f}s  "
+        f"p99 {percentile(latencies, 0.99):.2f}s  mean {statistics.mean(latencies):.2f}s"
+    )
+    print(f"replay: {scheduler.llm_engine._get_session().stats()}")
+    print(f"rate limits: {_llm_rate_limits.stats()}")
+    print(f"circuit breakers: {_llm_circuit_breakers.stats()}")
+
+
+def main():
+    args = parse_args()
+    configure_environment(args)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
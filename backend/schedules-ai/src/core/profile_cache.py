@@ -0,0 +1,145 @@
+# === File: schedules-ai/src/core/profile_cache.py ===
+
+"""
+Per-User Profile Memoization.
+
+Profil chronotypu, okno snu i wzorzec energii zależą wyłącznie od kilku pól
+`user_profile_data` i `preferences`, które rzadko się zmieniają. Ten moduł
+przechowuje je w małym cache LRU, kluczowanym skrótem tych pól, aby Scheduler
+nie przeliczał ich przy każdym żądaniu. Wpisy użytkownika są usuwane jawnie po
+zmianie jego preferencji.
+"""
+
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set
+from uuid import UUID
+
+from src.core.chronotype import ChronotypeProfile
+from src.core.sleep import SleepMetrics
+
+logger = logging.getLogger(__name__)
+
+# Pola wpływające na profil, okno snu i wzorzec energii (patrz Scheduler._prepare_profile
+# oraz Scheduler._calculate_sleep).
+PROFILE_KEY_FIELDS = ("meq_score", "age")
+PREFERENCE_KEY_FIELDS = ("preferred_wake_time", "sleep_need_scale", "chronotype_scale")
+
+
+@dataclass(frozen=True)
+class PreparedProfile:
+    """Wyliczone dane użytkownika współdzielone między żądaniami (nie modyfikować)."""
+
+    profile: ChronotypeProfile
+    sleep_metrics: SleepMetrics
+    energy_pattern: Dict[int, float]
+
+
+class ProfileCache:
+    """
+    Cache LRU obiektów PreparedProfile z unieważnianiem per użytkownik.
+
+    Używany z pętli zdarzeń (jeden wątek), więc nie wymaga blokad.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        """
+        Args:
+            max_entries: Maksymalna liczba przechowywanych wpisów.
+        """
+        self._max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[str, PreparedProfile]" = OrderedDict()
+        self._keys_by_user: Dict[UUID, Set[str]] = {}
+        self._owners: Dict[str, UUID] = {}
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def make_key(
+        user_id: UUID,
+        user_profile_data: Optional[Dict[str, Any]],
+        preferences: Optional[Dict[str, Any]],
+    ) -> str:
+        """
+        Tworzy klucz cache ze skrótu istotnych pól profilu i preferencji.
+
+        Args:
+            user_id: Identyfikator użytkownika.
+            user_profile_data: Dane profilu użytkownika.
+            preferences: Preferencje użytkownika.
+
+        Returns:
+            Skrót SHA-256 (hex).
+        """
+        data = user_profile_data or {}
+        prefs = preferences or {}
+        relevant = {
+            "user_id": str(user_id),
+            "profile": {k: data.get(k) for k in PROFILE_KEY_FIELDS},
+            "preferences": {k: prefs.get(k) for k in PREFERENCE_KEY_FIELDS},
+        }
+        payload = json.dumps(relevant, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[PreparedProfile]:
+        """Zwraca wpis (oznaczając go jako ostatnio użyty) lub None."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return entry
+
+    def put(self, user_id: UUID, key: str, entry: PreparedProfile) -> None:
+        """
+        Zapisuje wpis, usuwając najdawniej używane po przekroczeniu limitu.
+
+        Args:
+            user_id: Właściciel wpisu (do unieważniania).
+            key: Klucz z `make_key`.
+            entry: Wyliczone dane.
+        """
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._keys_by_user.setdefault(user_id, set()).add(key)
+        self._owners[key] = user_id
+        while len(self._entries) > self._max_entries:
+            evicted_key, _ = self._entries.popitem(last=False)
+            self._forget_key(evicted_key)
+
+    def invalidate_user(self, user_id: UUID) -> int:
+        """
+        Usuwa wszystkie wpisy użytkownika (np. po zmianie preferencji).
+
+        Returns:
+            Liczba usuniętych wpisów.
+        """
+        keys = self._keys_by_user.pop(user_id, set())
+        for key in keys:
+            self._entries.pop(key, None)
+            self._owners.pop(key, None)
+        if keys:
+            logger.debug(f"ProfileCache: unieważniono {len(keys)} wpis(ów) użytkownika {user_id}.")
+        return len(keys)
+
+    def clear(self) -> None:
+        """Usuwa wszystkie wpisy."""
+        self._entries.clear()
+        self._keys_by_user.clear()
+        self._owners.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Zwraca rozmiar cache oraz liczbę trafień i chybień."""
+        return {"entries": len(self._entries), "hits": self._hits, "misses": self._misses}
+
+    def _forget_key(self, key: str) -> None:
+        user_id = self._owners.pop(key, None)
+        keys = self._keys_by_user.get(user_id) if user_id is not None else None
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
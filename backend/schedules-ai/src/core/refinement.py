@@ -0,0 +1,167 @@
+# === File: schedules-ai/src/core/refinement.py ===
+
+"""
+Background LLM Refinement Tracking.
+
+Przechowuje stan odroczonego dopieszczania harmonogramów przez LLM. Scheduler
+zwraca najpierw deterministyczny wynik solvera (wersja 1), a dopieszczona
+wersja trafia tutaj, gdy zadanie w tle się zakończy. Klienci mogą odpytywać
+status lub czekać na zmianę (SSE).
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from enum import Enum
+from typing import Any, Dict, Optional, Set
+from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+
+class RefinementStatus(Enum):
+    """Stan odroczonego dopieszczania harmonogramu."""
+
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    @property
+    def is_terminal(self) -> bool:
+        return self in (RefinementStatus.COMPLETED, RefinementStatus.FAILED)
+
+
+@dataclass
+class RefinementRecord:
+    """Wpis opisujący jeden harmonogram oczekujący na dopieszczenie."""
+
+    schedule_id: UUID
+    user_id: UUID
+    status: RefinementStatus = RefinementStatus.PENDING
+    version: int = 1
+    schedule: Optional[Any] = None  # GeneratedSchedule (najnowsza wersja)
+    error: Optional[str] = None
+    updated_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    def _touch(self) -> None:
+        self.updated_at = datetime.now(timezone.utc)
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+
+class RefinementStore:
+    """
+    Procesowy rejestr odroczonych dopieszczeń LLM.
+
+    Trzyma ograniczoną liczbę wpisów (najstarsze są usuwane) oraz referencje
+    do zadań w tle, aby nie zostały zebrane przez GC przed zakończeniem.
+    """
+
+    def __init__(self, max_records: int = 1000) -> None:
+        """
+        Args:
+            max_records: Maksymalna liczba przechowywanych wpisów.
+        """
+        self._max_records = max(1, int(max_records))
+        self._records: "OrderedDict[UUID, RefinementRecord]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def register(self, schedule: Any) -> RefinementRecord:
+        """
+        Rejestruje deterministyczną wersję harmonogramu jako oczekującą.
+
+        Args:
+            schedule: GeneratedSchedule zwrócony klientowi.
+
+        Returns:
+            RefinementRecord: Nowy wpis w stanie PENDING.
+        """
+        record = RefinementRecord(
+            schedule_id=schedule.schedule_id,
+            user_id=schedule.user_id,
+            version=getattr(schedule, "version", 1),
+            schedule=schedule,
+        )
+        self._records[schedule.schedule_id] = record
+        self._records.move_to_end(schedule.schedule_id)
+        while len(self._records) > self._max_records:
+            evicted_id, _ = self._records.popitem(last=False)
+            logger.debug(f"RefinementStore: usunięto najstarszy wpis {evicted_id}.")
+        return record
+
+    def track_task(self, task: asyncio.Task) -> None:
+        """Zachowuje referencję do zadania w tle do momentu jego zakończenia."""
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def get(self, schedule_id: UUID) -> Optional[RefinementRecord]:
+        """Zwraca wpis dla harmonogramu lub None."""
+        return self._records.get(schedule_id)
+
+    def mark_running(self, schedule_id: UUID) -> None:
+        record = self._records.get(schedule_id)
+        if record and not record.status.is_terminal:
+            record.status = RefinementStatus.RUNNING
+            record._touch()
+
+    def complete(self, schedule_id: UUID, refined_schedule: Any) -> None:
+        """
+        Zapisuje dopieszczoną wersję harmonogramu.
+
+        Args:
+            schedule_id: Identyfikator harmonogramu.
+            refined_schedule: GeneratedSchedule z podbitą wersją.
+        """
+        record = self._records.get(schedule_id)
+        if record is None:
+            logger.warning(f"Dopieszczony harmonogram {schedule_id} nie ma wpisu w rejestrze (usunięty?).")
+            return
+        record.schedule = refined_schedule
+        record.version = getattr(refined_schedule, "version", record.version + 1)
+        record.status = RefinementStatus.COMPLETED
+        record._touch()
+        logger.info(f"Dopieszczanie harmonogramu {schedule_id} zakończone (wersja {record.version}).")
+
+    def fail(self, schedule_id: UUID, error: str) -> None:
+        """Oznacza dopieszczanie jako nieudane; deterministyczna wersja pozostaje aktualna."""
+        record = self._records.get(schedule_id)
+        if record is None:
+            return
+        record.status = RefinementStatus.FAILED
+        record.error = error
+        record._touch()
+        logger.warning(f"Dopieszczanie harmonogramu {schedule_id} nie powiodło się: {error}")
+
+    async def wait_for_change(
+        self, schedule_id: UUID, timeout: Optional[float] = None
+    ) -> Optional[RefinementRecord]:
+        """
+        Czeka na zmianę stanu wpisu (lub timeout).
+
+        Args:
+            schedule_id: Identyfikator harmonogramu.
+            timeout: Maksymalny czas oczekiwania w sekundach.
+
+        Returns:
+            Aktualny wpis lub None, jeśli nie istnieje.
+        """
+        record = self._records.get(schedule_id)
+        if record is None or record.status.is_terminal:
+            return record
+        try:
+            await asyncio.wait_for(record._changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self._records.get(schedule_id)
+
+    def stats(self) -> Dict[str, int]:
+        """Zwraca liczbę wpisów w poszczególnych stanach oraz aktywnych zadań."""
+        counts: Dict[str, int] = {s.value: 0 for s in RefinementStatus}
+        for record in self._records.values():
+            counts[record.status.value] += 1
+        counts["active_tasks"] = len(self._tasks)
+        return counts
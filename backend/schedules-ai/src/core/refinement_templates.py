@@ -0,0 +1,267 @@
+# === File: schedules-ai/src/core/refinement_templates.py ===
+
+"""
+Structural Templates of LLM Refinements.
+
+Dni wielu użytkowników mają ten sam kształt: podobną godzinę pobudki, blok
+pracy i te same preferencje posiłków. Zamiast generować dopieszczenie od nowa,
+elementy dodane przez LLM (posiłki, rutyny, aktywności, przerwy) są tu
+zapamiętywane jako szablon kluczowany sygnaturą szkieletu:
+
+- segmenty szkieletu (sen, wydarzenia stałe, bloki sąsiadujących zadań z ich
+  liczbą) z godzinami zaokrąglonymi do `bucket_minutes`,
+- skrót preferencji wpływających na dopieszczenie (posiłki, rutyny, cele
+  aktywności) i chronotypu.
+
+Elementy szablonu są zapisywane względem najbliższej granicy segmentu, więc
+przy dopasowaniu przesuwają się razem z segmentami nowego szkieletu. Wynik
+przechodzi przez `repair_llm_schedule` (kolizje, luki); szablon, którego nie
+da się czysto nałożyć, jest traktowany jak chybienie — wtedy wywoływany jest LLM.
+
+Zapisywane są tylko typ i nazwa elementu (bez opisów), aby treści jednego
+użytkownika nie trafiały do harmonogramu innego.
+"""
+
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from src.core.schedule_repair import (
+    DAY_MINUTES,
+    Block,
+    format_minutes,
+    parse_minutes,
+    repair_llm_schedule,
+)
+
+logger = logging.getLogger(__name__)
+
+# Typy elementów dodawanych przez LLM, które szablon odtwarza; przerwy
+# wypełniające luki odtwarza `fill_gaps`.
+TEMPLATE_ITEM_TYPES = ("meal", "routine", "activity", "break")
+
+# Pola preferencji wpływające na dopieszczenie.
+PREFERENCE_KEY_FIELDS = ("meals", "routines", "activity_goals")
+
+Segment = Tuple[str, int, int, int]  # (rodzaj, start, koniec, liczba bloków)
+
+
+@dataclass(frozen=True)
+class TemplateItem:
+    """Element szablonu zakotwiczony do granicy segmentu szkieletu."""
+
+    segment: int  # indeks segmentu; -1 oznacza północ
+    edge: str  # "start" lub "end" segmentu
+    offset: int  # minuty od granicy
+    duration: int
+    type: str
+    name: str
+
+
+def skeleton_segments(anchors: Sequence[Block], bucket_minutes: int = 30) -> List[Segment]:
+    """
+    Zamienia bloki szkieletu na segmenty: sen, wydarzenia stałe i bloki zadań.
+
+    Zadania oddalone o nie więcej niż `bucket_minutes` tworzą jeden blok.
+
+    Returns:
+        Lista segmentów (rodzaj, start, koniec, liczba bloków) posortowana po starcie.
+    """
+    segments: List[List[Any]] = []
+    for start, end, meta in sorted(anchors, key=lambda b: b[0]):
+        if meta.get("type") == "task":
+            kind = "work"
+        elif str(meta.get("event_id", "")).startswith("sleep"):
+            kind = "sleep"
+        else:
+            kind = "event"
+        last = segments[-1] if segments else None
+        if kind == "work" and last is not None and last[0] == "work" and start - last[2] <= bucket_minutes:
+            last[2] = max(last[2], end)
+            last[3] += 1
+        else:
+            segments.append([kind, start, end, 1])
+    return [(kind, start, end, count) for kind, start, end, count in segments]
+
+
+def _bucket(minutes: int, bucket_minutes: int) -> int:
+    return int(round(minutes / bucket_minutes))
+
+
+def skeleton_signature(
+    segments: Sequence[Segment],
+    preferences: Optional[Dict[str, Any]],
+    chronotype: Optional[str] = None,
+    bucket_minutes: int = 30,
+) -> str:
+    """
+    Sygnatura strukturalna szkieletu: zaokrąglone segmenty i skrót preferencji.
+
+    Returns:
+        Skrót SHA-256 (hex).
+    """
+    prefs = preferences or {}
+    relevant = {
+        "segments": [
+            (kind, _bucket(start, bucket_minutes), _bucket(end, bucket_minutes), count)
+            for kind, start, end, count in segments
+        ],
+        "preferences": {key: prefs.get(key) for key in PREFERENCE_KEY_FIELDS},
+        "chronotype": chronotype,
+    }
+    payload = json.dumps(relevant, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _edges(segments: Sequence[Segment]) -> List[Tuple[int, str, int]]:
+    edges: List[Tuple[int, str, int]] = [(-1, "start", 0)]
+    for index, (_, start, end, _) in enumerate(segments):
+        edges.append((index, "start", start))
+        edges.append((index, "end", end))
+    return edges
+
+
+def _edge_minutes(segments: Sequence[Segment], segment: int, edge: str) -> int:
+    if segment < 0:
+        return 0
+    _, start, end, _ = segments[segment]
+    return start if edge == "start" else end
+
+
+def extract_template(items: Sequence[Dict[str, Any]], segments: Sequence[Segment]) -> List[TemplateItem]:
+    """
+    Wybiera z dopieszczonego harmonogramu elementy dodane przez LLM.
+
+    Returns:
+        Elementy szablonu zakotwiczone do najbliższej granicy segmentu.
+    """
+    edges = _edges(segments)
+    template: List[TemplateItem] = []
+    for item in items:
+        if not isinstance(item, dict) or item.get("type") not in TEMPLATE_ITEM_TYPES:
+            continue
+        start, end = parse_minutes(item.get("start_time")), parse_minutes(item.get("end_time"))
+        if start is None or end is None or end <= start:
+            continue
+        segment, edge, position = min(edges, key=lambda e: abs(start - e[2]))
+        template.append(TemplateItem(
+            segment=segment,
+            edge=edge,
+            offset=start - position,
+            duration=end - start,
+            type=item["type"],
+            name=str(item.get("name") or item["type"].title()),
+        ))
+    return template
+
+
+def apply_template(
+    template: Sequence[TemplateItem],
+    anchors: Sequence[Block],
+    segments: Sequence[Segment],
+    max_change_ratio: float = 0.2,
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Nakłada szablon na szkielet o tej samej sygnaturze.
+
+    Args:
+        template: Elementy z `extract_template`.
+        anchors: Bloki nowego szkieletu (zob. `Scheduler._skeleton_blocks`).
+        segments: Segmenty nowego szkieletu.
+        max_change_ratio: Udział elementów przesuniętych lub odrzuconych przy
+            naprawie, powyżej którego szablon nie jest używany.
+
+    Returns:
+        Kompletny harmonogram (z przerwami w lukach) lub None, jeśli szablon
+        nie pasuje do szkieletu.
+    """
+    items: List[Dict[str, Any]] = [dict(meta) for _, _, meta in anchors]
+    outside = 0
+    for entry in template:
+        if entry.segment >= len(segments):
+            return None
+        start = _edge_minutes(segments, entry.segment, entry.edge) + entry.offset
+        end = start + entry.duration
+        if start < 0 or end > DAY_MINUTES:
+            outside += 1
+            continue
+        items.append({
+            "type": entry.type,
+            "name": entry.name,
+            "start_time": format_minutes(start),
+            "end_time": format_minutes(end),
+            "duration_minutes": entry.duration,
+        })
+    repaired, report = repair_llm_schedule(items, anchors)
+    changes = outside + report.shifted + report.dropped_overlaps + report.dropped_invalid
+    if report.irreparable or changes > max_change_ratio * max(1, len(template)):
+        logger.debug(f"Szablon nie pasuje do szkieletu ({report.summary()}).")
+        return None
+    return repaired
+
+
+class RefinementTemplateStore:
+    """
+    Cache LRU szablonów dopieszczeń kluczowany sygnaturą szkieletu.
+
+    Używany z pętli zdarzeń (jeden wątek), więc nie wymaga blokad.
+    """
+
+    def __init__(self, max_entries: int = 2048, bucket_minutes: int = 30) -> None:
+        """
+        Args:
+            max_entries: Maksymalna liczba przechowywanych szablonów.
+            bucket_minutes: Dokładność porównywania godzin segmentów.
+        """
+        self._max_entries = max(1, int(max_entries))
+        self.bucket_minutes = max(1, int(bucket_minutes))
+        self._entries: "OrderedDict[str, Tuple[TemplateItem, ...]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._rejected = 0
+
+    def signature(
+        self, anchors: Sequence[Block], preferences: Optional[Dict[str, Any]], chronotype: Optional[str] = None,
+    ) -> Tuple[str, List[Segment]]:
+        """Zwraca sygnaturę i segmenty szkieletu."""
+        segments = skeleton_segments(anchors, self.bucket_minutes)
+        return skeleton_signature(segments, preferences, chronotype, self.bucket_minutes), segments
+
+    def apply(self, key: str, anchors: Sequence[Block], segments: Sequence[Segment]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Zwraca harmonogram z szablonu dla sygnatury lub None (chybienie).
+        """
+        template = self._entries.get(key)
+        if template is None:
+            self._misses += 1
+            return None
+        items = apply_template(template, anchors, segments)
+        if items is None:
+            self._rejected += 1
+            self._misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return items
+
+    def put(self, key: str, items: Sequence[Dict[str, Any]], segments: Sequence[Segment]) -> None:
+        """Zapisuje szablon z dopieszczonego harmonogramu (pomija puste)."""
+        template = tuple(extract_template(items, segments))
+        if not template:
+            return
+        self._entries[key] = template
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        """Zwraca rozmiar cache oraz liczbę trafień, chybień i odrzuconych szablonów."""
+        return {
+            "entries": len(self._entries),
+            "hits": self._hits,
+            "misses": self._misses,
+            "rejected": self._rejected,
+        }
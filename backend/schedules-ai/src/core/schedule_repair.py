@@ -0,0 +1,317 @@
+# === File: schedules-ai/src/core/schedule_repair.py ===
+
+"""
+Local Validation and Repair of LLM-Refined Schedules.
+
+LLM dostaje szkielet solvera (zadania + wydarzenia stałe) z instrukcją, by go
+nie przesuwać, ale nie zawsze jej przestrzega. Zamiast ponownie odpytywać LLM
+(kilka sekund), wynik jest tu porównywany ze szkieletem i naprawiany lokalnie:
+
+1. przesunięte zadania i wydarzenia stałe wracają na godziny ze szkieletu,
+   brakujące są dodawane, a wymyślone przez LLM — usuwane,
+2. nakładające się elementy są rozwiązywane według priorytetów typów (jak w
+   `Scheduler._process_core_schedule`); elementy elastyczne (posiłki, rutyny,
+   aktywności) są najpierw przesuwane do najbliższego wolnego okna,
+3. luki są wypełniane przerwami według tych samych reguł co w
+   `_process_core_schedule`.
+
+Tylko wynik nienadający się do naprawy (`RepairReport.irreparable`) powinien
+skutkować ponownym zapytaniem LLM.
+"""
+
+import logging
+import re
+from dataclasses import dataclass
+from datetime import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+Block = Tuple[int, int, Dict[str, Any]]
+
+DAY_MINUTES = 1440
+
+# Priorytet przy nakładaniu: fixed_event > task > meal > routine > activity > break
+PRIORITY_ORDER: Dict[str, int] = {
+    "fixed_event": 5,
+    "task": 4,
+    "meal": 3,
+    "routine": 2,
+    "activity": 1,
+    "break": 0,
+}
+
+ANCHOR_TYPES = ("task", "fixed_event")
+
+
+def format_minutes(minutes: int) -> str:
+    """Minuty od północy jako "HH:MM" (1440 -> "24:00")."""
+    if minutes >= DAY_MINUTES:
+        return "24:00"
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def parse_minutes(value: Any) -> Optional[int]:
+    """
+    Minuty od północy z `time` lub tekstu "HH:MM" (także "24:00").
+
+    Returns:
+        Liczba minut (0-1440) lub None, jeśli wartości nie da się odczytać.
+    """
+    if isinstance(value, time):
+        return value.hour * 60 + value.minute
+    if not isinstance(value, str):
+        return None
+    match = re.match(r"^\s*(\d{1,2}):(\d{2})", value)
+    if not match:
+        return None
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if minutes > 59 or hours > 24 or (hours == 24 and minutes):
+        return None
+    return hours * 60 + minutes
+
+
+def block_priority(meta: Dict[str, Any]) -> int:
+    return PRIORITY_ORDER.get(meta.get("type", "break"), 0)
+
+
+def _overlaps(start: int, end: int, blocks: Iterable[Block]) -> bool:
+    return any(max(start, other_start) < min(end, other_end) for other_start, other_end, _ in blocks)
+
+
+def _nearest_free_start(start: int, end: int, accepted: Sequence[Block], max_shift: int) -> Optional[int]:
+    """Najbliższy początek (o przesunięciu <= max_shift), przy którym blok się nie nakłada."""
+    duration = end - start
+    candidates = {start}
+    for other_start, other_end, _ in accepted:
+        candidates.add(other_end)
+        candidates.add(other_start - duration)
+    best: Optional[int] = None
+    for candidate in sorted(candidates, key=lambda c: (abs(c - start), c)):
+        if abs(candidate - start) > max_shift:
+            break
+        if candidate < 0 or candidate + duration > DAY_MINUTES:
+            continue
+        if not _overlaps(candidate, candidate + duration, accepted):
+            best = candidate
+            break
+    return best
+
+
+def resolve_overlaps(blocks: Sequence[Block], max_shift: int = 0) -> Tuple[List[Block], int, int]:
+    """
+    Usuwa nakładanie się bloków według `PRIORITY_ORDER`.
+
+    Bloki o wyższym priorytecie są umieszczane pierwsze (przy równym — wcześniejsze).
+    Kolidujący blok elastyczny (nie zadanie ani wydarzenie stałe) jest
+    przesuwany do najbliższego wolnego okna (o maks. `max_shift` minut),
+    a pozostałe kolidujące bloki są pomijane.
+
+    Args:
+        blocks: Krotki (start, koniec, element) w minutach od północy.
+        max_shift: Maksymalne przesunięcie kolidującego bloku (0 = brak przesuwania).
+
+    Returns:
+        Krotka (bloki bez nakładania posortowane po starcie, liczba
+        przesuniętych, liczba pominiętych).
+    """
+    accepted: List[Block] = []
+    shifted = dropped = 0
+    for start, end, meta in sorted(blocks, key=lambda b: (-block_priority(b[2]), b[0])):
+        if not _overlaps(start, end, accepted):
+            accepted.append((start, end, meta))
+            continue
+        new_start = None
+        if max_shift > 0 and meta.get("type") not in ANCHOR_TYPES:
+            new_start = _nearest_free_start(start, end, accepted, max_shift)
+        if new_start is None:
+            dropped += 1
+            continue
+        shifted += 1
+        new_end = new_start + (end - start)
+        accepted.append((new_start, new_end, {
+            **meta,
+            "start_time": format_minutes(new_start),
+            "end_time": format_minutes(new_end),
+        }))
+    accepted.sort(key=lambda b: b[0])
+    return accepted, shifted, dropped
+
+
+def _break_item(start: int, end: int, end_of_day: bool = False) -> Dict[str, Any]:
+    gap_duration = end - start
+    if end_of_day:
+        break_type, break_name = ("quick_break", "Quick Break") if gap_duration <= 30 else ("free_time", "Free Time")
+    elif gap_duration >= 120:  # Dłuższa niż 2 godziny
+        break_type, break_name = "free_time", "Free Time"
+    elif gap_duration >= 45:  # Między 45 minut a 2 godziny
+        break_type, break_name = "relaxation", "Relaxation"
+    elif gap_duration >= 15:  # Między 15 a 45 minut
+        break_type, break_name = "short_break", "Short Break"
+    else:  # Krótsza niż 15 minut
+        break_type, break_name = "quick_break", "Quick Break"
+    return {
+        "type": break_type,
+        "name": break_name,
+        "start_time": format_minutes(start),
+        "end_time": format_minutes(end),
+        "duration_minutes": gap_duration,
+    }
+
+
+def fill_gaps(blocks: Sequence[Block]) -> List[Dict[str, Any]]:
+    """
+    Zamienia posortowane bloki na listę elementów, wstawiając przerwy w lukach.
+
+    Typ przerwy zależy od długości luki; dzień jest domykany do 24:00.
+
+    Returns:
+        Lista elementów harmonogramu.
+    """
+    final: List[Dict[str, Any]] = []
+    prev_end = 0
+    for start, end, meta in blocks:
+        if start > prev_end:
+            final.append(_break_item(prev_end, start))
+        final.append(meta)
+        prev_end = max(prev_end, end)
+    if prev_end < DAY_MINUTES:
+        final.append(_break_item(prev_end, DAY_MINUTES, end_of_day=True))
+    return final
+
+
+@dataclass
+class RepairReport:
+    """Podsumowanie zmian wprowadzonych w harmonogramie z LLM."""
+
+    llm_items: int = 0
+    moved_anchors: int = 0
+    restored_anchors: int = 0
+    dropped_unknown: int = 0
+    dropped_invalid: int = 0
+    shifted: int = 0
+    dropped_overlaps: int = 0
+    max_change_ratio: float = 0.5
+
+    @property
+    def changes(self) -> int:
+        """Liczba elementów z LLM, które trzeba było poprawić lub odrzucić."""
+        return (
+            self.moved_anchors + self.dropped_unknown + self.dropped_invalid
+            + self.shifted + self.dropped_overlaps
+        )
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.changes or self.restored_anchors)
+
+    @property
+    def irreparable(self) -> bool:
+        """True, gdy LLM nie zwrócił nic użytecznego lub zignorował szkielet."""
+        return self.llm_items == 0 or self.changes / self.llm_items > self.max_change_ratio
+
+    def summary(self) -> str:
+        return (
+            f"{self.llm_items} items: {self.moved_anchors} moved back, {self.restored_anchors} restored, "
+            f"{self.dropped_unknown} unknown dropped, {self.dropped_invalid} invalid, "
+            f"{self.shifted} shifted, {self.dropped_overlaps} overlapping dropped"
+        )
+
+
+def _normalize(value: Any) -> str:
+    return re.sub(r"[\s_\-]+", " ", str(value or "")).strip().lower()
+
+
+def _anchor_keys(meta: Dict[str, Any]) -> List[str]:
+    keys = []
+    for field_name in ("task_id", "event_id"):
+        if meta.get(field_name):
+            keys.append(f"id:{_normalize(meta[field_name])}")
+    if meta.get("name"):
+        keys.append(f"name:{_normalize(meta['name'])}")
+    if meta.get("event_id"):
+        keys.append(f"name:{_normalize(meta['event_id'])}")
+    return keys
+
+
+def _item_keys(item: Dict[str, Any]) -> List[str]:
+    keys = []
+    for field_name in ("task_id", "event_id", "id"):
+        if item.get(field_name):
+            keys.append(f"id:{_normalize(item[field_name])}")
+    if item.get("name"):
+        keys.append(f"name:{_normalize(item['name'])}")
+    return keys
+
+
+def repair_llm_schedule(
+    items: Any,
+    anchors: Sequence[Block],
+    max_shift: int = 60,
+    max_change_ratio: float = 0.5,
+) -> Tuple[List[Dict[str, Any]], RepairReport]:
+    """
+    Porównuje harmonogram z LLM ze szkieletem solvera i naprawia go lokalnie.
+
+    Args:
+        items: Lista `schedule` z odpowiedzi LLM.
+        anchors: Bloki szkieletu (zadania i wydarzenia stałe) — ich godziny są
+            wiążące (zob. `Scheduler._skeleton_blocks`).
+        max_shift: Maksymalne przesunięcie elementu elastycznego przy kolizji (min).
+        max_change_ratio: Udział poprawionych/odrzuconych elementów, powyżej
+            którego wynik jest uznawany za nienadający się do naprawy.
+
+    Returns:
+        Krotka (naprawione elementy z przerwami w lukach, raport).
+    """
+    report = RepairReport(max_change_ratio=max_change_ratio)
+    if not isinstance(items, list):
+        return [], report
+
+    unmatched: Dict[str, List[int]] = {}
+    for index, (_, _, meta) in enumerate(anchors):
+        for key in _anchor_keys(meta):
+            unmatched.setdefault(key, []).append(index)
+    matched: Dict[int, Dict[str, Any]] = {}
+    flexible: List[Block] = []
+
+    for item in items:
+        if not isinstance(item, dict):
+            report.dropped_invalid += 1
+            continue
+        report.llm_items += 1
+        start, end = parse_minutes(item.get("start_time")), parse_minutes(item.get("end_time"))
+        if item.get("type") in ANCHOR_TYPES:
+            index = next(
+                (i for key in _item_keys(item) for i in unmatched.get(key, []) if i not in matched),
+                None,
+            )
+            if index is None:
+                report.dropped_unknown += 1
+                continue
+            anchor_start, anchor_end, _ = anchors[index]
+            if (start, end) != (anchor_start, anchor_end):
+                report.moved_anchors += 1
+            matched[index] = item
+            continue
+        if start is None or end is None or end <= start:
+            report.dropped_invalid += 1
+            continue
+        flexible.append((start, end, {
+            **item,
+            "start_time": format_minutes(start),
+            "end_time": format_minutes(end),
+            "duration_minutes": end - start,
+        }))
+
+    fixed_blocks: List[Block] = []
+    for index, (start, end, meta) in enumerate(anchors):
+        if index in matched:
+            # Dodatkowe pola z LLM (np. opis) zostają; godziny i identyfikatory ze szkieletu.
+            meta = {**matched[index], **meta}
+        else:
+            report.restored_anchors += 1
+        fixed_blocks.append((start, end, meta))
+
+    placed, report.shifted, report.dropped_overlaps = resolve_overlaps(fixed_blocks + flexible, max_shift)
+    return fill_gaps(placed), report
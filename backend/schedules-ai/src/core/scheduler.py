@@ -10,12 +10,14 @@ Koordynuje generowanie spersonalizowanego harmonogramu dnia, korzystając z:
 4. ConstraintSchedulerSolver – tworzy szkielet harmonogramu (zadania + wydarzenia stałe + sen), bez nakładania się bloków.
 5. LLMEngine – dopieszcza szkielet (dodaje posiłki, rutyny, przerwy, wypełnia luki) bez modyfikacji godzin podstawowych zadań/wydarzeń.
 """
+import asyncio
 import logging
 import os
 import yaml
-from dataclasses import dataclass, field
+from concurrent.futures import Executor
+from dataclasses import dataclass, field, replace
 from datetime import date, datetime, time, timedelta, timezone
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
 from uuid import UUID, uuid4
 
 from src.core.chronotype import Chronotype, ChronotypeAnalyzer, ChronotypeProfile
@@ -26,6 +28,10 @@ from src.core.constraint_solver import (
     SolverInput,
     SolverTask,
 )
+from src.core.profile_cache import PreparedProfile, ProfileCache
+from src.core.refinement import RefinementStore
+from src.core.refinement_templates import RefinementTemplateStore, Segment
+from src.core.schedule_repair import Block, fill_gaps, repair_llm_schedule, resolve_overlaps
 from src.core.sleep import SleepCalculator, SleepMetrics
 from src.core.task_prioritizer import (
     EnergyLevel,
@@ -39,10 +45,12 @@ from src.utils.time_utils import (
     total_minutes_to_time,
 )
 from src.services.llm_engine import (
+    InvalidLLMOutputError,
     LLMEngine,
     ScheduleGenerationContext,
     RAGContext,
 )
+from src.services.llm_limits import LLMPriority, llm_priority
 
 logger = logging.getLogger(__name__)
 CORE_IMPORTS_OK: bool = True
@@ -76,6 +84,8 @@ class GeneratedSchedule:
         default_factory=lambda: datetime.now(timezone.utc)
     )
     warnings: List[str] = field(default_factory=list)
+    version: int = 1
+    refinement_status: Optional[str] = None
 
 
 class Scheduler:
@@ -94,6 +104,10 @@ class Scheduler:
         wearable_service: Optional[Any] = None, # Placeholder for a Wearable Service/Adapter
         history_service: Optional[Any] = None,  # Placeholder for a History Service/Adapter
         config: Optional[Dict[str, Any]] = None,
+        refinement_store: Optional[RefinementStore] = None,
+        solver_executor: Optional[Executor] = None,
+        profile_cache: Optional[ProfileCache] = None,
+        refinement_templates: Optional[RefinementTemplateStore] = None,
     ) -> None:
         """
         Inicjalizuje Scheduler z niezbędnymi komponentami.
@@ -105,6 +119,16 @@ class Scheduler:
             constraint_solver: Komponent rozwiązujący harmonogram bez nakładania.
             llm_engine: Opcjonalny silnik LLM do dopieszczania harmonogramu.
             config: Opcjonalna konfiguracja.
+            refinement_store: Rejestr odroczonych dopieszczeń LLM (tryb
+                "najpierw deterministycznie"). Bez niego tryb odroczony jest wyłączony.
+            solver_executor: Executor, w którym uruchamiany jest solver CP-SAT.
+                None oznacza domyślny executor pętli zdarzeń.
+            profile_cache: Cache profilu, okna snu i wzorca energii
+                współdzielony między żądaniami. Bez niego wartości są liczone
+                przy każdym żądaniu.
+            refinement_templates: Szablony dopieszczeń współdzielone między
+                użytkownikami. Dla szkieletu o znanej sygnaturze elementy z
+                szablonu są nakładane lokalnie, bez wywołania LLM.
 
         Raises:
             ImportError: Jeżeli brakuje komponentów core.
@@ -122,84 +146,568 @@ class Scheduler:
         self._llm_refinement_enabled = (
             llm_engine is not None and self.config.get("use_llm_refinement", True)
         )
+        self.refinement_store = refinement_store
+        self._defer_refinement_default = bool(
+            self.config.get("defer_llm_refinement", False)
+        )
+        self.solver_executor = solver_executor
+        self.profile_cache = profile_cache
+        self.refinement_templates = refinement_templates
         logger.info(
             f"Scheduler zainicjalizowany (LLM dopieszczanie: {self._llm_refinement_enabled})"
         )
 
     async def generate_schedule(
-        self, input_data: ScheduleInputData
+        self,
+        input_data: ScheduleInputData,
+        defer_refinement: Optional[bool] = None,
     ) -> GeneratedSchedule:
         """
         Główna metoda generująca harmonogram dnia.
 
         Args:
             input_data: Dane wejściowe do wygenerowania harmonogramu.
+            defer_refinement: Jeśli True (lub domyślnie wg configu
+                `defer_llm_refinement`), zwraca od razu deterministyczny wynik
+                `_process_core_schedule` (wersja 1), a dopieszczanie LLM
+                kontynuuje w tle i zapisuje wersję 2 w `refinement_store`.
 
         Returns:
             GeneratedSchedule: Obiekt z harmonogramem, metrykami, ostrzeżeniami.
         """
-        warnings: List[str] = []
         try:
-            # 1) Profil i metryki snu
+            # 1) Profil, metryki snu i wzorzec energii
+            prepared = self._prepare_user_state(input_data)
+            return await self._generate_with_profile(
+                input_data, prepared, defer_refinement
+            )
+        except Exception as e:
+            logger.exception("Nieoczekiwany błąd podczas generowania harmonogramu.")
+            return self._create_empty(input_data, [], f"Błąd wewnętrzny: {e}")
+
+    async def generate_many(
+        self,
+        inputs: Sequence[ScheduleInputData],
+        defer_refinement: Optional[bool] = None,
+        use_llm: Optional[bool] = None,
+    ) -> AsyncIterator[Tuple[int, GeneratedSchedule]]:
+        """
+        Generuje harmonogramy dla wielu wejść naraz, zwracając je w kolejności ukończenia.
+
+        Profil chronotypu i metryki snu są liczone raz na użytkownika (i zestaw
+        preferencji) w obrębie partii, rozwiązania solvera trafiają równolegle do
+        executora solvera, a dopieszczanie LLM jest ograniczone semaforem
+        `bulk_llm_concurrency` z configu.
+
+        Args:
+            inputs: Lista danych wejściowych.
+            defer_refinement: Jak w `generate_schedule`.
+            use_llm: False wyłącza dopieszczanie LLM dla całej partii
+                (None = wg konfiguracji Schedulera).
+
+        Yields:
+            Krotki (indeks wejścia, GeneratedSchedule).
+        """
+        llm_semaphore = asyncio.Semaphore(
+            max(1, int(self.config.get("bulk_llm_concurrency", 4)))
+        )
+        batch_memo: Dict[str, PreparedProfile] = {}
+
+        async def run_one(index: int, input_data: ScheduleInputData) -> Tuple[int, GeneratedSchedule]:
+            try:
+                # Przygotowanie profilu jest synchroniczne, więc kolejne wejścia
+                # tego samego użytkownika widzą już wynik w `batch_memo`.
+                prepared = self._prepare_user_state(input_data, batch_memo)
+                result = await self._generate_with_profile(
+                    input_data, prepared, defer_refinement, llm_semaphore, use_llm
+                )
+            except Exception as e:
+                logger.exception(f"Błąd generowania harmonogramu #{index} w partii.")
+                result = self._create_empty(input_data, [], f"Błąd wewnętrzny: {e}")
+            return index, result
+
+        tasks = [
+            asyncio.ensure_future(run_one(i, data)) for i, data in enumerate(inputs)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _prepare_user_state(
+        self,
+        input_data: ScheduleInputData,
+        batch_memo: Optional[Dict[str, PreparedProfile]] = None,
+    ) -> PreparedProfile:
+        """
+        Zwraca profil chronotypu, metryki snu i wzorzec energii użytkownika.
+
+        Wartości są brane z `profile_cache` (lub z `batch_memo` w obrębie partii),
+        a liczone tylko przy braku wpisu dla bieżących pól profilu/preferencji.
+
+        Args:
+            input_data: Dane wejściowe.
+            batch_memo: Opcjonalny słownik współdzielony w obrębie jednej partii.
+
+        Returns:
+            PreparedProfile.
+        """
+        key = ProfileCache.make_key(
+            input_data.user_id, input_data.user_profile_data, input_data.preferences
+        )
+        if batch_memo is not None and key in batch_memo:
+            return batch_memo[key]
+        prepared = self.profile_cache.get(key) if self.profile_cache is not None else None
+        if prepared is None:
             profile = self._prepare_profile(input_data)
-            sleep_metrics = self._calculate_sleep(profile, input_data)
+            prepared = PreparedProfile(
+                profile=profile,
+                sleep_metrics=self._calculate_sleep(profile, input_data),
+                energy_pattern=self.task_prioritizer.get_energy_pattern(profile),
+            )
+            if self.profile_cache is not None:
+                self.profile_cache.put(input_data.user_id, key, prepared)
+        if batch_memo is not None:
+            batch_memo[key] = prepared
+        return prepared
+
+    async def _solve(self, solver_input: SolverInput) -> Optional[List[ScheduledTaskInfo]]:
+        """
+        Uruchamia synchroniczny solver CP-SAT w executorze, nie blokując pętli zdarzeń.
+
+        Args:
+            solver_input: Dane wejściowe solvera.
+
+        Returns:
+            Lista ScheduledTaskInfo lub None.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.solver_executor, self.constraint_solver.solve, solver_input
+        )
+
+    async def _generate_with_profile(
+        self,
+        input_data: ScheduleInputData,
+        prepared: PreparedProfile,
+        defer_refinement: Optional[bool] = None,
+        llm_semaphore: Optional[asyncio.Semaphore] = None,
+        use_llm: Optional[bool] = None,
+    ) -> GeneratedSchedule:
+        """
+        Kroki 2-4 generowania (solver i dopieszczanie) dla gotowego profilu.
+
+        Args:
+            input_data: Dane wejściowe.
+            prepared: Profil, rekomendacje snu i wzorzec energii.
+            defer_refinement: Jak w `generate_schedule`.
+            llm_semaphore: Opcjonalny limit równoległych wywołań LLM.
+            use_llm: False pomija dopieszczanie LLM niezależnie od konfiguracji.
 
-            # 2) Przygotowanie danych dla solvera
-            solver_input = self._prepare_solver_input(
-                input_data, profile, sleep_metrics
+        Returns:
+            GeneratedSchedule.
+        """
+        warnings: List[str] = []
+        profile = prepared.profile
+        sleep_metrics = prepared.sleep_metrics
+        energy_pattern = prepared.energy_pattern
+
+        # 2-3) Dane dla solvera i constraint solver
+        core_schedule, error = await self._solve_skeleton(input_data, prepared, warnings)
+        if core_schedule is None:
+            return self._create_empty(input_data, warnings, error)
+
+        # 4) Dopieszczanie LLM
+        refine = use_llm is not False and self._can_refine(warnings)
+        if defer_refinement is None:
+            defer_refinement = self._defer_refinement_default
+        if refine and defer_refinement and self.refinement_store is not None:
+            return self._start_deferred_refinement(
+                input_data, profile, sleep_metrics, core_schedule, warnings,
+                energy_pattern,
             )
-            if solver_input is None:
-                return self._create_empty(
-                    input_data,
-                    warnings,
-                    "Błąd przygotowania danych dla solvera.",
+
+        if refine:
+            logger.debug("Dopieszczanie harmonogramu za pomocą LLM...")
+            if llm_semaphore is not None:
+                async with llm_semaphore:
+                    final_items, metrics, explanations = await self._refine_with_llm(
+                        input_data, profile, sleep_metrics, core_schedule, energy_pattern
+                    )
+            else:
+                final_items, metrics, explanations = await self._refine_with_llm(
+                    input_data, profile, sleep_metrics, core_schedule, energy_pattern
                 )
+        else:
+            final_items = self._process_core_schedule(
+                core_schedule, input_data, sleep_metrics, profile, energy_pattern
+            )
+            metrics = self._calculate_metrics(final_items, input_data.tasks)
+            explanations = {}
+
+        return GeneratedSchedule(
+            user_id=input_data.user_id,
+            target_date=input_data.target_date,
+            scheduled_items=final_items,
+            metrics=metrics,
+            explanations=explanations,
+            warnings=warnings,
+        )
+
+    async def stream_schedule(
+        self, input_data: ScheduleInputData
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Generuje harmonogram, przekazując elementy dopieszczane przez LLM na bieżąco.
 
-            # 3) Constraint solver
-            logger.debug("Uruchamiam ConstraintSchedulerSolver...")
-            core_schedule = self.constraint_solver.solve(solver_input)
+        Yields:
+            Krotki ("item", słownik elementu) dla kolejnych elementów, a na końcu
+            dokładnie jedną krotkę ("schedule", GeneratedSchedule). Końcowy
+            harmonogram jest wiążący — strumieniowane elementy są jego podglądem.
+            Bez LLM elementy deterministycznego harmonogramu są wysyłane od razu.
+        """
+        try:
+            prepared = self._prepare_user_state(input_data)
+            warnings: List[str] = []
+            if not self._can_refine(warnings):
+                schedule = await self._generate_with_profile(input_data, prepared, use_llm=False)
+                schedule.warnings[:0] = warnings
+                for item in schedule.scheduled_items:
+                    yield "item", item
+                yield "schedule", schedule
+                return
+
+            core_schedule, error = await self._solve_skeleton(input_data, prepared, warnings)
             if core_schedule is None:
-                logger.warning("Solver nie znalazł żadnego rozwiązania.")
-                return self._create_empty(
-                    input_data,
-                    warnings + ["Brak możliwego harmonogramu core."],
-                    "Constraint solver nie powiódł się.",
-                )
+                yield "schedule", self._create_empty(input_data, warnings, error)
+                return
 
-            # 4) Dopieszczanie LLM
-            if self._llm_refinement_enabled and self.llm_engine:
-                logger.debug("Dopieszczanie harmonogramu za pomocą LLM...")
-                context = self._create_llm_context(
-                    input_data, profile, sleep_metrics
-                )
-                llm_output = await self.llm_engine.refine_and_complete_schedule(
-                    core_schedule, context
+            anchors = self._skeleton_blocks(
+                core_schedule, input_data, prepared.sleep_metrics, prepared.profile,
+                prepared.energy_pattern,
+            )
+            signature = self._template_signature(anchors, input_data, prepared.profile)
+            templated = self._apply_template(signature, anchors)
+            if templated is not None:
+                for item in templated:
+                    yield "item", item
+                yield "schedule", GeneratedSchedule(
+                    user_id=input_data.user_id,
+                    target_date=input_data.target_date,
+                    scheduled_items=templated,
+                    metrics=self._calculate_metrics(templated, input_data.tasks),
+                    explanations={},
+                    warnings=warnings,
                 )
-                final_items = llm_output.get("schedule", [])  # type: ignore
-                metrics = llm_output.get("metrics", {})  # type: ignore
-                explanations = llm_output.get("explanations", {})  # type: ignore
-            else:
+                return
+
+            context = self._create_llm_context(
+                input_data, prepared.profile, prepared.sleep_metrics, prepared.energy_pattern
+            )
+            llm_output: Dict[str, Any] = {}
+            async for event in self.llm_engine.stream_refined_schedule(core_schedule, context):  # type: ignore
+                if event["type"] == "item":
+                    yield "item", event["item"]
+                else:
+                    llm_output = event["schedule"]
+            repair = self._llm_output_repairer(anchors)
+            try:
+                llm_output = repair(llm_output)
+                self._store_template(signature, llm_output)
+            except InvalidLLMOutputError as e:
+                logger.warning(f"{e} Zwracam harmonogram deterministyczny.")
+                warnings.append("Dopieszczanie LLM nieudane; zwrócono harmonogram deterministyczny.")
                 final_items = self._process_core_schedule(
-                    core_schedule, input_data, sleep_metrics
+                    core_schedule, input_data, prepared.sleep_metrics, prepared.profile,
+                    prepared.energy_pattern,
                 )
-                metrics = self._calculate_metrics(final_items, input_data.tasks)
-                explanations = {}
+                llm_output = {
+                    "schedule": final_items,
+                    "metrics": self._calculate_metrics(final_items, input_data.tasks),
+                }
+        except Exception as e:
+            logger.exception("Nieoczekiwany błąd podczas strumieniowania harmonogramu.")
+            yield "schedule", self._create_empty(input_data, [], f"Błąd wewnętrzny: {e}")
+            return
 
-            return GeneratedSchedule(
-                user_id=input_data.user_id,
-                target_date=input_data.target_date,
+        yield "schedule", GeneratedSchedule(
+            user_id=input_data.user_id,
+            target_date=input_data.target_date,
+            scheduled_items=llm_output.get("schedule", []),
+            metrics=llm_output.get("metrics", {}),
+            explanations=llm_output.get("explanations", {}),
+            warnings=warnings,
+        )
+
+    async def explain_schedule(
+        self,
+        input_data: ScheduleInputData,
+        schedule: GeneratedSchedule,
+        item_indices: Optional[Sequence[int]] = None,
+    ) -> Dict[int, str]:
+        """
+        Wyjaśnia rozmieszczenie elementów harmonogramu jednym zapytaniem do LLM.
+
+        Args:
+            input_data: Dane wejściowe, z których powstał harmonogram (profil, preferencje).
+            schedule: Harmonogram do wyjaśnienia.
+            item_indices: Indeksy elementów do wyjaśnienia (None = wszystkie).
+
+        Returns:
+            Słownik indeks elementu -> wyjaśnienie (pusty, gdy LLM nie jest skonfigurowany).
+        """
+        if self.llm_engine is None:
+            return {}
+        items = schedule.scheduled_items
+        if item_indices is None:
+            indices = list(range(len(items)))
+        else:
+            indices = [i for i in dict.fromkeys(item_indices) if 0 <= i < len(items)]
+        if not indices:
+            return {}
+        prepared = self._prepare_user_state(input_data)
+        context = self._create_llm_context(
+            input_data, prepared.profile, prepared.sleep_metrics, prepared.energy_pattern
+        )
+        texts = await self.llm_engine.explain_schedule_items(
+            [items[i] for i in indices], context
+        )
+        return dict(zip(indices, texts))
+
+    async def _solve_skeleton(
+        self,
+        input_data: ScheduleInputData,
+        prepared: PreparedProfile,
+        warnings: List[str],
+    ) -> Tuple[Optional[List[ScheduledTaskInfo]], str]:
+        """
+        Przygotowuje dane dla solvera i uruchamia go.
+
+        Returns:
+            Krotka (szkielet harmonogramu lub None, komunikat błędu gdy None).
+        """
+        solver_input = self._prepare_solver_input(
+            input_data, prepared.profile, prepared.sleep_metrics, prepared.energy_pattern
+        )
+        if solver_input is None:
+            return None, "Błąd przygotowania danych dla solvera."
+
+        logger.debug("Uruchamiam ConstraintSchedulerSolver...")
+        core_schedule = await self._solve(solver_input)
+        if core_schedule is None:
+            logger.warning("Solver nie znalazł żadnego rozwiązania.")
+            warnings.append("Brak możliwego harmonogramu core.")
+            return None, "Constraint solver nie powiódł się."
+        return core_schedule, ""
+
+    def _can_refine(self, warnings: List[str]) -> bool:
+        """
+        Sprawdza, czy dopieszczanie LLM jest włączone i dostawca jest osiągalny.
+
+        Przy otwartym bezpieczniku (circuit breaker) dostawcy zwraca False od
+        razu, zamiast czekać na ponowienia i odpowiedź awaryjną LLM — wynik
+        `_process_core_schedule` jest wtedy lepszy i natychmiastowy.
+
+        Args:
+            warnings: Lista ostrzeżeń; dopisywane jest ostrzeżenie o pominięciu.
+
+        Returns:
+            True, jeśli należy wywołać LLM.
+        """
+        if not self._llm_refinement_enabled or self.llm_engine is None:
+            return False
+        if not self.llm_engine.is_available():
+            logger.warning("Dostawca LLM niedostępny (otwarty bezpiecznik); pomijam dopieszczanie.")
+            warnings.append("Dopieszczanie LLM pominięte: dostawca LLM jest chwilowo niedostępny.")
+            return False
+        return True
+
+    async def _refine_with_llm(
+        self,
+        input_data: ScheduleInputData,
+        profile: ChronotypeProfile,
+        sleep_metrics: SleepMetrics,
+        core_schedule: List[ScheduledTaskInfo],
+        energy_pattern: Optional[Dict[int, float]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any], Dict[str, Any]]:
+        """
+        Wywołuje LLMEngine w celu dopieszczenia szkieletu solvera.
+
+        Przy trafieniu w szablon strukturalny (`refinement_templates`) wynik
+        powstaje lokalnie, bez wywołania LLM; dopieszczenie z LLM zapisuje
+        szablon dla kolejnych szkieletów o tej samej sygnaturze.
+
+        Returns:
+            Krotka (elementy harmonogramu, metryki, wyjaśnienia).
+        """
+        anchors = self._skeleton_blocks(
+            core_schedule, input_data, sleep_metrics, profile, energy_pattern
+        )
+        signature = self._template_signature(anchors, input_data, profile)
+        templated = self._apply_template(signature, anchors)
+        if templated is not None:
+            return templated, self._calculate_metrics(templated, input_data.tasks), {}
+
+        context = self._create_llm_context(
+            input_data, profile, sleep_metrics, energy_pattern
+        )
+        llm_output = await self.llm_engine.refine_and_complete_schedule(  # type: ignore
+            core_schedule, context, repair=self._llm_output_repairer(anchors)
+        )
+        self._store_template(signature, llm_output)  # type: ignore
+        final_items = llm_output.get("schedule", [])  # type: ignore
+        metrics = llm_output.get("metrics", {})  # type: ignore
+        explanations = llm_output.get("explanations", {})  # type: ignore
+        return final_items, metrics, explanations
+
+    def _template_signature(
+        self,
+        anchors: List[Block],
+        input_data: ScheduleInputData,
+        profile: ChronotypeProfile,
+    ) -> Optional[Tuple[str, List[Segment]]]:
+        """Sygnatura szkieletu i jego segmenty (None bez rejestru szablonów)."""
+        if self.refinement_templates is None:
+            return None
+        chronotype = getattr(getattr(profile, "primary_chronotype", None), "value", None)
+        return self.refinement_templates.signature(anchors, input_data.preferences, chronotype)
+
+    def _apply_template(
+        self,
+        signature: Optional[Tuple[str, List[Segment]]],
+        anchors: List[Block],
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Harmonogram z szablonu pasującego do szkieletu lub None (wtedy wywoływany jest LLM)."""
+        if signature is None:
+            return None
+        key, segments = signature
+        items = self.refinement_templates.apply(key, anchors, segments)  # type: ignore
+        if items is not None:
+            logger.info("Dopieszczenie z szablonu strukturalnego; pomijam wywołanie LLM.")
+        return items
+
+    def _store_template(
+        self,
+        signature: Optional[Tuple[str, List[Segment]]],
+        llm_output: Dict[str, Any],
+    ) -> None:
+        """Zapisuje szablon z udanego dopieszczenia (pomija odpowiedź awaryjną LLMEngine)."""
+        if signature is None or llm_output.get("metrics", {}).get("status") == "fallback":
+            return
+        key, segments = signature
+        self.refinement_templates.put(key, llm_output.get("schedule") or [], segments)  # type: ignore
+
+    def _llm_output_repairer(self, anchors: List[Block]) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Tworzy funkcję naprawiającą wynik LLM względem szkieletu solvera.
+
+        Zwrócona funkcja przywraca godziny zadań i wydarzeń stałych, rozwiązuje
+        nakładanie i wypełnia luki (zob. `schedule_repair`). Dla wyniku, którego
+        nie da się naprawić, zgłasza `InvalidLLMOutputError` — tylko wtedy
+        LLMEngine ponawia zapytanie.
+
+        Args:
+            anchors: Bloki szkieletu (zob. `_skeleton_blocks`).
+
+        Returns:
+            Funkcja: wynik LLM -> naprawiony wynik LLM.
+        """
+        def repair(llm_output: Dict[str, Any]) -> Dict[str, Any]:
+            items, report = repair_llm_schedule(llm_output.get("schedule"), anchors)
+            if report.irreparable:
+                raise InvalidLLMOutputError(f"Harmonogram LLM nie do naprawienia ({report.summary()}).")
+            if report.changed:
+                logger.info(f"Naprawiono harmonogram LLM lokalnie: {report.summary()}.")
+            return {**llm_output, "schedule": items}
+
+        return repair
+
+    def _start_deferred_refinement(
+        self,
+        input_data: ScheduleInputData,
+        profile: ChronotypeProfile,
+        sleep_metrics: SleepMetrics,
+        core_schedule: List[ScheduledTaskInfo],
+        warnings: List[str],
+        energy_pattern: Optional[Dict[int, float]] = None,
+    ) -> GeneratedSchedule:
+        """
+        Zwraca deterministyczny harmonogram (wersja 1) i uruchamia dopieszczanie LLM w tle.
+
+        Returns:
+            GeneratedSchedule z `refinement_status="pending"`.
+        """
+        final_items = self._process_core_schedule(
+            core_schedule, input_data, sleep_metrics, profile, energy_pattern
+        )
+        deterministic = GeneratedSchedule(
+            user_id=input_data.user_id,
+            target_date=input_data.target_date,
+            scheduled_items=final_items,
+            metrics=self._calculate_metrics(final_items, input_data.tasks),
+            explanations={},
+            warnings=warnings,
+            version=1,
+            refinement_status="pending",
+        )
+        store = self.refinement_store
+        store.register(deterministic)  # type: ignore
+        task = asyncio.create_task(
+            self._refine_in_background(
+                deterministic, input_data, profile, sleep_metrics, core_schedule,
+                energy_pattern,
+            )
+        )
+        store.track_task(task)  # type: ignore
+        logger.info(
+            f"Zwracam deterministyczny harmonogram {deterministic.schedule_id}; "
+            f"dopieszczanie LLM kontynuowane w tle."
+        )
+        return deterministic
+
+    async def _refine_in_background(
+        self,
+        deterministic: GeneratedSchedule,
+        input_data: ScheduleInputData,
+        profile: ChronotypeProfile,
+        sleep_metrics: SleepMetrics,
+        core_schedule: List[ScheduledTaskInfo],
+        energy_pattern: Optional[Dict[int, float]] = None,
+    ) -> None:
+        """
+        Zadanie w tle: dopieszcza harmonogram i zapisuje nową wersję w rejestrze.
+
+        Wywołania LLM mają priorytet tła — limiter dostawcy przepuszcza przed
+        nimi żądania interaktywne.
+        """
+        store = self.refinement_store
+        store.mark_running(deterministic.schedule_id)  # type: ignore
+        try:
+            with llm_priority(LLMPriority.BACKGROUND):
+                final_items, metrics, explanations = await self._refine_with_llm(
+                    input_data, profile, sleep_metrics, core_schedule, energy_pattern
+                )
+            if not final_items:
+                raise ValueError("LLM zwrócił pusty harmonogram.")
+            refined = replace(
+                deterministic,
                 scheduled_items=final_items,
                 metrics=metrics,
                 explanations=explanations,
-                warnings=warnings,
+                generation_timestamp=datetime.now(timezone.utc),
+                version=deterministic.version + 1,
+                refinement_status="completed",
             )
+            store.complete(deterministic.schedule_id, refined)  # type: ignore
+        except asyncio.CancelledError:
+            store.fail(deterministic.schedule_id, "Dopieszczanie anulowane.")  # type: ignore
+            raise
         except Exception as e:
-            logger.exception("Nieoczekiwany błąd podczas generowania harmonogramu.")
-            return self._create_empty(
-                input_data,
-                warnings,
-                f"Błąd wewnętrzny: {e}",
-            )
+            logger.exception("Błąd dopieszczania harmonogramu w tle.")
+            store.fail(deterministic.schedule_id, str(e))  # type: ignore
 
     def _prepare_profile(
         self, input_data: ScheduleInputData
@@ -229,7 +737,6 @@ class Scheduler:
             user_id=input_data.user_id,
             chronotype=Chronotype.UNKNOWN,
             source="default",
-            age=(input_data.user_profile_data or {}).get("age"),
         )
 
     def _calculate_sleep(
@@ -274,6 +781,7 @@ class Scheduler:
         input_data: ScheduleInputData,
         profile: ChronotypeProfile,
         sleep_metrics: SleepMetrics,
+        energy_pattern: Optional[Dict[int, float]] = None,
     ) -> Optional[SolverInput]:
         """
         Konwertuje dane wejściowe na SolverInput, dodając sen jako wydarzenie stałe.
@@ -282,6 +790,7 @@ class Scheduler:
             input_data: Dane wejściowe.
             profile: Profil chronotypu.
             sleep_metrics: Rekomendacje snu.
+            energy_pattern: Gotowy wzorzec energii (liczony z profilu, jeśli brak).
 
         Returns:
             SolverInput lub None jeśli błąd.
@@ -350,7 +859,8 @@ class Scheduler:
                 solver_events.append(
                     FixedEventInterval(id="sleep_next", start_minutes=0, end_minutes=sw)
                 )
-            energy_pattern = self.task_prioritizer.get_energy_pattern(profile)
+            if energy_pattern is None:
+                energy_pattern = self.task_prioritizer.get_energy_pattern(profile)
             return SolverInput(
                 target_date=input_data.target_date,
                 day_start_minutes=0,
@@ -368,6 +878,7 @@ class Scheduler:
         input_data: ScheduleInputData,
         profile: ChronotypeProfile,
         sleep_metrics: SleepMetrics,
+        energy_pattern: Optional[Dict[int, float]] = None,
     ) -> ScheduleGenerationContext:
         """
         Tworzy kontekst dla silnika LLM.
@@ -376,6 +887,7 @@ class Scheduler:
             input_data: Dane wejściowe.
             profile: Profil chronotypu.
             sleep_metrics: Rekomendacje snu.
+            energy_pattern: Gotowy wzorzec energii (liczony z profilu, jeśli brak).
 
         Returns:
             ScheduleGenerationContext.
@@ -389,7 +901,11 @@ class Scheduler:
             tasks=input_data.tasks,
             fixed_events=input_data.fixed_events_input,
             sleep_recommendation=sleep_metrics,
-            energy_pattern=self.task_prioritizer.get_energy_pattern(profile),
+            energy_pattern=(
+                energy_pattern
+                if energy_pattern is not None
+                else self.task_prioritizer.get_energy_pattern(profile)
+            ),
             wearable_insights=self._get_wearable_insights(input_data),
             historical_insights=self._get_historical_insights(input_data),
             rag_context=RAGContext(), # Assuming RAGContext is handled elsewhere or initialized empty
@@ -560,28 +1076,24 @@ class Scheduler:
         }
         return patterns.get(weekday, {"productivity": "medium", "typical_end_time": "18:00"})
 
-    def _process_core_schedule(
+    def _skeleton_blocks(
         self,
         core_schedule: List[ScheduledTaskInfo],
         input_data: ScheduleInputData,
         sleep_metrics: SleepMetrics,
-    ) -> List[Dict[str, Any]]:
+        profile: ChronotypeProfile,
+        energy_pattern: Optional[Dict[int, float]] = None,
+    ) -> List[Block]:
         """
-        Formatuje wyniki core solvera i wstawia przerwy, posiłki, rutyny i aktywności.
-
-        Args:
-            core_schedule: Lista ScheduledTaskInfo.
-            input_data: Dane wejściowe.
-            sleep_metrics: Rekomendacje snu.
+        Bloki szkieletu solvera: wydarzenia stałe (w tym sen) i zaplanowane zadania.
 
         Returns:
-            Lista elementów harmonogramu gotowa do zwrócenia.
+            Lista krotek (start, koniec, element) w minutach od północy.
         """
-        # Pozyskaj wszystkie bloki (zadania + fixed events)
-        blocks: List[Tuple[int, int, Dict[str, Any]]] = []
+        blocks: List[Block] = []
         # fixed events z solver_input
         solver_in = self._prepare_solver_input(
-            input_data, self._prepare_profile(input_data), sleep_metrics
+            input_data, profile, sleep_metrics, energy_pattern
         )
         if solver_in:
             for fe in solver_in.fixed_events:
@@ -630,6 +1142,36 @@ class Scheduler:
                     },
                 )
             )
+        return blocks
+
+    def _process_core_schedule(
+        self,
+        core_schedule: List[ScheduledTaskInfo],
+        input_data: ScheduleInputData,
+        sleep_metrics: SleepMetrics,
+        profile: Optional[ChronotypeProfile] = None,
+        energy_pattern: Optional[Dict[int, float]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Formatuje wyniki core solvera i wstawia przerwy, posiłki, rutyny i aktywności.
+
+        Args:
+            core_schedule: Lista ScheduledTaskInfo.
+            input_data: Dane wejściowe.
+            sleep_metrics: Rekomendacje snu.
+            profile: Profil chronotypu (pobierany przez `_prepare_user_state`, jeśli brak).
+            energy_pattern: Wzorzec energii odpowiadający profilowi.
+
+        Returns:
+            Lista elementów harmonogramu gotowa do zwrócenia.
+        """
+        # Pozyskaj wszystkie bloki (zadania + fixed events)
+        if profile is None:
+            prepared = self._prepare_user_state(input_data)
+            profile, energy_pattern = prepared.profile, prepared.energy_pattern
+        blocks = self._skeleton_blocks(
+            core_schedule, input_data, sleep_metrics, profile, energy_pattern
+        )
 
         # Sortowanie
         blocks.sort(key=lambda x: x[0])
@@ -829,98 +1371,9 @@ class Scheduler:
         # Sortowanie po dodaniu wszystkich elementów
         blocks.sort(key=lambda x: x[0])
 
-        # Rozwiązywanie konfliktów - usuwanie nakładających się bloków
-        # Priorytet: fixed_event > task > meal > routine > activity > break
-        priority_order = {
-            "fixed_event": 5,
-            "task": 4,
-            "meal": 3,
-            "routine": 2,
-            "activity": 1,
-            "break": 0
-        }
-
-        # Usuwanie nakładających się bloków
-        non_overlapping_blocks = []
-        for i, (start, end, meta) in enumerate(blocks):
-            # Sprawdź, czy ten blok nakłada się z jakimkolwiek już dodanym blokiem
-            overlaps = False
-            for j, (existing_start, existing_end, existing_meta) in enumerate(non_overlapping_blocks):
-                if max(start, existing_start) < min(end, existing_end):  # Nakładanie
-                    overlaps = True
-                    # Jeśli obecny blok ma wyższy priorytet, usuń istniejący
-                    current_priority = priority_order.get(meta.get("type", "break"), 0)
-                    existing_priority = priority_order.get(existing_meta.get("type", "break"), 0)
-
-                    if current_priority > existing_priority:
-                        non_overlapping_blocks[j] = (start, end, meta)
-                    break
-
-            if not overlaps:
-                non_overlapping_blocks.append((start, end, meta))
-
-        # Sortowanie po rozwiązaniu konfliktów
-        non_overlapping_blocks.sort(key=lambda x: x[0])
-
-        # Wstawianie przerw między blokami
-        final: List[Dict[str, Any]] = []
-        prev_end = 0
-
-        for start, end, meta in non_overlapping_blocks:
-            if start > prev_end:
-                # Przerwa
-                gap_duration = start - prev_end
-
-                # Różne typy przerw w zależności od długości
-                break_name = "Break"
-                break_type = "break"
-
-                if gap_duration >= 120:  # Dłuższa niż 2 godziny
-                    break_name = "Free Time"
-                    break_type = "free_time"
-                elif gap_duration >= 45:  # Między 45 minut a 2 godziny
-                    break_name = "Relaxation"
-                    break_type = "relaxation"
-                elif gap_duration >= 15:  # Między 15 a 45 minut
-                    break_name = "Short Break"
-                    break_type = "short_break"
-                else:  # Krótsza niż 15 minut
-                    break_name = "Quick Break"
-                    break_type = "quick_break"
-
-                final.append(
-                    {
-                        "type": break_type,
-                        "name": break_name,
-                        "start_time": total_minutes_to_time(prev_end).strftime("%H:%M"),
-                        "end_time": total_minutes_to_time(start).strftime("%H:%M"),
-                        "duration_minutes": gap_duration,
-                    }
-                )
-
-            final.append(meta)
-            prev_end = max(prev_end, end)
-
-        # Dodaj przerwę na koniec dnia, jeśli potrzebna
-        if prev_end < 1440:
-            gap_duration = 1440 - prev_end
-            break_name = "Free Time"
-            break_type = "free_time"
-
-            if gap_duration <= 30:
-                break_name = "Quick Break"
-                break_type = "quick_break"
-
-            final.append(
-                {
-                    "type": break_type,
-                    "name": break_name,
-                    "start_time": total_minutes_to_time(prev_end).strftime("%H:%M"),
-                    "end_time": "24:00",
-                    "duration_minutes": gap_duration,
-                }
-            )
-
+        # Rozwiązywanie konfliktów według priorytetów typów i wstawianie przerw
+        non_overlapping_blocks, _, _ = resolve_overlaps(blocks)
+        final = fill_gaps(non_overlapping_blocks)
         return final
 
     def _calculate_metrics(
@@ -0,0 +1,221 @@
+# === File: schedules-ai/src/core/simulation.py ===
+
+"""
+What-if Schedule Simulation.
+
+Porównuje warianty harmonogramu ("co jeśli przeniosę siłownię na rano?",
+"co jeśli usunę zadanie X?"). Warianty są opisane jako delty względem jednego
+wejścia bazowego; wszystkie są generowane jedną partią `Scheduler.generate_many`
+(wspólne przygotowanie profilu, równoległe rozwiązania solvera, opcjonalnie bez
+LLM), a wynikiem są zwięzłe różnice elementów i metryk względem bazy.
+"""
+
+import logging
+from dataclasses import dataclass, field, replace
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from src.core.scheduler import GeneratedSchedule, ScheduleInputData, Scheduler
+from src.core.task_prioritizer import Task
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ScheduleVariant:
+    """Wariant harmonogramu opisany jako delta względem wejścia bazowego."""
+
+    name: str
+    remove_task_ids: Tuple[UUID, ...] = ()
+    add_tasks: Tuple[Task, ...] = ()
+    # task_id -> {nazwa pola Task: nowa wartość}
+    task_updates: Dict[UUID, Dict[str, Any]] = field(default_factory=dict)
+    remove_fixed_event_ids: Tuple[str, ...] = ()
+    add_fixed_events: Tuple[Dict[str, Any], ...] = ()
+    preference_overrides: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass(frozen=True)
+class VariantOutcome:
+    """Wynik symulacji jednego wariantu."""
+
+    name: str
+    schedule: GeneratedSchedule
+    changes: List[Dict[str, Any]]
+    metrics_delta: Dict[str, float]
+
+    @property
+    def failed(self) -> bool:
+        return self.schedule.metrics.get("status") == "failed"
+
+
+@dataclass(frozen=True)
+class SimulationResult:
+    """Harmonogram bazowy wraz z wynikami wariantów (w kolejności wejścia)."""
+
+    base: GeneratedSchedule
+    variants: List[VariantOutcome]
+
+
+def apply_variant(base: ScheduleInputData, variant: ScheduleVariant) -> ScheduleInputData:
+    """
+    Nakłada deltę wariantu na wejście bazowe.
+
+    Args:
+        base: Wejście bazowe.
+        variant: Delta wariantu.
+
+    Returns:
+        Nowy ScheduleInputData (wejście bazowe pozostaje niezmienione).
+
+    Raises:
+        ValueError: Jeśli delta odwołuje się do nieistniejącego zadania lub pola.
+    """
+    known_ids = {task.id for task in base.tasks}
+    unknown = (set(variant.remove_task_ids) | set(variant.task_updates)) - known_ids
+    if unknown:
+        raise ValueError(f"Wariant '{variant.name}' odwołuje się do nieznanych zadań: {sorted(map(str, unknown))}")
+
+    tasks: List[Task] = []
+    for task in base.tasks:
+        if task.id in variant.remove_task_ids:
+            continue
+        updates = variant.task_updates.get(task.id)
+        tasks.append(replace(task, **updates) if updates else task)
+    tasks.extend(variant.add_tasks)
+
+    removed_events = set(variant.remove_fixed_event_ids)
+    fixed_events = [
+        event for event in base.fixed_events_input
+        if event.get("id") not in removed_events
+    ]
+    fixed_events.extend(variant.add_fixed_events)
+
+    preferences = {**base.preferences, **variant.preference_overrides}
+    return replace(
+        base,
+        tasks=tasks,
+        fixed_events_input=fixed_events,
+        preferences=preferences,
+    )
+
+
+def _item_key(item: Dict[str, Any], occurrence: int) -> Tuple[Any, ...]:
+    identifier = item.get("task_id") or item.get("event_id") or item.get("id")
+    if identifier:
+        return (item.get("type"), str(identifier))
+    return (item.get("type"), item.get("name"), occurrence)
+
+
+def _index_items(items: Sequence[Dict[str, Any]]) -> Dict[Tuple[Any, ...], Dict[str, Any]]:
+    indexed: Dict[Tuple[Any, ...], Dict[str, Any]] = {}
+    seen: Dict[Tuple[Any, Any], int] = {}
+    for item in items:
+        name_key = (item.get("type"), item.get("name"))
+        occurrence = seen.get(name_key, 0)
+        seen[name_key] = occurrence + 1
+        indexed[_item_key(item, occurrence)] = item
+    return indexed
+
+
+def diff_schedules(
+    base_items: Sequence[Dict[str, Any]],
+    variant_items: Sequence[Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """
+    Zwraca zwięzłą listę różnic między elementami harmonogramów.
+
+    Elementy są dopasowywane po `task_id`/`event_id`, a w ich braku po typie,
+    nazwie i kolejności wystąpienia.
+
+    Returns:
+        Lista słowników z polem `change` ("added", "removed" lub "moved").
+    """
+    base_index = _index_items(base_items)
+    variant_index = _index_items(variant_items)
+    changes: List[Dict[str, Any]] = []
+    for key, item in variant_index.items():
+        previous = base_index.get(key)
+        if previous is None:
+            changes.append({
+                "change": "added",
+                "type": item.get("type"),
+                "name": item.get("name"),
+                "start_time": item.get("start_time"),
+                "end_time": item.get("end_time"),
+            })
+        elif (previous.get("start_time"), previous.get("end_time")) != (item.get("start_time"), item.get("end_time")):
+            changes.append({
+                "change": "moved",
+                "type": item.get("type"),
+                "name": item.get("name"),
+                "start_time": item.get("start_time"),
+                "end_time": item.get("end_time"),
+                "previous_start_time": previous.get("start_time"),
+                "previous_end_time": previous.get("end_time"),
+            })
+    for key, item in base_index.items():
+        if key not in variant_index:
+            changes.append({
+                "change": "removed",
+                "type": item.get("type"),
+                "name": item.get("name"),
+                "previous_start_time": item.get("start_time"),
+                "previous_end_time": item.get("end_time"),
+            })
+    return changes
+
+
+def metrics_delta(base: Dict[str, Any], variant: Dict[str, Any]) -> Dict[str, float]:
+    """Różnice metryk liczbowych obecnych w obu harmonogramach (wariant - baza)."""
+    delta: Dict[str, float] = {}
+    for name, value in variant.items():
+        base_value = base.get(name)
+        if isinstance(value, bool) or isinstance(base_value, bool):
+            continue
+        if isinstance(value, (int, float)) and isinstance(base_value, (int, float)):
+            if value != base_value:
+                delta[name] = round(value - base_value, 2)
+    return delta
+
+
+async def simulate(
+    scheduler: Scheduler,
+    base: ScheduleInputData,
+    variants: Sequence[ScheduleVariant],
+    use_llm: bool = False,
+) -> SimulationResult:
+    """
+    Generuje harmonogram bazowy i wszystkie warianty jedną partią.
+
+    Args:
+        scheduler: Scheduler użyty do generowania.
+        base: Wejście bazowe.
+        variants: Delty wariantów.
+        use_llm: Czy dopieszczać harmonogramy przez LLM (domyślnie nie —
+            porównanie wariantów opiera się na wyniku solvera).
+
+    Returns:
+        SimulationResult.
+
+    Raises:
+        ValueError: Jeśli któraś delta jest niepoprawna.
+    """
+    inputs = [base] + [apply_variant(base, variant) for variant in variants]
+    schedules: List[Optional[GeneratedSchedule]] = [None] * len(inputs)
+    async for index, schedule in scheduler.generate_many(
+        inputs, defer_refinement=False, use_llm=use_llm
+    ):
+        schedules[index] = schedule
+
+    base_schedule = schedules[0]
+    outcomes = []
+    for variant, schedule in zip(variants, schedules[1:]):
+        outcomes.append(VariantOutcome(
+            name=variant.name,
+            schedule=schedule,
+            changes=diff_schedules(base_schedule.scheduled_items, schedule.scheduled_items),
+            metrics_delta=metrics_delta(base_schedule.metrics, schedule.metrics),
+        ))
+    logger.info(f"Symulacja: {len(variants)} wariant(ów) dla użytkownika {base.user_id}.")
+    return SimulationResult(base=base_schedule, variants=outcomes)
@@ -0,0 +1,215 @@
+# === File: schedules-ai/src/services/llm_batching.py ===
+
+"""
+Multi-user Batching of LLM Refinements.
+
+Background refinements (nightly pre-generation, deferred refinements) are not
+latency sensitive, but every provider call costs a request against the
+requests-per-minute quota plus the shared prompt instructions. The
+`RefinementBatcher` collects refinement sections submitted within a short
+window and sends several users' sections in one prompt whose response is a
+JSON object keyed by a short per-user key ("u1", "u2", ...).
+
+Batch sizes follow the model's limits: the shared prompt overhead, every
+section and an output reservation per user must fit the context window, and
+the output reservations must fit the model's completion cap (see `pack_batches`).
+The response is split per key and every entry is validated by the submitting
+caller's own parser, so one user's unusable entry does not affect the others;
+callers refine such users individually.
+"""
+
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from src.services.prompt_compaction import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+# Sends [(key, section), ...] in one prompt and returns the keyed response.
+BatchCall = Callable[[List[Tuple[str, str]]], Awaitable[Dict[str, Any]]]
+
+
+class NotBatchedError(ValueError):
+    """The request was not (or not successfully) answered by a batched call."""
+
+
+def pack_batches(
+    section_tokens: Sequence[int],
+    overhead_tokens: int,
+    output_tokens: int,
+    context_window: int,
+    max_batch_size: int,
+    max_output_tokens: Optional[int] = None,
+) -> List[List[int]]:
+    """
+    Groups sections, in order, into batches that fit the model's limits.
+
+    A batch of n sections needs `overhead_tokens + sum(section tokens) +
+    n * output_tokens` tokens of context and `n * output_tokens` completion
+    tokens, which must not exceed `max_output_tokens` (if given). A section
+    that does not fit even alone forms a batch of one.
+
+    Returns:
+        Lists of section indexes.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    used = overhead_tokens
+    for index, tokens in enumerate(section_tokens):
+        needed = tokens + output_tokens
+        over_output = max_output_tokens is not None and (len(current) + 1) * output_tokens > max_output_tokens
+        if current and (len(current) >= max_batch_size or used + needed > context_window or over_output):
+            batches.append(current)
+            current, used = [], overhead_tokens
+        current.append(index)
+        used += needed
+    if current:
+        batches.append(current)
+    return batches
+
+
+@dataclass
+class _Pending:
+    section: str
+    tokens: int
+    parse: Callable[[Any], Any]
+    future: "asyncio.Future[Any]" = field(repr=False)
+
+
+class RefinementBatcher:
+    """
+    Collects refinement sections for `window_seconds` and answers them in batched calls.
+
+    Used from one event loop, so it needs no locks. The collection window is
+    opened by the first submission, so the batched calls run in that caller's
+    context (e.g. its `llm_priority`).
+    """
+
+    def __init__(
+        self,
+        call: BatchCall,
+        overhead_tokens: int,
+        output_tokens: int,
+        context_window: int,
+        max_batch_size: int = 8,
+        window_seconds: float = 0.2,
+        max_output_tokens: Optional[int] = None,
+    ) -> None:
+        """
+        Args:
+            call: Sends one batch (see `BatchCall`).
+            overhead_tokens: Tokens of the batch prompt without sections.
+            output_tokens: Completion tokens reserved per section.
+            context_window: Context window of the model (prompt and completion).
+            max_output_tokens: Completion cap of the model per call; None if
+                only the context window limits it.
+            max_batch_size: Maximum number of sections per call.
+            window_seconds: How long submissions are collected before a flush.
+        """
+        self._call = call
+        self.overhead_tokens = max(0, int(overhead_tokens))
+        self.output_tokens = max(0, int(output_tokens))
+        self.context_window = max(1, int(context_window))
+        self.max_output_tokens = max(1, int(max_output_tokens)) if max_output_tokens else None
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.window_seconds = max(0.0, float(window_seconds))
+        self._pending: List[_Pending] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self._calls = 0
+        self._batched = 0
+        self._unbatched = 0
+        self._failed = 0
+
+    async def submit(self, section: str, parse: Callable[[Any], _T]) -> _T:
+        """
+        Queues one section and waits for its entry of the batched response.
+
+        Args:
+            section: Per-user part of the batch prompt.
+            parse: Validates the user's response entry; exceptions it raises
+                are passed on to the caller.
+
+        Raises:
+            NotBatchedError: Nothing to batch the section with, or the batched
+                call failed; the caller should refine individually.
+        """
+        loop = asyncio.get_running_loop()
+        pending = _Pending(section, estimate_tokens(section), parse, loop.create_future())
+        self._pending.append(pending)
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_seconds, self._flush)
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        return await pending.future
+
+    def stats(self) -> Dict[str, int]:
+        """Batched calls made, requests answered by them, unbatched and failed requests."""
+        return {
+            "calls": self._calls,
+            "batched_requests": self._batched,
+            "unbatched_requests": self._unbatched,
+            "failed_requests": self._failed,
+        }
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending = [p for p in self._pending if not p.future.done()]
+        self._pending = []
+        groups = pack_batches(
+            [p.tokens for p in pending], self.overhead_tokens, self.output_tokens,
+            self.context_window, self.max_batch_size, self.max_output_tokens,
+        )
+        for group in groups:
+            members = [pending[index] for index in group]
+            if len(members) == 1:
+                self._unbatched += 1
+                members[0].future.set_exception(NotBatchedError("No other request to batch with."))
+                continue
+            task = asyncio.ensure_future(self._run(members))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, members: List[_Pending]) -> None:
+        keys = [f"u{number}" for number in range(1, len(members) + 1)]
+        self._calls += 1
+        try:
+            entries = await self._call([(key, member.section) for key, member in zip(keys, members)])
+        except Exception as e:
+            logger.warning(f"Batched refinement of {len(members)} request(s) failed: {e}")
+            self._failed += len(members)
+            for member in members:
+                if not member.future.done():
+                    member.future.set_exception(NotBatchedError(f"Batched call failed: {e}"))
+            return
+        answered = 0
+        for key, member in zip(keys, members):
+            if member.future.done():
+                continue
+            try:
+                if key not in entries:
+                    raise NotBatchedError(f"Batched response has no entry '{key}'.")
+                member.future.set_result(member.parse(entries[key]))
+                answered += 1
+            except Exception as e:
+                self._failed += 1
+                member.future.set_exception(e)
+        self._batched += answered
+        logger.info(f"Batched refinement call answered {answered} of {len(members)} request(s).")
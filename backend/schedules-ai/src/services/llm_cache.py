@@ -0,0 +1,243 @@
+# === File: schedules-ai/src/services/llm_cache.py ===
+
+"""
+LLM Response Cache and Request Coalescing.
+
+Caches successfully parsed LLM responses keyed by a hash of the provider,
+model, sampling parameters and the fully rendered prompt, so byte-identical
+requests (regenerations, retries, shared demo profiles) do not hit the
+provider again. Values are stored as JSON: an in-memory LRU tier serves hot
+entries, and an optional SQLite tier keeps them across restarts. Both tiers
+honour the same TTL.
+
+`SingleFlight` complements the cache for concurrent duplicates: while an
+identical request is still in flight, later callers share its result instead
+of issuing another provider call.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time as time_module
+from collections import OrderedDict
+from contextlib import closing
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+
+def make_cache_key(
+    provider: str,
+    model: Optional[str],
+    temperature: float,
+    max_tokens: int,
+    prompt: str,
+) -> str:
+    """
+    Builds the cache key for one LLM request.
+
+    Returns:
+        str: SHA-256 hex digest of the request parameters and prompt.
+    """
+    payload = json.dumps(
+        [provider, model, round(float(temperature), 4), int(max_tokens), prompt],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Two-tier (memory LRU + optional SQLite) cache of parsed LLM responses.
+
+    Callers must only `set` responses that were parsed successfully; a cached
+    value is returned as a fresh copy on every `get`.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: float = 24 * 3600,
+        sqlite_path: Optional[str] = None,
+    ) -> None:
+        """
+        Args:
+            max_entries: Size of the in-memory LRU tier.
+            ttl_seconds: Time-to-live of an entry in both tiers.
+            sqlite_path: Path of the on-disk tier; None disables it.
+        """
+        self._max_entries = max(1, int(max_entries))
+        self._ttl = float(ttl_seconds)
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._sqlite_path = sqlite_path
+        self._hits = 0
+        self._misses = 0
+        if sqlite_path:
+            self._init_sqlite()
+
+    # --- Public API ---
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Returns the cached value for `key`, or None if missing or expired."""
+        now = time_module.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            expires_at, raw = entry
+            if expires_at > now:
+                self._memory.move_to_end(key)
+                self._hits += 1
+                return json.loads(raw)
+            del self._memory[key]
+
+        if self._sqlite_path:
+            row = await asyncio.to_thread(self._sqlite_get, key, now)
+            if row is not None:
+                expires_at, raw = row
+                self._remember(key, expires_at, raw)
+                self._hits += 1
+                return json.loads(raw)
+
+        self._misses += 1
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        """
+        Stores a successfully parsed response.
+
+        Values that are not JSON-serializable are skipped.
+        """
+        try:
+            raw = json.dumps(value, ensure_ascii=False)
+        except (TypeError, ValueError) as e:
+            logger.debug(f"LLM response not cached (not JSON-serializable): {e}")
+            return
+        expires_at = time_module.time() + self._ttl
+        self._remember(key, expires_at, raw)
+        if self._sqlite_path:
+            await asyncio.to_thread(self._sqlite_set, key, expires_at, raw)
+
+    def clear(self) -> None:
+        """Clears the in-memory tier (the on-disk tier expires by TTL)."""
+        self._memory.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the in-memory size and the hit/miss counters."""
+        return {"entries": len(self._memory), "hits": self._hits, "misses": self._misses}
+
+    # --- Internals ---
+
+    def _remember(self, key: str, expires_at: float, raw: str) -> None:
+        self._memory[key] = (expires_at, raw)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._max_entries:
+            self._memory.popitem(last=False)
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._sqlite_path, timeout=5.0)  # type: ignore[arg-type]
+
+    def _init_sqlite(self) -> None:
+        directory = os.path.dirname(self._sqlite_path or "")
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS llm_cache ("
+                    " key TEXT PRIMARY KEY,"
+                    " expires_at REAL NOT NULL,"
+                    " value TEXT NOT NULL)"
+                )
+                conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (time_module.time(),))
+            logger.info(f"LLM response cache on disk: {self._sqlite_path}")
+        except sqlite3.Error as e:
+            logger.error(f"Could not open LLM cache database {self._sqlite_path}: {e}. Disk tier disabled.")
+            self._sqlite_path = None
+
+    def _sqlite_get(self, key: str, now: float) -> Optional[Tuple[float, str]]:
+        try:
+            with closing(self._connect()) as conn, conn:
+                row = conn.execute(
+                    "SELECT expires_at, value FROM llm_cache WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+            return (row[0], row[1]) if row else None
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache read failed: {e}")
+            return None
+
+    def _sqlite_set(self, key: str, expires_at: float, raw: str) -> None:
+        try:
+            with closing(self._connect()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, expires_at, value) VALUES (?, ?, ?)",
+                    (key, expires_at, raw),
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls into one upstream call.
+
+    The first caller for a key starts the work as a separate task; callers
+    arriving while it is in flight await the same task. Cancelling one waiter
+    does not cancel the shared call for the others; the call is cancelled once
+    its last waiter has gone.
+    """
+
+    def __init__(self) -> None:
+        self._inflight: Dict[str, "asyncio.Task[Any]"] = {}
+        self._waiters: Dict[str, int] = {}
+        self._coalesced = 0
+
+    async def do(self, key: str, call: Callable[[], Awaitable[_T]]) -> _T:
+        """
+        Runs `call` once per key among concurrent callers.
+
+        Args:
+            key: Identity of the call (e.g. `make_cache_key(...)`).
+            call: Factory of the coroutine performing the upstream call.
+
+        Returns:
+            The shared result (exceptions are shared too).
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, k=key: self._finish(k, done))
+        else:
+            self._coalesced += 1
+            logger.debug("Identical LLM call already in flight; awaiting its result.")
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters.get(key) == 1 and not task.done():
+                # Nobody is interested in the result any more; later callers start afresh.
+                task.cancel()
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+            raise
+        finally:
+            remaining = self._waiters.get(key, 1) - 1
+            if remaining > 0:
+                self._waiters[key] = remaining
+            else:
+                self._waiters.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the number of in-flight keys and of coalesced callers so far."""
+        return {"in_flight": len(self._inflight), "coalesced": self._coalesced}
+
+    def _finish(self, key: str, task: "asyncio.Task[Any]") -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # Mark as retrieved even if every waiter went away.
@@ -9,24 +9,62 @@ and adaptation, using configurable providers and robust error handling.
 Incorporates prompt templating and context augmentation.
 """
 
+import json
 import json5
 import logging
 import os
 import re
-import time as time_module
 import asyncio
+import time as time_module
 import aiohttp
-import requests
+import contextlib
 from dataclasses import dataclass, field
 from datetime import datetime, time, timedelta, date, timezone
 from enum import Enum
-from typing import Any, Dict, List, Optional, Union, cast
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple, TypeVar, Union, cast
 from uuid import UUID, uuid4
 import jinja2
-from jinja2 import Environment, BaseLoader, TemplateSyntaxError
+from jinja2 import DictLoader, FileSystemBytecodeCache, TemplateSyntaxError
+from jinja2.sandbox import ImmutableSandboxedEnvironment
 from pydantic import Field, validator, HttpUrl, BaseModel, ValidationError
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
+from src.services.llm_batching import RefinementBatcher
+from src.services.llm_cache import LLMResponseCache, SingleFlight, make_cache_key
+from src.services.llm_hedging import HEDGE, PRIMARY, HedgingPolicy, hedged_call
+from src.services.llm_limits import (
+    CircuitBreaker,
+    CircuitBreakerRegistry,
+    LimiterPermit,
+    LLMPriority,
+    ProviderUnavailableError,
+    RateLimiterRegistry,
+    current_llm_priority,
+    estimate_request_tokens,
+    jittered,
+    parse_retry_after,
+    response_token_usage,
+)
+from src.services.llm_parsing import STRICT, IncrementalScheduleParser, parse_llm_json, parse_llm_json_tiered
+from src.services.llm_replay import ReplaySession, ReplayStore
+from src.services.llm_telemetry import LLMCallTrace, LLMTelemetry, cache_missed, current_cache_status, current_trace
+from src.services.prompt_compaction import TRIM_ORDER, compact_context, estimate_tokens
+from src.utils.async_bridge import in_background_loop, run_sync
+
+_T = TypeVar("_T")
+
+EXPLANATION_TEMPERATURE = 0.5
+EXPLANATION_FALLBACK = "Could not generate explanation due to an error."
+# Completion budget of an explanation batch: per item plus the JSON envelope.
+EXPLANATION_ITEM_TOKENS = 80
+EXPLANATION_OVERHEAD_TOKENS = 50
+# Extra rounds for items a (e.g. truncated) explanation response did not cover.
+EXPLANATION_REREQUESTS = 1
+# Complete `"N": "text"` entries of a possibly truncated explanation response.
+_EXPLANATION_ENTRY = re.compile(r'"(\d+)"\s*:\s*"((?:[^"\\]|\\.)*)"')
+# Extra LLM requests when a refined schedule is unparseable or irreparable.
+INVALID_OUTPUT_REREQUESTS = 1
+
 # --- Application-specific imports for context data classes ---
 SleepMetrics = None
 ChronotypeProfile = None
@@ -122,6 +160,19 @@ except ImportError:
     ScheduledTaskInfo = DummyScheduledTaskInfo
     logger.warning("Could not import ScheduledTaskInfo for LLMEngine context. Using dummy.")
 
+class InvalidLLMOutputError(ValueError):
+    """The completion is not a usable schedule (unparseable or irreparable)."""
+
+
+class LLMRequestRejectedError(ValueError):
+    """The provider rejected the request itself (4xx); retrying it cannot help."""
+
+
+def is_client_error(status: int) -> bool:
+    """4xx caused by the request rather than the provider (timeouts and quota excluded)."""
+    return 400 <= status < 500 and status not in (408, 429)
+
+
 # --- LLM Provider Enumeration ---
 class ModelProvider(Enum):
     OPENAI = "openai"
@@ -130,6 +181,7 @@ class ModelProvider(Enum):
     ANTHROPIC = "anthropic"
     LOCAL = "local"
     OPENROUTER = "openrouter"
+    REPLAY = "replay"  # Recorded responses, offline (see llm_replay)
 
 # --- Model Configuration ---
 class ModelConfig(BaseSettings):
@@ -149,6 +201,24 @@ class ModelConfig(BaseSettings):
     llm_site_url: Optional[str] = Field(default=None, alias="LLM_SITE_URL")
     llm_site_name: Optional[str] = Field(default=None, alias="LLM_SITE_NAME")
     llm_request_timeout: float = Field(default=60.0, gt=0, alias="LLM_REQUEST_TIMEOUT")
+    llm_prompt_token_budget: int = Field(default=3000, gt=0, alias="LLM_PROMPT_TOKEN_BUDGET")
+    # Multi-user batching of background refinements (see llm_batching); the
+    # context window and the model's completion cap bound the batch size,
+    # 1 user per batch disables batching.
+    llm_context_window: int = Field(default=32768, gt=0, alias="LLM_CONTEXT_WINDOW")
+    llm_max_output_tokens: int = Field(default=4096, gt=0, alias="LLM_MAX_OUTPUT_TOKENS")
+    llm_batch_max_users: int = Field(default=8, ge=1, alias="LLM_BATCH_MAX_USERS")
+    llm_batch_window: float = Field(default=0.2, ge=0.0, alias="LLM_BATCH_WINDOW")
+    # Record/replay (see llm_replay): the store is read by the replay provider
+    # and appended to by other providers when recording is enabled.
+    llm_replay_path: Optional[str] = Field(default=None, alias="LLM_REPLAY_PATH")
+    llm_replay_record: bool = Field(default=False, alias="LLM_REPLAY_RECORD")
+    llm_replay_latency: str = Field(default="none", alias="LLM_REPLAY_LATENCY")
+    llm_replay_error_rate: float = Field(default=0.0, ge=0.0, le=1.0, alias="LLM_REPLAY_ERROR_RATE")
+    llm_replay_rate_limit_rate: float = Field(default=0.0, ge=0.0, le=1.0, alias="LLM_REPLAY_RATE_LIMIT_RATE")
+    llm_replay_retry_after: float = Field(default=1.0, ge=0.0, alias="LLM_REPLAY_RETRY_AFTER")
+    llm_replay_strict: bool = Field(default=False, alias="LLM_REPLAY_STRICT")
+    llm_replay_seed: Optional[int] = Field(default=None, alias="LLM_REPLAY_SEED")
     api_key: Optional[str] = None
     api_base: Optional[str] = None
 
@@ -169,7 +239,8 @@ class ModelConfig(BaseSettings):
                 ModelProvider.ANTHROPIC: "claude-3-haiku-20240307",
                 ModelProvider.HUGGINGFACE: "mistralai/Mistral-7B-Instruct-v0.1",
                 ModelProvider.OPENROUTER: "mistralai/mixtral-8x7b-instruct",
-                ModelProvider.LOCAL: "local-model"
+                ModelProvider.LOCAL: "local-model",
+                ModelProvider.REPLAY: "replay",
             }
             return defaults.get(provider)
         return v
@@ -183,7 +254,7 @@ class ModelConfig(BaseSettings):
             ModelProvider.OPENROUTER: self.openrouter_api_key,
         }
         self.api_key = provider_key_map.get(self.llm_provider)
-        if self.llm_provider != ModelProvider.LOCAL and not self.api_key:
+        if self.llm_provider not in (ModelProvider.LOCAL, ModelProvider.REPLAY) and not self.api_key:
             env_var_name = f"{self.llm_provider.value.upper()}_API_KEY"
             logger.warning(f"API key for {self.llm_provider.value} not found via field or env var '{env_var_name}'.")
         if self.llm_api_base:
@@ -194,7 +265,8 @@ class ModelConfig(BaseSettings):
                 ModelProvider.MISTRAL: "https://api.mistral.ai/v1",
                 ModelProvider.ANTHROPIC: "https://api.anthropic.com/v1",
                 ModelProvider.HUGGINGFACE: "https://api-inference.huggingface.co/models",
-                ModelProvider.OPENROUTER: "https://openrouter.ai/api/v1"
+                ModelProvider.OPENROUTER: "https://openrouter.ai/api/v1",
+                ModelProvider.REPLAY: "replay://recorded",
             }
             self.api_base = default_bases.get(self.llm_provider)
         logger.debug(f"Final ModelConfig - Provider: {self.llm_provider.value}, Model: {self.llm_model_name}, API Key Loaded: {bool(self.api_key)}, API Base: {self.api_base}")
@@ -223,70 +295,35 @@ class ScheduleGenerationContext:
 GENERATE_FROM_SCRATCH_PROMPT_TEMPLATE = """
 You are Chronos, an expert AI assistant specializing in creating hyper-personalized, optimal daily schedules based on scientific principles and user data.
 
-**Goal:** Generate a complete, optimized 24-hour schedule (00:00 to 23:59) for {{ target_date.strftime('%Y-%m-%d') }} from scratch.
+**Goal:** Generate a complete, optimized 24-hour schedule (00:00 to 23:59) for {{ date_iso }} from scratch.
 
-**User & Date Information:**
-- Name: {{ user_name }}
-- Chronotype: {{ user_profile.primary_chronotype.value if user_profile else 'Unknown' }}
-- Age: {{ getattr(user_profile, 'age', 'Unknown') }}
+**User:** {{ user_name }}; chronotype={{ chronotype }}; age={{ age }}
 
 **Sleep Recommendation:**
-{% if sleep_recommendation %}
-- Sleep: {{ sleep_recommendation.ideal_bedtime.strftime('%H:%M') if sleep_recommendation.ideal_bedtime else 'N/A' }} to {{ sleep_recommendation.ideal_wake_time.strftime('%H:%M') if sleep_recommendation.ideal_wake_time else 'N/A' }} ({{ (sleep_recommendation.ideal_duration.total_seconds() / 3600) | round(1) if sleep_recommendation.ideal_duration else 'N/A' }} hours)
+{% if sleep_compact %}
+- Sleep (bedtime-wake, duration): {{ sleep_compact }}
 {% else %}
 - Assume default 8-hour sleep ending around 07:00.
 {% endif %}
 
-**Tasks:**
-{% if tasks %}
-{% for task in tasks %}
-{{ loop.index }}. {{ task.title }} [Duration: {{ (task.duration.total_seconds() / 60) | int }} min, Priority: {{ task.priority.name }}, Energy: {{ task.energy_level.name }}{% if task.deadline %}, Deadline: {{ task.deadline.strftime('%Y-%m-%d %H:%M') }}{% endif %}]
-{% endfor %}
-{% else %}
-- No tasks.
-{% endif %}
+**Encoding:** times are minutes after 00:00 (540 = 09:00); lists are `|`-separated. Output times as HH:MM.
 
-**Fixed Events:**
-{% if fixed_events %}
-{% for event in fixed_events %}
-{{ loop.index }}. {{ event.get('name', event.get('id', 'Fixed Event')) }} [{{ event.get('start_time') }} - {{ event.get('end_time') }}]
-{% endfor %}
-{% else %}
-- No fixed events.
-{% endif %}
+**Tasks (title|minutes|priority|energy|deadline):**
+{{ tasks_compact or '- none' }}
 
-**Standard Activities:**
-{% set meal_prefs = preferences.get('meals', {}) %}
-{% set routine_prefs = preferences.get('routines', {}) %}
-- Breakfast: Around {{ meal_prefs.get('breakfast_time', '08:00') }}, for {{ meal_prefs.get('duration_minutes', 30) }} min
-- Lunch: Around {{ meal_prefs.get('lunch_time', '13:00') }}, for {{ meal_prefs.get('duration_minutes', 45) }} min
-- Dinner: Around {{ meal_prefs.get('dinner_time', '19:00') }}, for {{ meal_prefs.get('duration_minutes', 45) }} min
-- Morning Routine: Duration {{ routine_prefs.get('morning_duration_minutes', 30) }} min
-- Evening Routine: Duration {{ routine_prefs.get('evening_duration_minutes', 45) }} min
-
-**Energy Pattern:**
-{% if energy_pattern %}
-{% set energy_list = [] %}
-{% for h, level in energy_pattern|dictsort %}
-    {% set _ = energy_list.append(h|string + ":00=" + level|string) %}
-{% endfor %}
-[{{ ", ".join(energy_list) }}]
-{% else %}
-- Not available. Assume moderate energy.
-{% endif %}
+**Fixed Events (start-end|name):**
+{{ fixed_events_compact or '- none' }}
 
-**RAG Context:**
-{% if rag_context and rag_context.best_practices %}
-- Best Practices: {{ rag_context.best_practices | join(", ") }}
-{% else %}
-- None.
+**Standard Activities (name@time/minutes):** {{ standard_activities_compact }}
+
+**Energy (hour-range:level 0-1):** {{ energy_rle if energy_rle and 'energy' not in omit else 'not available, assume moderate' }}
+{% if rag_compact and 'rag' not in omit %}
+
+**Best Practices:** {{ rag_compact }}
 {% endif %}
+{% if previous_feedback_compact and 'previous_feedback' not in omit %}
 
-**Previous Feedback:**
-{% if previous_feedback %}
-{{ previous_feedback | tojson(indent=2) }}
-{% else %}
-- None.
+**Previous Feedback:** {{ previous_feedback_compact }}
 {% endif %}
 
 **INSTRUCTIONS:**
@@ -323,86 +360,45 @@ Respond ONLY with the valid {{ format_type | upper }} output.
 REFINE_SCHEDULE_PROMPT_TEMPLATE = """
 You are Chronos, an expert AI assistant for refining daily schedules. You are provided with a schedule skeleton (generated by a constraint solver) that contains key fixed items (tasks, fixed events, and sleep) that satisfy all hard constraints.
 
-**Goal:** Refine and complete this skeleton schedule for {{ target_date.strftime('%Y-%m-%d') }} so that:
+**Goal:** Refine and complete this skeleton schedule for {{ date_iso }} so that:
 - The final schedule covers the full day from 00:00 to 23:59 with no gaps.
 - All items from the skeleton remain unchanged (fixed times).
 - Any gaps between items are filled with appropriate standard activities (meal, routine), short breaks after long tasks, or labeled as free_time.
 - The schedule is optimized based on the user's preferences, energy pattern, and profile.
 
-**User & Date Information:**
-- Name: {{ user_name }}
-- Chronotype: {{ user_profile.primary_chronotype.value if user_profile else 'Unknown' }}
-- Age: {{ getattr(user_profile, 'age', 'Unknown') }}
-- Target Date: {{ target_date.strftime('%Y-%m-%d') }}
+**Encoding:** times are minutes after 00:00 (540 = 09:00); lists are `|`-separated. Output times as HH:MM.
 
-**Solver Skeleton Schedule:**
-{% if solver_schedule %}
-{% for item in solver_schedule %}
-- {{ item.start_time.strftime('%H:%M') }} - {{ item.end_time.strftime('%H:%M') }}: {{ item.name }} (Type: {{ item.type }}){% if item.task_id %} [ID: {{ item.task_id }}]{% endif %}
-{% endfor %}
-{% else %}
-- No skeleton provided.
+**User & Date:** {{ user_name }}; chronotype={{ chronotype }}; age={{ age }}; {{ date_iso }} ({{ weekday }})
+
+**Solver Skeleton (start-end|name|task_id, keep unchanged):**
+{{ skeleton_compact or '- none' }}
+{% if fixed_events_compact %}
+
+**Fixed Events (start-end|name, keep unchanged):**
+{{ fixed_events_compact }}
 {% endif %}
 
-**Standard Activities (to insert in gaps):**
-{% set meal_prefs = preferences.get('meals', {}) %}
-{% set routine_prefs = preferences.get('routines', {}) %}
-- Breakfast: Around {{ meal_prefs.get('breakfast_time', '08:00') }}, duration {{ meal_prefs.get('duration_minutes', 30) }} min
-- Lunch: Around {{ meal_prefs.get('lunch_time', '13:00') }}, duration {{ meal_prefs.get('duration_minutes', 45) }} min
-- Dinner: Around {{ meal_prefs.get('dinner_time', '19:00') }}, duration {{ meal_prefs.get('duration_minutes', 45) }} min
-- Morning Routine: Duration {{ routine_prefs.get('morning_duration_minutes', 30) }} min (after waking)
-- Evening Routine: Duration {{ routine_prefs.get('evening_duration_minutes', 45) }} min (before sleep)
-
-**User Activity Goals (to potentially schedule in free time):**
-{% set activity_goals = preferences.get('activity_goals', []) %}
-{% if activity_goals %}
-{% for goal in activity_goals %}
-- {{ goal.get('name', 'Unnamed Activity') }}: Duration {{ goal.get('duration_minutes', 60) }} min, Frequency {{ goal.get('frequency', 'as possible') }}, Preferred Time: {{ goal.get('preferred_time', ['any']) | join('/') }}
-{% endfor %}
-{% else %}
-- No specific activity goals defined.
+**Standard Activities (name@time/minutes, insert in gaps):** {{ standard_activities_compact }}
+{% if activity_goals_compact and 'activity_goals' not in omit %}
+
+**Activity Goals (name|minutes|frequency|preferred time, for free time):**
+{{ activity_goals_compact }}
 {% endif %}
+{% if energy_rle and 'energy' not in omit %}
 
-**Energy Pattern:**
-{% if energy_pattern %}
-{% set energy_list = [] %}
-{% for h, level in energy_pattern|dictsort %}
-    {% set _ = energy_list.append(h|string + ":00=" + level|string) %}
-{% endfor %}
-[{{ ", ".join(energy_list) }}]
-{% else %}
-- Not available.
+**Energy (hour-range:level 0-1):** {{ energy_rle }}
 {% endif %}
+{% if wearables_compact and 'wearables' not in omit %}
 
-**Recent Context & Habits (Consider these):**
-{% if wearable_insights %}
-- Last Night's Sleep Quality: {{ wearable_insights.get('sleep_quality', 'N/A') }}
-- Recent Stress Level: {{ wearable_insights.get('stress_level', 'N/A') }}
-- Readiness Score: {{ wearable_insights.get('readiness_score', 'N/A') }}
-- Steps Yesterday: {{ wearable_insights.get('steps_yesterday', 'N/A') }}
-- Avg Heart Rate: {{ wearable_insights.get('avg_heart_rate', 'N/A') }}
-- Recovery Needed: {{ wearable_insights.get('recovery_needed', 'N/A') }}
-- Activity Recommendation: {{ wearable_insights.get('activity_recommendation', 'N/A') }}
-- Optimal Focus Periods: {{ wearable_insights.get('focus_periods', []) | join(', ') }}
+**Wearables:** {{ wearables_compact }}
 {% endif %}
+{% if historical_compact and 'historical' not in omit %}
 
-{% if historical_insights %}
-**Historical Patterns:**
-- Typical Lunch Time: {{ historical_insights.get('typical_lunch', 'N/A') }}
-- Common Activity: {{ historical_insights.get('common_activity', 'N/A') }}
-- Productive Hours: {{ historical_insights.get('productive_hours', []) | join(', ') }}
-- Common Break Times: {{ historical_insights.get('common_breaks', []) | join(', ') }}
-- Task Completion Success Rate: {{ historical_insights.get('task_completion_success_rate', 'N/A') }}
-- Optimal Task Duration: {{ historical_insights.get('optimal_task_duration', 'N/A') }} minutes
-- Typical Sleep Duration: {{ historical_insights.get('typical_sleep_duration', 'N/A') }} hours
-
-{% set day_patterns = historical_insights.get('day_specific_patterns', {}) %}
-{% if day_patterns %}
-**{{ target_date.strftime('%A') }} Specific Patterns:**
-- Typical Productivity: {{ day_patterns.get('productivity', 'N/A') }}
-- Common Activities: {{ day_patterns.get('common_activities', []) | join(', ') }}
-- Typical End Time: {{ day_patterns.get('typical_end_time', 'N/A') }}
+**Historical Patterns:** {{ historical_compact }}
 {% endif %}
+{% if day_patterns_compact and 'day_patterns' not in omit %}
+
+**{{ weekday }} Patterns:** {{ day_patterns_compact }}
 {% endif %}
 
 {% if additional_context %}
@@ -468,47 +464,302 @@ Refine the above schedule skeleton to create a realistic, human-friendly schedul
 Respond ONLY with the valid {{ format_type | upper }} output.
 """
 
-# Initialize Jinja2 environment and load templates
+# Per-user section of a multi-user refinement prompt (rendered by `_build_prompt`,
+# so optional sections are trimmed like in REFINE_SCHEDULE_PROMPT_TEMPLATE).
+REFINE_SECTION_PROMPT_TEMPLATE = """
+**User & Date:** {{ user_name }}; chronotype={{ chronotype }}; age={{ age }}; {{ date_iso }} ({{ weekday }})
+**Solver Skeleton (start-end|name|task_id, keep unchanged):**
+{{ skeleton_compact or '- none' }}
+{% if fixed_events_compact %}
+**Fixed Events (start-end|name, keep unchanged):**
+{{ fixed_events_compact }}
+{% endif %}
+**Standard Activities (name@time/minutes, insert in gaps):** {{ standard_activities_compact }}
+{% if activity_goals_compact and 'activity_goals' not in omit %}
+**Activity Goals (name|minutes|frequency|preferred time, for free time):**
+{{ activity_goals_compact }}
+{% endif %}
+{% if energy_rle and 'energy' not in omit %}
+**Energy (hour-range:level 0-1):** {{ energy_rle }}
+{% endif %}
+{% if wearables_compact and 'wearables' not in omit %}
+**Wearables:** {{ wearables_compact }}
+{% endif %}
+{% if historical_compact and 'historical' not in omit %}
+**Historical Patterns:** {{ historical_compact }}
+{% endif %}
+{% if day_patterns_compact and 'day_patterns' not in omit %}
+**{{ weekday }} Patterns:** {{ day_patterns_compact }}
+{% endif %}
+"""
+
+# Several users' refinements in one call; the response is keyed by user key.
+REFINE_BATCH_PROMPT_TEMPLATE = """
+You are Chronos, an expert AI assistant for refining daily schedules. Below are the schedule skeletons of {{ users | length }} independent users, each generated by a constraint solver and containing fixed items (tasks, fixed events, and sleep) that satisfy all hard constraints. Refine every user's skeleton separately; never move items between users.
+
+**Goal (for every user):**
+- The final schedule covers the full day from 00:00 to 23:59 with no gaps.
+- All items from the skeleton remain unchanged (fixed times).
+- Gaps are filled with standard activities (meal, routine), short breaks after long tasks, or labeled as free_time.
+- The schedule fits the user's preferences, energy pattern, chronotype, wearable data and historical patterns.
+
+**Encoding:** times are minutes after 00:00 (540 = 09:00); lists are `|`-separated. Output times as HH:MM.
+{% for user in users %}
+
+=== {{ user.key }} ===
+{{ user.section }}
+{% endfor %}
+
+**INSTRUCTIONS:**
+1. DO NOT modify the skeleton items, fixed events or sleep windows; keep their start and end times.
+2. Add meals, a morning routine after waking and an evening routine before sleep, unless already scheduled.
+3. Insert 5-15 minute breaks after 1-2 hours of work; avoid work stretches over 2-3 hours.
+4. Use longer gaps for activity goals, relaxation or personal time.
+5. Cover the full 24-hour period (00:00-23:59) so the day flows naturally.
+
+**Output Format (JSON):** one object with an entry for every user key ({{ users | map(attribute='key') | join(', ') }}):
+{
+  "<user key>": {
+    "schedule": [
+      {
+        "type": "sleep|meal|routine|task|fixed_event|break|free_time",
+        "name": "Activity Name",
+        "start_time": "HH:MM",
+        "end_time": "HH:MM",
+        "task_id": "UUID string (only for type 'task')",
+        "description": "Optional explanation"
+      }
+    ],
+    "metrics": {
+      "task_completion_estimate_percent": 0-100,
+      "energy_alignment_score": 0-100,
+      "procrastination_risk": "Low|Medium|High"
+    },
+    "explanations": {
+      "key_decisions": ["Explanation 1"],
+      "optimization_focus": "Summary of optimization strategy"
+    }
+  }
+}
+Respond ONLY with the valid JSON output.
+"""
+
+PROMPT_TEMPLATES: Dict[str, str] = {
+    "generate_from_scratch": GENERATE_FROM_SCRATCH_PROMPT_TEMPLATE,
+    "refine": REFINE_SCHEDULE_PROMPT_TEMPLATE,
+    "refine_section": REFINE_SECTION_PROMPT_TEMPLATE,
+    "refine_batch": REFINE_BATCH_PROMPT_TEMPLATE,
+}
+
+
+def _template_bytecode_cache() -> Optional[jinja2.BytecodeCache]:
+    """
+    On-disk cache of compiled templates shared by worker processes.
+
+    Stored in LLM_TEMPLATE_CACHE_DIR (default: a per-user temp directory).
+    """
+    try:
+        directory = os.environ.get("LLM_TEMPLATE_CACHE_DIR")
+        return FileSystemBytecodeCache(directory) if directory else FileSystemBytecodeCache()
+    except Exception as e:
+        logger.warning(f"Template bytecode cache disabled: {e}")
+        return None
+
+
+# Initialize Jinja2 environment and load templates. Templates are compiled once
+# here and only interpolate values precomputed in `prompt_compaction`; the
+# immutable sandbox rejects attribute tricks and in-template list mutation.
 try:
-    jinja_env = Environment(loader=BaseLoader(), autoescape=False)
-    jinja_env.globals['getattr'] = getattr
-    jinja_env.globals['timedelta'] = timedelta
-    GENERATE_FROM_SCRATCH_TEMPLATE = jinja_env.from_string(GENERATE_FROM_SCRATCH_PROMPT_TEMPLATE)
-    REFINE_SCHEDULE_TEMPLATE = jinja_env.from_string(REFINE_SCHEDULE_PROMPT_TEMPLATE)
+    # trim_blocks/lstrip_blocks keep block tags from leaving blank lines (tokens) behind.
+    jinja_env = ImmutableSandboxedEnvironment(
+        loader=DictLoader(PROMPT_TEMPLATES),
+        bytecode_cache=_template_bytecode_cache(),
+        autoescape=False,
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+    GENERATE_FROM_SCRATCH_TEMPLATE = jinja_env.get_template("generate_from_scratch")
+    REFINE_SCHEDULE_TEMPLATE = jinja_env.get_template("refine")
+    REFINE_SECTION_TEMPLATE = jinja_env.get_template("refine_section")
+    REFINE_BATCH_TEMPLATE = jinja_env.get_template("refine_batch")
 except TemplateSyntaxError as e:
     logger.error(f"Jinja2 Template Syntax Error: {e}", exc_info=True)
     GENERATE_FROM_SCRATCH_TEMPLATE = None
     REFINE_SCHEDULE_TEMPLATE = None
+    REFINE_SECTION_TEMPLATE = None
+    REFINE_BATCH_TEMPLATE = None
 except Exception as e:
     logger.error(f"Failed to initialize Jinja2 environment: {e}", exc_info=True)
     GENERATE_FROM_SCRATCH_TEMPLATE = None
     REFINE_SCHEDULE_TEMPLATE = None
+    REFINE_SECTION_TEMPLATE = None
+    REFINE_BATCH_TEMPLATE = None
+
+def create_http_session(
+    limit: int = 100,
+    limit_per_host: int = 20,
+    keepalive_timeout: float = 30.0,
+    ttl_dns_cache: int = 300,
+) -> aiohttp.ClientSession:
+    """
+    Creates a pooled aiohttp session for LLM provider calls.
+
+    Meant to be created once per process (in the application lifespan) and
+    shared by all LLMEngine instances, so provider connections are reused
+    instead of paying a TCP+TLS handshake per call.
+
+    Args:
+        limit: Maximum number of open connections in total.
+        limit_per_host: Maximum number of open connections per provider host.
+        keepalive_timeout: Seconds an idle connection is kept open for reuse.
+        ttl_dns_cache: Seconds resolved provider addresses are cached.
+
+    Returns:
+        aiohttp.ClientSession: The session; the caller is responsible for closing it.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=limit,
+        limit_per_host=limit_per_host,
+        keepalive_timeout=keepalive_timeout,
+        ttl_dns_cache=ttl_dns_cache,
+        use_dns_cache=True,
+    )
+    return aiohttp.ClientSession(connector=connector)
+
+
+_background_session: Optional[aiohttp.ClientSession] = None
+
+
+def _background_loop_session() -> aiohttp.ClientSession:
+    """Pooled session of the sync-bridge loop, shared by all engines (see `async_bridge`)."""
+    global _background_session
+    if _background_session is None or _background_session.closed:
+        _background_session = create_http_session()
+    return _background_session
+
 
 class LLMEngine:
     """
     Engine for integrating LLMs into schedule optimization and refinement.
     Uses Pydantic for configuration and Jinja2 for prompt templating.
     """
-    def __init__(self, config: ModelConfig):
+    def __init__(
+        self,
+        config: ModelConfig,
+        session: Optional[aiohttp.ClientSession] = None,
+        response_cache: Optional[LLMResponseCache] = None,
+        rate_limits: Optional[RateLimiterRegistry] = None,
+        hedge_engine: Optional["LLMEngine"] = None,
+        hedging: Optional[HedgingPolicy] = None,
+        circuit_breakers: Optional[CircuitBreakerRegistry] = None,
+        telemetry: Optional[LLMTelemetry] = None,
+    ):
+        """
+        Args:
+            config: Model/provider configuration.
+            session: Shared HTTP session (see `create_http_session`). If omitted,
+                the engine creates and owns a session on first use; close it with
+                `close()` or by using the engine as an async context manager.
+            response_cache: Cache of parsed responses keyed by prompt and model
+                parameters. If omitted, every call goes to the provider.
+            rate_limits: Shared per-provider rate limiters. If omitted, calls
+                are only limited by the provider's 429 responses.
+            hedge_engine: Engine for a fallback provider/model. If set, slow or
+                failed primary calls are hedged against it (see `llm_hedging`).
+            hedging: Policy deciding when to hedge (defaults to p95 of recent
+                primary latencies).
+            circuit_breakers: Shared per-provider circuit breakers. While the
+                provider's breaker is open, calls fail immediately with
+                `ProviderUnavailableError` (see `is_available`).
+            telemetry: Shared aggregation of per-call telemetry (attempts,
+                queue wait, TTFB, tokens, cache, outcome). If omitted, calls
+                are not measured.
+        """
         if not isinstance(config, ModelConfig):
             raise TypeError("config must be an instance of ModelConfig")
         self.config = config
-        self.session: Optional[aiohttp.ClientSession] = None
+        self.session: Optional[aiohttp.ClientSession] = session
+        self._owns_session = session is None
+        self.response_cache = response_cache
+        self.rate_limits = rate_limits
+        self.hedge_engine = hedge_engine
+        self.hedging = hedging or (HedgingPolicy() if hedge_engine is not None else None)
+        self.circuit_breakers = circuit_breakers
+        self.telemetry = telemetry
+        self._single_flight = SingleFlight()
+        self._replay_session: Optional[ReplaySession] = None
+        self._recorder: Optional[ReplayStore] = None
+        if config.llm_replay_record and config.llm_provider != ModelProvider.REPLAY:
+            self._recorder = ReplayStore(config.llm_replay_path)
         self._prompt_template_from_scratch = GENERATE_FROM_SCRATCH_TEMPLATE
         self._prompt_template_refine = REFINE_SCHEDULE_TEMPLATE
+        self._prompt_template_refine_section = REFINE_SECTION_TEMPLATE
+        self._prompt_template_refine_batch = REFINE_BATCH_TEMPLATE
         if not self._prompt_template_from_scratch or not self._prompt_template_refine:
             logger.error("One or more Jinja2 prompt templates failed to load.")
+        self.batcher: Optional[RefinementBatcher] = None
+        if config.llm_batch_max_users > 1 and self._prompt_template_refine_batch and self._prompt_template_refine_section:
+            self.batcher = RefinementBatcher(
+                self._call_refinement_batch,
+                overhead_tokens=estimate_tokens(self._prompt_template_refine_batch.render(users=[])),
+                output_tokens=config.llm_max_tokens,
+                context_window=config.llm_context_window,
+                max_output_tokens=config.llm_max_output_tokens,
+                max_batch_size=config.llm_batch_max_users,
+                window_seconds=config.llm_batch_window,
+            )
         logger.info(f"LLMEngine initialized with {config.llm_provider.value} provider using {config.llm_model_name}")
 
     async def __aenter__(self):
-        self.session = aiohttp.ClientSession()
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        if self.session and not self.session.closed:
+        await self.close()
+
+    def is_available(self) -> bool:
+        """
+        Whether a call could currently reach a provider.
+
+        False while the provider's circuit breaker is open and no hedge engine
+        can take over; callers should then use their deterministic path
+        instead of waiting for a fallback response.
+        """
+        breaker = self._breaker()
+        if breaker is None or breaker.available():
+            return True
+        return self.hedge_engine is not None and self.hedge_engine.is_available()
+
+    def attach_session(self, session: aiohttp.ClientSession) -> None:
+        """Switches the engine (and its hedge engine) to a shared session owned by the caller."""
+        self.session = session
+        self._owns_session = False
+        if self.hedge_engine is not None:
+            self.hedge_engine.attach_session(session)
+
+    async def close(self) -> None:
+        """Closes the engine's own session; a shared session is left to its owner."""
+        if self.hedge_engine is not None:
+            await self.hedge_engine.close()
+        if self._owns_session and self.session and not self.session.closed:
             await self.session.close()
+        if self._owns_session:
             self.session = None
 
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self.config.llm_provider == ModelProvider.REPLAY:
+            if self._replay_session is None:
+                self._replay_session = ReplaySession.from_config(self.config)
+            return cast(aiohttp.ClientSession, self._replay_session)
+        if in_background_loop():
+            # Sync wrappers run on the bridge loop; sessions are bound to their loop.
+            return _background_loop_session()
+        if self.session is None or self.session.closed:
+            if not self._owns_session:
+                logger.warning("Shared HTTP session is closed; LLMEngine falls back to its own session.")
+            self.session = create_http_session()
+            self._owns_session = True
+        return self.session
+
     async def generate_schedule_from_scratch(
         self,
         context: ScheduleGenerationContext,
@@ -519,8 +770,9 @@ class LLMEngine:
         if not prompt:
             return self._generate_fallback_schedule(context, error_message="Prompt template rendering failed.")
         try:
-            response = await self._call_llm_async(prompt)
-            schedule = self._process_schedule_response(response, format_type)
+            schedule = await self._call_llm_cached(
+                prompt, lambda response: self._process_schedule_response(response, format_type)
+            )
             logger.info(f"Successfully generated schedule from scratch for {context.user_name} on {context.target_date}")
             return schedule
         except Exception as e:
@@ -531,70 +783,327 @@ class LLMEngine:
         self,
         solver_schedule: List[ScheduledTaskInfo], #type: ignore
         context: ScheduleGenerationContext,
-        format_type: str = "json"
+        format_type: str = "json",
+        repair: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
     ) -> Dict[str, Any]:
+        """
+        Refines the solver skeleton into a complete schedule.
+
+        Calls at background priority (see `llm_priority`) are batched with
+        other users' background refinements into one provider call (see
+        `llm_batching`); users the batched call does not answer with a usable
+        entry are refined individually.
+
+        Args:
+            repair: Optional local validation/repair of the parsed schedule. It
+                raises `InvalidLLMOutputError` for output that cannot be
+                repaired; only then (or for unparseable output) is the LLM asked
+                again, up to `INVALID_OUTPUT_REREQUESTS` times. Repaired output
+                is what gets cached.
+        """
         logger.info(f"Refining schedule skeleton for {context.user_name} on {context.target_date}.")
         prompt = self._build_prompt(self._prompt_template_refine, context, format_type, solver_schedule=solver_schedule)
         if not prompt:
             return self._generate_fallback_schedule(context, error_message="Prompt rendering failed in refinement.")
-        try:
-            response = await self._call_llm_async(prompt)
+
+        def parse(response: str) -> Dict[str, Any]:
             schedule = self._process_schedule_response(response, format_type)
+            return repair(schedule) if repair is not None else schedule
+
+        if self.batcher is not None and format_type == "json" and current_llm_priority() == LLMPriority.BACKGROUND:
+            batched = await self._refine_batched(prompt, solver_schedule, context, repair)
+            if batched is not None:
+                return batched
+
+        try:
+            for attempt in range(INVALID_OUTPUT_REREQUESTS + 1):
+                try:
+                    schedule = await self._call_llm_cached(prompt, parse)
+                    break
+                except InvalidLLMOutputError as e:
+                    if attempt == INVALID_OUTPUT_REREQUESTS:
+                        raise
+                    logger.warning(f"Unusable refined schedule ({e}); asking the LLM again.")
             logger.info(f"Successfully refined schedule for {context.user_name} on {context.target_date}")
             return schedule
         except Exception as e:
             logger.error(f"Error refining schedule: {e}", exc_info=True)
             return self._generate_fallback_schedule(context, error_message=str(e))
 
-    def generate_schedule_sync(
+    async def _refine_batched(
         self,
+        prompt: str,
+        solver_schedule: List[ScheduledTaskInfo], #type: ignore
         context: ScheduleGenerationContext,
-        format_type: str = "json"
-    ) -> Dict[str, Any]:
-        logger.warning("generate_schedule_sync is deprecated. Prefer using async refinement.")
-        prompt = self._build_prompt(self._prompt_template_from_scratch, context, format_type)
+        repair: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]],
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Refines through the batcher; None if the user has to be refined individually.
+
+        The result is cached under the key of the individual prompt (and the
+        model that answered), so a later individual refinement of the same
+        inputs is served from the cache.
+        """
+        key = self._cache_key(PRIMARY, self.config.llm_temperature, self.config.llm_max_tokens, prompt)
+        if self.response_cache is not None:
+            cached = await self.response_cache.get(key)
+            if cached is not None:
+                logger.info("LLM response served from cache.")
+                if self.telemetry is not None:
+                    self.telemetry.record_cache_hit(self.config.llm_provider.value, self.config.llm_model_name)
+                return cached
+        section = self._build_prompt(self._prompt_template_refine_section, context, solver_schedule=solver_schedule)
+        if not section:
+            return None
+
+        def parse(answer: Tuple[Any, str]) -> Tuple[Dict[str, Any], str]:
+            entry, origin = answer
+            schedule = self._validate_schedule_data(entry)
+            return (repair(schedule) if repair is not None else schedule), origin
+
+        try:
+            schedule, origin = await self.batcher.submit(section, parse)  # type: ignore[union-attr]
+        except Exception as e:
+            logger.debug(f"Refining {context.user_name} individually: {e}")
+            return None
+        if self.response_cache is not None:
+            if origin != PRIMARY:
+                key = self._cache_key(origin, self.config.llm_temperature, self.config.llm_max_tokens, prompt)
+            await self.response_cache.set(key, schedule)
+        logger.info(f"Successfully refined schedule for {context.user_name} on {context.target_date} (batched)")
+        return schedule
+
+    async def _call_refinement_batch(self, sections: List[Tuple[str, str]]) -> Dict[str, Tuple[Any, str]]:
+        """
+        Sends several users' refinement sections in one prompt (see `RefinementBatcher`).
+
+        Returns:
+            Per-user key: the response entry and the origin (PRIMARY or HEDGE) of the call.
+        """
+        prompt = self._prompt_template_refine_batch.render(  # type: ignore[union-attr]
+            users=[{"key": key, "section": section} for key, section in sections]
+        ).strip()
+
+        def parse(response: str) -> Dict[str, Any]:
+            try:
+                data, _ = parse_llm_json_tiered(response)
+            except ValueError as e:
+                raise InvalidLLMOutputError(f"Invalid or non-extractable JSON response: {e}")
+            if not isinstance(data, dict):
+                raise InvalidLLMOutputError("Parsed JSON is not a dictionary.")
+            return data
+
+        max_tokens = min(self.config.llm_max_tokens * len(sections), self.config.llm_max_output_tokens)
+        with cache_missed():
+            entries, origin = await self._call_llm_parsed(prompt, parse, self.config.llm_temperature, max_tokens)
+        return {key: (entry, origin) for key, entry in entries.items()}
+
+    async def stream_refined_schedule(
+        self,
+        solver_schedule: List[ScheduledTaskInfo], #type: ignore
+        context: ScheduleGenerationContext,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Streaming variant of `refine_and_complete_schedule`.
+
+        Yields `{"type": "item", "item": {...}}` for each schedule item as soon as
+        the provider has finished generating it, then exactly one
+        `{"type": "complete", "schedule": {...}}` with the fully parsed response
+        (or the fallback schedule if the call failed). The final event is
+        authoritative; streamed items are a preview of it.
+        """
+        logger.info(f"Streaming refined schedule for {context.user_name} on {context.target_date}.")
+        prompt = self._build_prompt(self._prompt_template_refine, context, "json", solver_schedule=solver_schedule)
         if not prompt:
-            return self._generate_fallback_schedule(context, error_message="Prompt template rendering failed.")
+            fallback = self._generate_fallback_schedule(context, error_message="Prompt rendering failed in refinement.")
+            yield {"type": "complete", "schedule": fallback}
+            return
+        temperature, max_tokens = self.config.llm_temperature, self.config.llm_max_tokens
+        key = make_cache_key(
+            self.config.llm_provider.value, self.config.llm_model_name, temperature, max_tokens, prompt
+        )
+        if self.response_cache is not None:
+            cached = await self.response_cache.get(key)
+            if cached is not None:
+                logger.info("LLM response served from cache.")
+                for item in cached.get("schedule", []):
+                    yield {"type": "item", "item": item}
+                yield {"type": "complete", "schedule": cached}
+                return
+
+        parser = IncrementalScheduleParser()
         try:
-            response = self._call_llm_sync(prompt)
-            schedule = self._process_schedule_response(response, format_type)
-            logger.info(f"Successfully generated schedule (sync) for {context.user_name} on {context.target_date}")
-            return schedule
+            async for delta in self._stream_llm_async(prompt, temperature, max_tokens):
+                for item in parser.feed(delta):
+                    yield {"type": "item", "item": item}
+            schedule = self._process_schedule_response(parser.text, "json")
         except Exception as e:
-            logger.error(f"Error generating schedule (sync): {e}", exc_info=True)
-            return self._generate_fallback_schedule(context, error_message=str(e))
+            logger.error(f"Error streaming refined schedule: {e}", exc_info=True)
+            schedule = self._generate_fallback_schedule(context, error_message=str(e))
+        else:
+            if self.response_cache is not None:
+                await self.response_cache.set(key, schedule)
+        yield {"type": "complete", "schedule": schedule}
+
+    def generate_schedule_sync(
+        self,
+        context: ScheduleGenerationContext,
+        format_type: str = "json"
+    ) -> Dict[str, Any]:
+        """
+        Blocking wrapper of `generate_schedule_from_scratch` for synchronous callers.
+
+        Runs the async transport on the shared background event loop; must not
+        be called from async code.
+        """
+        return run_sync(self.generate_schedule_from_scratch(context, format_type))
 
     async def explain_schedule_decision(
         self,
         schedule_item: Dict[str, Any],
         context: ScheduleGenerationContext
     ) -> str:
-        item_type = schedule_item.get("type", "unknown")
-        item_time_str = schedule_item.get("start_time", "")
-        item_name = schedule_item.get("name", "")
-        user_chronotype_str = context.user_profile.primary_chronotype.value if context.user_profile else "Unknown"
-        user_age = getattr(context.user_profile, 'age', None)
+        """Explains a single schedule item (see `explain_schedule_items`)."""
+        return (await self.explain_schedule_items([schedule_item], context))[0]
+
+    async def explain_schedule_items(
+        self,
+        schedule_items: Sequence[Dict[str, Any]],
+        context: ScheduleGenerationContext,
+        batch_size: int = 40,
+    ) -> List[str]:
+        """
+        Explains many schedule items with one provider call per batch.
+
+        Explanations are cached per item signature (type, name, times and the
+        user context the explanation depends on), so only items that have not
+        been explained before are sent to the provider.
+
+        Batches are also bounded by the completion cap (`EXPLANATION_ITEM_TOKENS`
+        per item); items a response did not cover (e.g. it was cut off) are
+        requested again in smaller batches before falling back.
+
+        Args:
+            schedule_items: Items to explain.
+            context: User context of the schedule.
+            batch_size: Maximum number of items per prompt.
+
+        Returns:
+            List[str]: One explanation per item, in input order.
+        """
+        chronotype = context.user_profile.primary_chronotype.value if context.user_profile else "Unknown"
+        age = getattr(context.user_profile, 'age', None)
+        keys = [self._explanation_cache_key(item, context, chronotype, age) for item in schedule_items]
+        results: List[Optional[str]] = [None] * len(schedule_items)
+        if self.response_cache is not None:
+            for index, key in enumerate(keys):
+                results[index] = await self.response_cache.get(key)
+
+        missing = [index for index, text in enumerate(results) if text is None]
+        requested, calls = len(missing), 0
+        size = max(1, min(batch_size, (self._explanation_token_cap() - EXPLANATION_OVERHEAD_TOKENS) // EXPLANATION_ITEM_TOKENS))
+        for round_number in range(EXPLANATION_REREQUESTS + 1):
+            if not missing:
+                break
+            if round_number:
+                logger.warning(f"Re-requesting explanations of {len(missing)} uncovered item(s).")
+            batches = [missing[i:i + size] for i in range(0, len(missing), size)]
+            calls += len(batches)
+            explained = await asyncio.gather(*(
+                self._explain_batch([schedule_items[index] for index in batch], context, chronotype, age)
+                for batch in batches
+            ))
+            for batch, texts in zip(batches, explained):
+                for index, text in zip(batch, texts):
+                    if text is None:
+                        continue
+                    results[index] = text
+                    if self.response_cache is not None:
+                        await self.response_cache.set(keys[index], text)
+            missing = [index for index in missing if results[index] is None]
+            size = max(1, size // 2)
+        if requested:
+            logger.info(
+                f"Explained {requested - len(missing)} of {requested} uncached item(s) "
+                f"({len(schedule_items)} total) in {calls} call(s)."
+            )
+        return [text if text is not None else EXPLANATION_FALLBACK for text in results]
+
+    def _explanation_token_cap(self) -> int:
+        return min(self.config.llm_max_tokens, self.config.llm_max_output_tokens)
+
+    def _explanation_cache_key(
+        self, item: Dict[str, Any], context: ScheduleGenerationContext, chronotype: str, age: Optional[int]
+    ) -> str:
+        start = item.get("start_time", "")
+        signature = json.dumps(
+            [item.get("type", "unknown"), item.get("name", ""), start, item.get("end_time", ""),
+             chronotype, age, self._get_energy_for_time(context.energy_pattern, start)],
+            ensure_ascii=False, default=str,
+        )
+        return make_cache_key(
+            self.config.llm_provider.value, self.config.llm_model_name,
+            EXPLANATION_TEMPERATURE, 0, "explain-item:" + signature,
+        )
+
+    async def _explain_batch(
+        self,
+        items: List[Dict[str, Any]],
+        context: ScheduleGenerationContext,
+        chronotype: str,
+        age: Optional[int],
+    ) -> List[Optional[str]]:
+        """
+        Explains one batch; returns None for items the response did not cover.
+
+        Complete entries of a truncated response are kept.
+        """
+        item_lines = "\n".join(
+            f"{number}. {item.get('name', '')} ({item.get('type', 'unknown')}), "
+            f"{item.get('start_time', '')}-{item.get('end_time', '')}, "
+            f"energy level: {self._get_energy_for_time(context.energy_pattern, item.get('start_time', ''))}"
+            for number, item in enumerate(items, start=1)
+        )
         prompt = f"""
         You are an AI assistant explaining schedule decisions.
-        Based on the user's data and preferences below, explain concisely why the following item was scheduled at this specific time:
-
-        Item: {item_name}
-        Type: {item_type}
-        Scheduled Time: {item_time_str}
+        Based on the user's data below, explain concisely why each numbered item was scheduled at its time.
 
         User Context:
-        - Chronotype: {user_chronotype_str}
-        - Age: {user_age or 'Unknown'}
-        - Energy Level at Scheduled Time: {self._get_energy_for_time(context.energy_pattern, item_time_str)}
+        - Chronotype: {chronotype}
+        - Age: {age or 'Unknown'}
+
+        Items:
+{item_lines}
 
-        Provide a brief, user-friendly explanation (under 50 words).
+        Respond ONLY with a JSON object mapping each item number to a brief, user-friendly
+        explanation (under 50 words), e.g. {{"explanations": {{"1": "...", "2": "..."}}}}
         """
+        max_tokens = min(
+            self._explanation_token_cap(), EXPLANATION_ITEM_TOKENS * len(items) + EXPLANATION_OVERHEAD_TOKENS
+        )
         try:
-            response = await self._call_llm_async(prompt, temperature=0.5, max_tokens=100)
-            return response.strip()
+            response = await self._call_llm_async(prompt, temperature=EXPLANATION_TEMPERATURE, max_tokens=max_tokens)
         except Exception as e:
-            logger.error(f"Error generating explanation: {e}")
-            return "Could not generate explanation due to an error."
+            logger.error(f"Error generating explanations: {e}")
+            return [None] * len(items)
+        try:
+            data = parse_llm_json(response)
+        except ValueError as e:
+            logger.warning(f"Explanation response is not valid JSON ({e}); keeping its complete entries.")
+            data = {}
+            for number, text in _EXPLANATION_ENTRY.findall(response):
+                try:
+                    data[number] = json.loads(f'"{text}"')
+                except ValueError:
+                    continue
+        explanations = data.get("explanations", data) if isinstance(data, dict) else {}
+        if not isinstance(explanations, dict):
+            return [None] * len(items)
+        texts: List[Optional[str]] = []
+        for number in range(1, len(items) + 1):
+            text = explanations.get(str(number))
+            texts.append(str(text).strip() if text else None)
+        return texts
 
     async def adapt_from_feedback(
         self,
@@ -613,8 +1122,9 @@ class LLMEngine:
         if not prompt:
             return self._generate_fallback_schedule(context, error_message="Prompt rendering failed during feedback adaptation.")
         try:
-            response = await self._call_llm_async(prompt)
-            schedule = self._process_schedule_response(response, "json")
+            schedule = await self._call_llm_cached(
+                prompt, lambda response: self._process_schedule_response(response, "json")
+            )
             logger.info(f"Adapted schedule generated based on feedback (Rating: {feedback_rating}/5)")
             return schedule
         except Exception as e:
@@ -629,34 +1139,35 @@ class LLMEngine:
         additional_context: str = "",
         solver_schedule: Optional[List[ScheduledTaskInfo]] = None #type: ignore
     ) -> Optional[str]:
+        """
+        Renders a prompt template with the compact context encoding.
+
+        If the prompt exceeds `llm_prompt_token_budget`, optional sections are
+        dropped in `TRIM_ORDER` (lowest value first) until it fits or nothing
+        optional is left.
+        """
         if template is None:
             logger.error("Cannot build prompt: Template is None.")
             return None
         template_context = {
-            "user_id": context.user_id,
             "user_name": context.user_name,
-            "target_date": context.target_date,
-            "user_profile": context.user_profile,
-            "sleep_recommendation": context.sleep_recommendation,
-            "tasks": context.tasks,
-            "fixed_events": context.fixed_events,
-            "preferences": context.preferences,
-            "energy_pattern": context.energy_pattern,
-            "wearable_insights": context.wearable_insights, # Pass new context fields
-            "historical_insights": context.historical_insights, # Pass new context fields
-            "rag_context": context.rag_context,
-            "previous_feedback": context.previous_feedback,
             "additional_context": additional_context,
             "format_type": format_type,
-            "solver_schedule": solver_schedule,
-            "TaskPriority": TaskPriority,
-            "EnergyLevel": EnergyLevel,
-            "timedelta": timedelta
         }
         try:
-            prompt = template.render(template_context)
+            template_context.update(compact_context(context, solver_schedule))
+            omit: set = set()
+            prompt = template.render(template_context, omit=omit).strip()
+            budget = self.config.llm_prompt_token_budget
+            for section in TRIM_ORDER:
+                if estimate_tokens(prompt) <= budget:
+                    break
+                omit.add(section)
+                prompt = template.render(template_context, omit=omit).strip()
+            if omit:
+                logger.info(f"Prompt trimmed to ~{estimate_tokens(prompt)} tokens (dropped: {', '.join(sorted(omit))}).")
             logger.debug(f"Generated LLM Prompt (first 500 chars):\n{prompt[:500]}...")
-            return prompt.strip()
+            return prompt
         except Exception as e:
             logger.exception("Error rendering prompt template.")
             return None
@@ -665,35 +1176,24 @@ class LLMEngine:
         if format_type == "json":
             logger.debug(f"Raw LLM response (first 500 chars): {response[:500]}...")
             try:
-                json_str = extract_valid_json(response)
-                logger.debug(f"Extracted JSON (first 500 chars): {json_str[:500]}...")
-                schedule_data = json5.loads(json_str)
-                if not isinstance(schedule_data, dict):
-                    raise ValueError("Parsed JSON is not a dictionary.")
-                if "schedule" not in schedule_data or not isinstance(schedule_data["schedule"], list):
-                    raise ValueError("Invalid schedule format: missing or invalid 'schedule' array.")
-                return schedule_data
-            except (ValueError, json5.JSONDecodeError) as e:
+                schedule_data, tier = parse_llm_json_tiered(response)
+            except ValueError as e:
                 logger.error(f"Failed to extract/parse JSON response: {e}")
-                match = re.search(r"```json\s*([\s\S]*?)\s*```", response, re.IGNORECASE)
-                if match:
-                    logger.info("Found JSON in markdown block. Attempting to parse.")
-                    try:
-                        schedule_data = json5.loads(match.group(1))
-                        if "schedule" in schedule_data and isinstance(schedule_data["schedule"], list):
-                            return schedule_data
-                        else:
-                            raise ValueError("Markdown JSON missing 'schedule' array.")
-                    except (ValueError, json5.JSONDecodeError) as e_md:
-                        logger.error(f"Markdown JSON parse failed: {e_md}")
                 logger.debug(f"Raw response: {response}")
-                raise ValueError(f"Invalid or non-extractable JSON response: {e}")
-            except Exception as e_gen:
-                logger.error(f"Unexpected error processing JSON: {e_gen}", exc_info=True)
-                raise ValueError(f"Unexpected error processing JSON: {e_gen}")
+                raise InvalidLLMOutputError(f"Invalid or non-extractable JSON response: {e}")
+            if tier != STRICT:
+                logger.info(f"LLM response parsed by the {tier} JSON tier.")
+            return self._validate_schedule_data(schedule_data)
         else:
             return {"schedule_text": response.strip()}
 
+    def _validate_schedule_data(self, schedule_data: Any) -> Dict[str, Any]:
+        if not isinstance(schedule_data, dict):
+            raise InvalidLLMOutputError("Parsed JSON is not a dictionary.")
+        if "schedule" not in schedule_data or not isinstance(schedule_data["schedule"], list):
+            raise InvalidLLMOutputError("Invalid schedule format: missing or invalid 'schedule' array.")
+        return schedule_data
+
     def _generate_fallback_schedule(
         self,
         context: ScheduleGenerationContext,
@@ -724,115 +1224,352 @@ class LLMEngine:
             "warnings": [f"LLM generation failed: {error_message}"]
         }
 
-    async def _call_llm_api(self, provider: ModelProvider, method: str, url: str, headers: Dict, payload: Dict) -> Any:
-        if not self.session or self.session.closed:
-            self.session = aiohttp.ClientSession()
-        session_method = getattr(self.session, method.lower())
+    async def _call_llm_cached(
+        self,
+        prompt: str,
+        parse: Callable[[str], _T],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> _T:
+        """
+        Calls the provider through the response cache.
+
+        `parse` turns the raw completion into the value the caller needs; only
+        values it returns without raising are cached, so a malformed response
+        is never replayed.
+        """
+        temperature = self.config.llm_temperature if temperature is None else temperature
+        max_tokens = self.config.llm_max_tokens if max_tokens is None else max_tokens
+        if self.response_cache is None:
+            return (await self._call_llm_parsed(prompt, parse, temperature, max_tokens))[0]
+
+        key = self._cache_key(PRIMARY, temperature, max_tokens, prompt)
+        cached = await self.response_cache.get(key)
+        if cached is not None:
+            logger.info("LLM response served from cache.")
+            if self.telemetry is not None:
+                self.telemetry.record_cache_hit(self.config.llm_provider.value, self.config.llm_model_name)
+            return cached
+        with cache_missed():
+            parsed, origin = await self._call_llm_parsed(prompt, parse, temperature, max_tokens)
+        if origin != PRIMARY:
+            # A hedge win is the hedge model's output: cache it under that model, not the primary.
+            key = self._cache_key(origin, temperature, max_tokens, prompt)
+        await self.response_cache.set(key, parsed)
+        return parsed
+
+    def _cache_key(self, origin: str, temperature: float, max_tokens: int, prompt: str) -> str:
+        """Response cache key of a completion by the primary or (HEDGE) the hedge model."""
+        config = self.hedge_engine.config if origin == HEDGE and self.hedge_engine is not None else self.config
+        return make_cache_key(config.llm_provider.value, config.llm_model_name, temperature, max_tokens, prompt)
+
+    async def _call_llm_parsed(
+        self, prompt: str, parse: Callable[[str], _T], temperature: float, max_tokens: int
+    ) -> Tuple[_T, str]:
+        """
+        Calls the provider and parses the completion, hedging against `hedge_engine` if configured.
+
+        Returns:
+            The parsed completion and its origin (PRIMARY or HEDGE).
+        """
+        async def primary() -> _T:
+            return parse(await self._call_llm_async(prompt, temperature, max_tokens))
+
+        if self.hedge_engine is None or self.hedging is None:
+            return await primary(), PRIMARY
+
+        async def fallback() -> _T:
+            return parse(await self.hedge_engine._call_llm_async(prompt, temperature, max_tokens))  # type: ignore[union-attr]
+
+        result, origin = await hedged_call(primary, fallback, self.hedging)
+        if origin == HEDGE:
+            logger.info(
+                f"Hedged response from {self.hedge_engine.config.llm_provider.value}/"
+                f"{self.hedge_engine.config.llm_model_name} won."
+            )
+        return result, origin
+
+    async def _call_llm_async(self, prompt: str, temperature: Optional[float] = None, max_tokens: Optional[int] = None) -> str:
+        """
+        Sends a prompt to the configured provider and returns the text completion.
+
+        Concurrent calls with an identical prompt and parameters share one
+        upstream request.
+        """
+        temperature = self.config.llm_temperature if temperature is None else temperature
+        max_tokens = self.config.llm_max_tokens if max_tokens is None else max_tokens
+        key = make_cache_key(
+            self.config.llm_provider.value, self.config.llm_model_name, temperature, max_tokens, prompt
+        )
+        return await self._single_flight.do(
+            key, lambda: self._dispatch_llm_async(prompt, temperature, max_tokens)
+        )
+
+    async def _dispatch_llm_async(self, prompt: str, temperature: float, max_tokens: int) -> str:
+        provider = self.config.llm_provider
+        handlers = {
+            ModelProvider.OPENAI: self._call_openai_async,
+            ModelProvider.MISTRAL: self._call_mistral_async,
+            ModelProvider.HUGGINGFACE: self._call_huggingface_async,
+            ModelProvider.ANTHROPIC: self._call_anthropic_async,
+            ModelProvider.OPENROUTER: self._call_openrouter_async,
+            ModelProvider.LOCAL: self._call_local_model_async,
+            ModelProvider.REPLAY: self._call_replay_async,
+        }
+        handler = handlers.get(provider)
+        if handler is None:
+            raise ValueError(f"Unsupported LLM provider: {provider.value}")
+        started = time_module.monotonic()
+        with self._trace() as trace:
+            completion = await handler(prompt, temperature, max_tokens)
+            if trace is not None:
+                trace.complete(prompt, completion)
+        if self._recorder is not None:
+            self._recorder.record(prompt, completion, time_module.monotonic() - started)
+        return completion
+
+    def _trace(self, streamed: bool = False):
+        """Telemetry of one logical call (a no-op context without telemetry)."""
+        if self.telemetry is None:
+            return contextlib.nullcontext(None)
+        return self.telemetry.trace(
+            self.config.llm_provider.value, self.config.llm_model_name, current_cache_status(), streamed
+        )
+
+    async def _stream_llm_async(self, prompt: str, temperature: float, max_tokens: int) -> AsyncIterator[str]:
+        """
+        Yields the completion as text deltas.
+
+        OpenAI-compatible providers (OpenAI, Mistral, OpenRouter, Replay) and Anthropic
+        stream over server-sent events; other providers yield the whole
+        completion at once.
+        """
+        provider = self.config.llm_provider
+        if provider in (ModelProvider.OPENAI, ModelProvider.MISTRAL, ModelProvider.OPENROUTER, ModelProvider.REPLAY):
+            url, headers, payload = self._chat_completions_request(provider, prompt, temperature, max_tokens)
+            transport_provider = provider if provider in (ModelProvider.OPENROUTER, ModelProvider.REPLAY) else ModelProvider.OPENAI
+            with self._trace(streamed=True) as trace:
+                deltas: List[str] = []
+                async for event in self._stream_llm_api(transport_provider, url, headers, payload, trace):
+                    choices = event.get("choices") or []
+                    delta = choices[0].get("delta", {}).get("content") if choices else None
+                    if delta:
+                        deltas.append(delta)
+                        yield delta
+                if trace is not None:
+                    trace.complete(prompt, "".join(deltas))
+        elif provider == ModelProvider.ANTHROPIC:
+            url, headers, payload = self._anthropic_messages_request(prompt, temperature, max_tokens)
+            with self._trace(streamed=True) as trace:
+                deltas = []
+                async for event in self._stream_llm_api(provider, url, headers, payload, trace):
+                    event_type = event.get("type")
+                    if event_type == "content_block_delta":
+                        text = event.get("delta", {}).get("text")
+                        if text:
+                            deltas.append(text)
+                            yield text
+                    elif event_type == "error":
+                        raise ValueError(f"Anthropic stream error: {event.get('error')}")
+                if trace is not None:
+                    trace.complete(prompt, "".join(deltas))
+        else:
+            yield await self._call_llm_async(prompt, temperature, max_tokens)
+
+    async def _stream_llm_api(
+        self, provider: ModelProvider, url: str, headers: Dict, payload: Dict, trace: Optional[LLMCallTrace] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        POSTs a streaming request and yields the decoded server-sent events.
+
+        Failures are retried like `_call_llm_api` until the first event has been
+        yielded; after that an error propagates to the caller. TTFB in `trace`
+        is the time to the first event.
+        """
+        trace = trace or LLMCallTrace(provider.value, self.config.llm_model_name)
+        payload = {**payload, "stream": True}
+        timeout = aiohttp.ClientTimeout(total=self.config.llm_request_timeout)
         for attempt in range(self.config.llm_max_retries + 1):
+            retry_after: Optional[float] = None
+            started = False
+            breaker = self._admit_attempt()
+            healthy: Optional[bool] = None
+            trace.attempt_started()
+            queued = time_module.monotonic()
             try:
-                logger.debug(f"API Call Attempt {attempt+1}: {method} {url}")
-                async with session_method(url, json=payload, headers=headers, timeout=self.config.llm_request_timeout) as response:
-                    status = response.status
-                    logger.debug(f"API Response Status: {status}")
-                    if status == 401:
-                        raise ValueError(f"{provider.value} API Authentication Error")
-                    if status == 429:
-                        logger.warning(f"{provider.value} API rate limit exceeded. Retrying...")
-                    elif status == 503 and provider == ModelProvider.HUGGINGFACE:
-                        logger.warning("HuggingFace API is loading. Waiting 15s...")
-                        await asyncio.sleep(15)
-                        continue
-                    elif status != 200:
-                        error_text = await response.text()
-                        logger.error(f"{provider.value} API error (status {status}): {error_text[:500]}...")
-                        if attempt == self.config.llm_max_retries:
-                            raise ValueError(f"{provider.value} API error after retries: {status}")
-                    else:
-                        if 'application/json' in response.headers.get('Content-Type', ''):
-                            return await response.json()
+                async with self._provider_slot(provider, payload) as permit:
+                    trace.queue_waited(time_module.monotonic() - queued)
+                    async with self._get_session().post(url, json=payload, headers=headers, timeout=timeout) as response:
+                        status = response.status
+                        # 429 means the provider is up; quota is the rate limiter's concern.
+                        # Client errors say nothing about the provider's health.
+                        healthy = None if is_client_error(status) else status in (200, 429)
+                        if status == 200:
+                            async for event in iter_sse_events(response.content.iter_any()):
+                                if not started:
+                                    trace.first_byte()
+                                started = True
+                                used = response_token_usage(event)
+                                if used is not None:
+                                    permit.used_tokens = used
+                                    trace.usage(event)
+                                yield event
+                            return
+                        if status == 401:
+                            raise LLMRequestRejectedError(f"{provider.value} API Authentication Error")
+                        if status == 429:
+                            trace.rate_limited += 1
+                            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                            logger.warning(f"{provider.value} API rate limit exceeded (Retry-After: {retry_after}). Retrying...")
+                            if self.rate_limits is not None:
+                                self.rate_limits.get(provider.value).penalize(
+                                    retry_after if retry_after is not None else self.config.llm_retry_delay * (2 ** attempt)
+                                )
                         else:
-                            return await response.text()
+                            error_text = await response.text()
+                            logger.error(f"{provider.value} API stream error (status {status}): {error_text[:500]}...")
+                            if is_client_error(status):
+                                raise LLMRequestRejectedError(f"{provider.value} API rejected the request: {status}")
+            except LLMRequestRejectedError:
+                raise
             except (aiohttp.ClientError, ValueError, asyncio.TimeoutError) as e:
-                logger.warning(f"Error during {provider.value} API call (attempt {attempt+1}): {e}")
-                if attempt == self.config.llm_max_retries:
-                    raise
-            except Exception as e:
-                logger.exception(f"Unexpected error during {provider.value} API call (attempt {attempt+1})")
-                if attempt == self.config.llm_max_retries:
+                healthy = False
+                logger.warning(f"Error during {provider.value} streaming call (attempt {attempt+1}): {e}")
+                if started or attempt == self.config.llm_max_retries:
                     raise
+            finally:
+                if breaker is not None:
+                    breaker.record(healthy)
             if attempt < self.config.llm_max_retries:
-                wait_time = self.config.llm_retry_delay * (2 ** attempt)
+                wait_time = jittered(retry_after if retry_after is not None else self.config.llm_retry_delay * (2 ** attempt))
                 logger.info(f"Waiting {wait_time:.1f}s before retry...")
                 await asyncio.sleep(wait_time)
-        logger.error(f"{provider.value} API call failed after all retries.")
-        raise ValueError(f"{provider.value} API call failed after all retries.")
+        raise ValueError(f"{provider.value} streaming call failed after all retries.")
+
+    def _breaker(self) -> Optional[CircuitBreaker]:
+        if self.circuit_breakers is None:
+            return None
+        return self.circuit_breakers.get(self.config.llm_provider.value)
+
+    def _admit_attempt(self) -> Optional[CircuitBreaker]:
+        """Passes the circuit breaker for one attempt; raises while it is open."""
+        breaker = self._breaker()
+        if breaker is not None and not breaker.allow():
+            raise ProviderUnavailableError(
+                f"{self.config.llm_provider.value} circuit breaker is open; skipping the call."
+            )
+        return breaker
+
+    def _provider_slot(self, provider: ModelProvider, payload: Dict):
+        """Admission through the provider's shared rate limiter (a no-op without one)."""
+        estimated = estimate_request_tokens(payload)
+        if self.rate_limits is None:
+            return contextlib.nullcontext(LimiterPermit(tokens=estimated, priority=current_llm_priority()))
+        return self.rate_limits.get(provider.value).slot(estimated)
 
-    def _call_api_sync(self, provider: ModelProvider, method: str, url: str, headers: Dict, payload: Dict) -> Any:
+    async def _call_llm_api(self, provider: ModelProvider, method: str, url: str, headers: Dict, payload: Dict) -> Any:
+        session_method = getattr(self._get_session(), method.lower())
+        timeout = aiohttp.ClientTimeout(total=self.config.llm_request_timeout)
+        # Untraced calls (no telemetry) measure into a throwaway trace.
+        trace = current_trace() or LLMCallTrace(provider.value, self.config.llm_model_name)
         for attempt in range(self.config.llm_max_retries + 1):
+            retry_after: Optional[float] = None
+            breaker = self._admit_attempt()
+            healthy: Optional[bool] = None
+            trace.attempt_started()
+            queued = time_module.monotonic()
             try:
                 logger.debug(f"API Call Attempt {attempt+1}: {method} {url}")
-                response = requests.request(method, url, json=payload, headers=headers, timeout=self.config.llm_request_timeout)
-                status = response.status_code
-                logger.debug(f"API Response Status: {status}")
-                if status == 401:
-                    raise ValueError(f"{provider.value} API Authentication Error")
-                if status == 429:
-                    logger.warning(f"{provider.value} API rate limit exceeded. Retrying...")
-                elif status == 503 and provider == ModelProvider.HUGGINGFACE:
-                    logger.warning("HuggingFace API is loading. Waiting 15s...")
-                    time_module.sleep(15)
-                    continue
-                elif status != 200:
-                    logger.error(f"{provider.value} API error (status {status}): {response.text[:500]}...")
-                    if attempt == self.config.llm_max_retries:
-                        raise ValueError(f"{provider.value} API error after retries: {status}")
-                else:
-                    if 'application/json' in response.headers.get('Content-Type', ''):
-                        return response.json()
-                    else:
-                        return response.text
-            except (requests.RequestException, ValueError) as e:
+                async with self._provider_slot(provider, payload) as permit:
+                    trace.queue_waited(time_module.monotonic() - queued)
+                    async with session_method(url, json=payload, headers=headers, timeout=timeout) as response:
+                        trace.first_byte()
+                        status = response.status
+                        logger.debug(f"API Response Status: {status}")
+                        # 429 means the provider is up; quota is the rate limiter's concern.
+                        # Client errors say nothing about the provider's health.
+                        healthy = None if is_client_error(status) else status in (200, 429)
+                        if status == 401:
+                            raise LLMRequestRejectedError(f"{provider.value} API Authentication Error")
+                        if status == 429:
+                            trace.rate_limited += 1
+                            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                            logger.warning(f"{provider.value} API rate limit exceeded (Retry-After: {retry_after}). Retrying...")
+                            if self.rate_limits is not None:
+                                self.rate_limits.get(provider.value).penalize(
+                                    retry_after if retry_after is not None else self.config.llm_retry_delay * (2 ** attempt)
+                                )
+                        elif status == 503 and provider == ModelProvider.HUGGINGFACE:
+                            logger.warning("HuggingFace API is loading. Waiting 15s...")
+                            retry_after = 15.0
+                        elif status != 200:
+                            error_text = await response.text()
+                            logger.error(f"{provider.value} API error (status {status}): {error_text[:500]}...")
+                            if is_client_error(status):
+                                raise LLMRequestRejectedError(f"{provider.value} API rejected the request: {status}")
+                            if attempt == self.config.llm_max_retries:
+                                raise ValueError(f"{provider.value} API error after retries: {status}")
+                        else:
+                            if 'application/json' in response.headers.get('Content-Type', ''):
+                                result = await response.json()
+                                permit.used_tokens = response_token_usage(result)
+                                trace.usage(result)
+                                return result
+                            return await response.text()
+            except LLMRequestRejectedError:
+                raise
+            except (aiohttp.ClientError, ValueError, asyncio.TimeoutError) as e:
+                healthy = False
                 logger.warning(f"Error during {provider.value} API call (attempt {attempt+1}): {e}")
                 if attempt == self.config.llm_max_retries:
                     raise
             except Exception as e:
+                healthy = False
                 logger.exception(f"Unexpected error during {provider.value} API call (attempt {attempt+1})")
                 if attempt == self.config.llm_max_retries:
                     raise
+            finally:
+                if breaker is not None:
+                    breaker.record(healthy)
             if attempt < self.config.llm_max_retries:
-                wait_time = self.config.llm_retry_delay * (2 ** attempt)
+                wait_time = jittered(retry_after if retry_after is not None else self.config.llm_retry_delay * (2 ** attempt))
                 logger.info(f"Waiting {wait_time:.1f}s before retry...")
-                time_module.sleep(wait_time)
+                await asyncio.sleep(wait_time)
         logger.error(f"{provider.value} API call failed after all retries.")
         raise ValueError(f"{provider.value} API call failed after all retries.")
 
-    async def _call_openai_async(self, prompt: str, temperature: float, max_tokens: int) -> str:
-        if not self.config.api_key:
-            raise ValueError("OpenAI API key missing.")
+    def _chat_completions_request(self, provider: ModelProvider, prompt: str, temperature: float, max_tokens: int) -> Tuple[str, Dict, Dict]:
+        """Builds (url, headers, payload) of an OpenAI-compatible chat completion."""
+        label = "OpenRouter" if provider == ModelProvider.OPENROUTER else "OpenAI"
+        if not self.config.api_key and provider != ModelProvider.REPLAY:
+            raise ValueError(f"{label} API key missing.")
         if not self.config.api_base:
-            raise ValueError("OpenAI API base URL missing.")
+            raise ValueError(f"{label} API base URL missing.")
         headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.config.api_key}"}
+        if provider == ModelProvider.OPENROUTER:
+            if self.config.llm_site_url:
+                headers["HTTP-Referer"] = self.config.llm_site_url
+            if self.config.llm_site_name:
+                headers["X-Title"] = self.config.llm_site_name
         payload = {"model": self.config.llm_model_name, "messages": [{"role": "user", "content": prompt}],
                    "temperature": temperature, "max_tokens": max_tokens, "top_p": self.config.llm_top_p}
-        url = f"{self.config.api_base}/chat/completions"
-        try:
-            result = await self._call_llm_api(ModelProvider.OPENAI, "POST", url, headers, payload)
-            return result["choices"][0]["message"]["content"]
-        except (KeyError, IndexError, TypeError) as e:
-            logger.error(f"Invalid response from OpenAI: {e}")
-            raise ValueError("Invalid response structure from OpenAI") from e
+        return f"{self.config.api_base}/chat/completions", headers, payload
 
-    def _call_openai_sync(self, prompt: str, temperature: float, max_tokens: int) -> str:
+    def _anthropic_messages_request(self, prompt: str, temperature: float, max_tokens: int) -> Tuple[str, Dict, Dict]:
+        """Builds (url, headers, payload) of an Anthropic Messages API call."""
         if not self.config.api_key:
-            raise ValueError("OpenAI API key missing.")
+            raise ValueError("Anthropic API key missing.")
         if not self.config.api_base:
-            raise ValueError("OpenAI API base URL missing.")
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.config.api_key}"}
+            raise ValueError("Anthropic API base URL missing.")
+        headers = {"Content-Type": "application/json", "x-api-key": self.config.api_key, "anthropic-version": "2023-06-01"}
         payload = {"model": self.config.llm_model_name, "messages": [{"role": "user", "content": prompt}],
                    "temperature": temperature, "max_tokens": max_tokens, "top_p": self.config.llm_top_p}
-        url = f"{self.config.api_base}/chat/completions"
+        return f"{self.config.api_base}/messages", headers, payload
+
+    async def _call_openai_async(self, prompt: str, temperature: float, max_tokens: int) -> str:
+        url, headers, payload = self._chat_completions_request(ModelProvider.OPENAI, prompt, temperature, max_tokens)
         try:
-            result = self._call_api_sync(ModelProvider.OPENAI, "POST", url, headers, payload)
+            result = await self._call_llm_api(ModelProvider.OPENAI, "POST", url, headers, payload)
             return result["choices"][0]["message"]["content"]
         except (KeyError, IndexError, TypeError) as e:
             logger.error(f"Invalid response from OpenAI: {e}")
@@ -841,9 +1578,6 @@ class LLMEngine:
     async def _call_mistral_async(self, prompt: str, temperature: float, max_tokens: int) -> str:
         return await self._call_openai_async(prompt, temperature, max_tokens)
 
-    def _call_mistral_sync(self, prompt: str, temperature: float, max_tokens: int) -> str:
-        return self._call_openai_sync(prompt, temperature, max_tokens)
-
     async def _call_huggingface_async(self, prompt: str, temperature: float, max_tokens: int) -> str:
         if not self.config.api_key:
             raise ValueError("HuggingFace API key missing.")
@@ -865,36 +1599,8 @@ class LLMEngine:
             logger.error(f"Invalid response from HuggingFace: {e}")
             raise ValueError("Invalid response structure from HuggingFace") from e
 
-    def _call_huggingface_sync(self, prompt: str, temperature: float, max_tokens: int) -> str:
-        if not self.config.api_key:
-            raise ValueError("HuggingFace API key missing.")
-        if not self.config.api_base:
-            raise ValueError("HuggingFace API base URL missing.")
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.config.api_key}"}
-        payload = {"inputs": prompt,
-                   "parameters": {"max_new_tokens": max_tokens, "temperature": max(temperature, 0.01),
-                                  "top_p": self.config.llm_top_p, "do_sample": True if temperature > 0 else False}}
-        url = f"{self.config.api_base}/{self.config.llm_model_name}"
-        try:
-            result = self._call_api_sync(ModelProvider.HUGGINGFACE, "POST", url, headers, payload)
-            if isinstance(result, list) and result:
-                return str(result[0].get("generated_text", result[0])).strip()
-            if isinstance(result, dict):
-                return str(result.get("generated_text", result)).strip()
-            return str(result).strip()
-        except (KeyError, IndexError, TypeError) as e:
-            logger.error(f"Invalid response from HuggingFace: {e}")
-            raise ValueError("Invalid response structure from HuggingFace") from e
-
     async def _call_anthropic_async(self, prompt: str, temperature: float, max_tokens: int) -> str:
-        if not self.config.api_key:
-            raise ValueError("Anthropic API key missing.")
-        if not self.config.api_base:
-            raise ValueError("Anthropic API base URL missing.")
-        headers = {"Content-Type": "application/json", "x-api-key": self.config.api_key, "anthropic-version": "2023-06-01"}
-        payload = {"model": self.config.llm_model_name, "messages": [{"role": "user", "content": prompt}],
-                   "temperature": temperature, "max_tokens": max_tokens, "top_p": self.config.llm_top_p}
-        url = f"{self.config.api_base}/messages"
+        url, headers, payload = self._anthropic_messages_request(prompt, temperature, max_tokens)
         try:
             result = await self._call_llm_api(ModelProvider.ANTHROPIC, "POST", url, headers, payload)
             return result["content"][0]["text"]
@@ -902,35 +1608,8 @@ class LLMEngine:
             logger.error(f"Invalid response from Anthropic: {e}")
             raise ValueError("Invalid response structure from Anthropic") from e
 
-    def _call_anthropic_sync(self, prompt: str, temperature: float, max_tokens: int) -> str:
-        if not self.config.api_key:
-            raise ValueError("Anthropic API key missing.")
-        if not self.config.api_base:
-            raise ValueError("Anthropic API base URL missing.")
-        headers = {"Content-Type": "application/json", "x-api-key": self.config.api_key, "anthropic-version": "2023-06-01"}
-        payload = {"model": self.config.llm_model_name, "messages": [{"role": "user", "content": prompt}],
-                   "temperature": temperature, "max_tokens": max_tokens, "top_p": self.config.llm_top_p}
-        url = f"{self.config.api_base}/messages"
-        try:
-            result = self._call_api_sync(ModelProvider.ANTHROPIC, "POST", url, headers, payload)
-            return result["content"][0]["text"]
-        except (KeyError, IndexError, TypeError) as e:
-            logger.error(f"Invalid response from Anthropic: {e}")
-            raise ValueError("Invalid response structure from Anthropic") from e
-
     async def _call_openrouter_async(self, prompt: str, temperature: float, max_tokens: int) -> str:
-        if not self.config.api_key:
-            raise ValueError("OpenRouter API key missing.")
-        if not self.config.api_base:
-            raise ValueError("OpenRouter API base URL missing.")
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.config.api_key}"}
-        if self.config.llm_site_url:
-            headers["HTTP-Referer"] = self.config.llm_site_url
-        if self.config.llm_site_name:
-            headers["X-Title"] = self.config.llm_site_name
-        payload = {"model": self.config.llm_model_name, "messages": [{"role": "user", "content": prompt}],
-                   "temperature": temperature, "max_tokens": max_tokens, "top_p": self.config.llm_top_p}
-        url = f"{self.config.api_base}/chat/completions"
+        url, headers, payload = self._chat_completions_request(ModelProvider.OPENROUTER, prompt, temperature, max_tokens)
         try:
             result = await self._call_llm_api(ModelProvider.OPENROUTER, "POST", url, headers, payload)
             return result["choices"][0]["message"]["content"]
@@ -938,33 +1617,22 @@ class LLMEngine:
             logger.error(f"Invalid response from OpenRouter: {e}")
             raise ValueError("Invalid response structure from OpenRouter") from e
 
-    def _call_openrouter_sync(self, prompt: str, temperature: float, max_tokens: int) -> str:
-        if not self.config.api_key:
-            raise ValueError("OpenRouter API key missing.")
-        if not self.config.api_base:
-            raise ValueError("OpenRouter API base URL missing.")
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.config.api_key}"}
-        if self.config.llm_site_url:
-            headers["HTTP-Referer"] = self.config.llm_site_url
-        if self.config.llm_site_name:
-            headers["X-Title"] = self.config.llm_site_name
-        payload = {"model": self.config.llm_model_name, "messages": [{"role": "user", "content": prompt}],
-                   "temperature": temperature, "max_tokens": max_tokens, "top_p": self.config.llm_top_p}
-        url = f"{self.config.api_base}/chat/completions"
+    async def _call_replay_async(self, prompt: str, temperature: float, max_tokens: int) -> str:
+        url, headers, payload = self._chat_completions_request(ModelProvider.REPLAY, prompt, temperature, max_tokens)
         try:
-            result = self._call_api_sync(ModelProvider.OPENROUTER, "POST", url, headers, payload)
+            result = await self._call_llm_api(ModelProvider.REPLAY, "POST", url, headers, payload)
             return result["choices"][0]["message"]["content"]
         except (KeyError, IndexError, TypeError) as e:
-            logger.error(f"Invalid response from OpenRouter: {e}")
-            raise ValueError("Invalid response structure from OpenRouter") from e
+            logger.error(f"Invalid response from replay provider: {e}")
+            raise ValueError("Invalid response structure from replay provider") from e
 
-    def _call_local_model(self, prompt: str, temperature: float, max_tokens: int) -> str:
+    async def _call_local_model_async(self, prompt: str, temperature: float, max_tokens: int) -> str:
         headers = {"Content-Type": "application/json"}
         payload = {"prompt": prompt, "temperature": temperature, "max_tokens": max_tokens, "top_p": self.config.llm_top_p}
         url = self.config.api_base or "http://localhost:8000/v1/completions"
         logger.debug(f"Calling local model at: {url}")
         try:
-            result = self._call_api_sync(ModelProvider.LOCAL, "POST", url, headers, payload)
+            result = await self._call_llm_api(ModelProvider.LOCAL, "POST", url, headers, payload)
             if isinstance(result, dict):
                 return result.get("text", result.get("choices", [{}])[0].get("text", str(result)))
             return str(result)
@@ -987,43 +1655,32 @@ class LLMEngine:
         except (ValueError, IndexError):
             return "Unknown (invalid time)"
 
-def extract_valid_json(text: str) -> str:
-    logger.debug(f"Attempting to extract JSON from text (first 100 chars): {text[:100]}...")
-    start_brace = text.find('{')
-    start_bracket = text.find('[')
-    if start_brace == -1 and start_bracket == -1:
-        raise ValueError("No JSON object or array found in response")
-    if start_brace != -1 and (start_bracket == -1 or start_brace < start_bracket):
-        start = start_brace
-        open_char, close_char = '{', '}'
-    else:
-        start = start_bracket
-        open_char, close_char = '[', ']'
-    open_count = 0
-    end = -1
-    in_string = False
-    escape = False
-    for i in range(start, len(text)):
-        char = text[i]
-        if char == '"' and not escape:
-            in_string = not in_string
-        elif char == '\\' and not escape:
-            escape = True
-            continue
-        if not in_string:
-            if char == open_char:
-                open_count += 1
-            elif char == close_char:
-                open_count -= 1
-                if open_count == 0:
-                    end = i
-                    break
-        escape = False
-    if end == -1:
-        raise ValueError("No balanced JSON object or array found in response")
-    extracted = text[start:end+1]
-    logger.debug(f"Successfully extracted JSON (first 100 chars): {extracted[:100]}...")
-    return extracted
+async def iter_sse_events(chunks: AsyncIterator[bytes]) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Decodes the JSON `data:` payloads of a server-sent event stream.
+
+    Stops at the OpenAI-style `data: [DONE]` sentinel; other fields (`event:`,
+    comments) and undecodable payloads are skipped.
+    """
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        while b"\n" in buffer:
+            line, buffer = buffer.split(b"\n", 1)
+            line = line.strip()
+            if not line.startswith(b"data:"):
+                continue
+            data = line[5:].strip()
+            if data == b"[DONE]":
+                return
+            try:
+                event = json.loads(data)
+            except ValueError:
+                logger.debug(f"Skipping undecodable SSE payload: {data[:100]!r}")
+                continue
+            if isinstance(event, dict):
+                yield event
+
 
 if __name__ == "__main__":
     import asyncio
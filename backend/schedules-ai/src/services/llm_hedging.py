@@ -0,0 +1,131 @@
+# === File: schedules-ai/src/services/llm_hedging.py ===
+
+"""
+Hedged LLM Requests.
+
+When the primary provider has not answered within a threshold derived from
+its own recent latencies (p95 by default), a second request is sent to a
+fallback provider or model. The first valid result wins and the other request
+is cancelled, so tail latency is bounded by the faster of the two. If the
+primary fails outright before the threshold, the fallback is used straight
+away (failover).
+"""
+
+import asyncio
+import logging
+import time as time_module
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Tuple, TypeVar
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+PRIMARY = "primary"
+HEDGE = "hedge"
+
+
+class HedgingPolicy:
+    """
+    Tracks primary latencies and decides when to send the hedge.
+
+    Until `min_samples` successful primary calls have been seen, the hedge is
+    sent after `initial_delay` seconds.
+    """
+
+    def __init__(
+        self,
+        quantile: float = 0.95,
+        initial_delay: float = 8.0,
+        min_delay: float = 1.0,
+        max_delay: float = 30.0,
+        window: int = 200,
+        min_samples: int = 20,
+    ) -> None:
+        self.quantile = min(max(quantile, 0.0), 1.0)
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = max(1, min_samples)
+        self._latencies: Deque[float] = deque(maxlen=max(1, window))
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def record(self, latency: float) -> None:
+        """Records the latency of a successful primary call."""
+        self._latencies.append(latency)
+
+    def delay(self) -> float:
+        """Seconds to wait for the primary before sending the hedge."""
+        if len(self._latencies) < self.min_samples:
+            return self.initial_delay
+        ordered = sorted(self._latencies)
+        value = ordered[min(len(ordered) - 1, int(self.quantile * len(ordered)))]
+        return min(self.max_delay, max(self.min_delay, value))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "delay_seconds": round(self.delay(), 3),
+            "samples": len(self._latencies),
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+async def hedged_call(
+    primary: Callable[[], Awaitable[_T]],
+    fallback: Callable[[], Awaitable[_T]],
+    policy: HedgingPolicy,
+) -> Tuple[_T, str]:
+    """
+    Runs `primary`, racing it against `fallback` once the policy delay passes.
+
+    Args:
+        primary: Factory of the primary call (including response parsing).
+        fallback: Factory of the fallback call (including response parsing).
+        policy: Hedging policy; primary latencies are recorded into it.
+
+    Returns:
+        Tuple of the first successful result and its origin (PRIMARY or HEDGE).
+
+    Raises:
+        Exception: The primary's error if both calls fail.
+    """
+    started = time_module.monotonic()
+    primary_task = asyncio.ensure_future(primary())
+    try:
+        done, _ = await asyncio.wait({primary_task}, timeout=policy.delay())
+    except asyncio.CancelledError:
+        primary_task.cancel()
+        raise
+    if done and primary_task.exception() is None:
+        policy.record(time_module.monotonic() - started)
+        return primary_task.result(), PRIMARY
+
+    if done:
+        logger.warning(f"Primary LLM call failed ({primary_task.exception()}); failing over.")
+    else:
+        logger.info("Primary LLM call is slow; sending hedged request.")
+    policy.hedged += 1
+    fallback_task = asyncio.ensure_future(fallback())
+    pending = {fallback_task} if done else {primary_task, fallback_task}
+    errors: Dict[str, BaseException] = {}
+    if done:
+        errors[PRIMARY] = primary_task.exception()  # type: ignore[assignment]
+    try:
+        while pending:
+            finished, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                origin = PRIMARY if task is primary_task else HEDGE
+                error = task.exception()
+                if error is None:
+                    if origin == PRIMARY:
+                        policy.record(time_module.monotonic() - started)
+                    else:
+                        policy.hedge_wins += 1
+                    return task.result(), origin
+                errors[origin] = error
+        raise errors.get(PRIMARY) or errors[HEDGE]
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,482 @@
+# === File: schedules-ai/src/services/llm_limits.py ===
+
+"""
+LLM Provider Rate Limiting.
+
+Keeps provider calls at the provider quota instead of oscillating around it.
+Each provider gets one `ProviderRateLimiter`, shared by every coroutine of the
+process, which combines:
+
+- a requests-per-minute and a tokens-per-minute token bucket,
+- a cap on concurrent in-flight calls,
+- a priority queue, so interactive calls are admitted before background
+  refinements (see `llm_priority`),
+- a shared cool-down when the provider answers 429, honouring `Retry-After`.
+
+Retry delays get positive jitter (`jittered`) so callers throttled together do
+not retry in lock-step.
+
+`CircuitBreaker` tracks the error rate of each provider over a rolling window.
+While it is open, calls fail immediately with `ProviderUnavailableError`
+instead of running the retry loop against a provider that is down; after a
+cool-down one probe call is let through (half-open) to test recovery.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time as time_module
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class LLMPriority(IntEnum):
+    """Admission priority of an LLM call; lower values are admitted first."""
+
+    INTERACTIVE = 0
+    BACKGROUND = 10
+
+
+_current_priority: ContextVar[LLMPriority] = ContextVar("llm_priority", default=LLMPriority.INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: LLMPriority) -> Iterator[None]:
+    """Sets the priority of LLM calls made in this context (and tasks started from it)."""
+    token = _current_priority.set(priority)
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+def current_llm_priority() -> LLMPriority:
+    """Returns the priority of LLM calls made in the current context."""
+    return _current_priority.get()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parses a `Retry-After` header value.
+
+    Args:
+        value: Delay in seconds or an HTTP date.
+
+    Returns:
+        Optional[float]: Seconds to wait, or None if missing or malformed.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+def jittered(delay: float, jitter: float = 0.25) -> float:
+    """Adds up to `jitter` * `delay` of random delay (never less than `delay`)."""
+    return delay * (1.0 + random.uniform(0.0, max(0.0, jitter)))
+
+
+def estimate_request_tokens(payload: Dict[str, Any]) -> int:
+    """
+    Rough token estimate of a provider request (prompt + completion budget).
+
+    Uses ~4 characters per token for the prompt; the actual usage reported by
+    the provider corrects the estimate after the call.
+    """
+    messages = payload.get("messages")
+    if messages:
+        characters = sum(len(str(message.get("content", ""))) for message in messages)
+    else:
+        characters = len(str(payload.get("prompt") or payload.get("inputs") or ""))
+    completion = payload.get("max_tokens") or payload.get("parameters", {}).get("max_new_tokens") or 0
+    return characters // 4 + int(completion)
+
+
+def response_token_usage(result: Any) -> Optional[int]:
+    """Returns the total tokens reported in a provider response, if any."""
+    if not isinstance(result, dict):
+        return None
+    usage = result.get("usage")
+    if not isinstance(usage, dict):
+        return None
+    if "total_tokens" in usage:
+        return int(usage["total_tokens"])
+    if "input_tokens" in usage or "output_tokens" in usage:
+        return int(usage.get("input_tokens", 0)) + int(usage.get("output_tokens", 0))
+    return None
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `per_minute` tokens per minute."""
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None) -> None:
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, float(burst if burst is not None else per_minute))
+        self.tokens = self.capacity
+        self._updated = time_module.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay_for(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (0 if they are now)."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.tokens
+        return 0.0 if missing <= 0 else missing / self.rate
+
+    def take(self, amount: float, now: float) -> None:
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def adjust(self, delta: float) -> None:
+        """Returns (positive) or charges (negative) tokens; a charge may leave a debt."""
+        self.tokens = min(self.capacity, self.tokens + delta)
+
+    def drain(self, now: float) -> None:
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+
+
+@dataclass
+class LimiterPermit:
+    """Admission of one provider call; set `used_tokens` to settle the estimate."""
+
+    tokens: int
+    priority: LLMPriority
+    queue_wait: float = 0.0
+    used_tokens: Optional[int] = None
+
+
+class ProviderRateLimiter:
+    """
+    Requests/min, tokens/min and concurrency limiter for one provider.
+
+    Waiting calls are admitted strictly in (priority, arrival) order: a call
+    never overtakes a higher-priority one that is still waiting for capacity.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        burst_seconds: float = 15.0,
+    ) -> None:
+        """
+        Args:
+            name: Provider name (for logs).
+            requests_per_minute: Request quota; None disables the limit.
+            tokens_per_minute: Token quota; None disables the limit.
+            max_concurrency: Maximum calls in flight; None disables the limit.
+            burst_seconds: Bucket capacity, in seconds of quota. Smaller values
+                smooth bursts out.
+        """
+        self.name = name
+        self._requests = (
+            TokenBucket(requests_per_minute, requests_per_minute * burst_seconds / 60.0)
+            if requests_per_minute else None
+        )
+        self._tokens = (
+            TokenBucket(tokens_per_minute, tokens_per_minute * burst_seconds / 60.0)
+            if tokens_per_minute else None
+        )
+        self._max_concurrency = max_concurrency or None
+        self._in_flight = 0
+        self._waiters: List[List[Any]] = []  # [priority, seq, future, tokens]
+        self._seq = itertools.count()
+        self._blocked_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._admitted = 0
+        self._throttled = 0
+
+    # --- Public API ---
+
+    @asynccontextmanager
+    async def slot(
+        self, estimated_tokens: int = 0, priority: Optional[LLMPriority] = None
+    ) -> AsyncIterator[LimiterPermit]:
+        """Holds one admission for the duration of a provider call."""
+        permit = await self.acquire(estimated_tokens, priority)
+        try:
+            yield permit
+        finally:
+            self.release(permit)
+
+    async def acquire(self, estimated_tokens: int = 0, priority: Optional[LLMPriority] = None) -> LimiterPermit:
+        """Waits for admission; pair with `release`."""
+        priority = current_llm_priority() if priority is None else priority
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [int(priority), next(self._seq), future, max(0, int(estimated_tokens))])
+        enqueued = time_module.monotonic()
+        self._dispatch()
+        try:
+            permit: LimiterPermit = await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(future.result())
+            else:
+                self._dispatch()  # Let the next waiter through.
+            raise
+        permit.queue_wait = time_module.monotonic() - enqueued
+        return permit
+
+    def release(self, permit: LimiterPermit) -> None:
+        """Frees the admission and settles the token estimate with the actual usage."""
+        self._in_flight -= 1
+        if self._tokens is not None and permit.used_tokens is not None:
+            self._tokens.adjust(permit.tokens - permit.used_tokens)
+        self._dispatch()
+
+    def penalize(self, retry_after: float) -> None:
+        """
+        Pauses admissions after a 429 from the provider.
+
+        The request bucket is drained too, so admissions resume at the steady
+        refill rate instead of in a burst.
+        """
+        now = time_module.monotonic()
+        self._blocked_until = max(self._blocked_until, now + max(0.0, retry_after))
+        if self._requests is not None:
+            self._requests.drain(now)
+        self._throttled += 1
+        logger.warning(f"{self.name} rate limited; pausing new calls for {retry_after:.1f}s.")
+        self._dispatch()
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns queue depth, in-flight calls and counters."""
+        return {
+            "waiting": sum(1 for waiter in self._waiters if not waiter[2].done()),
+            "in_flight": self._in_flight,
+            "admitted": self._admitted,
+            "throttled": self._throttled,
+        }
+
+    # --- Internals ---
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time_module.monotonic()
+        while self._waiters:
+            priority, _, future, tokens = self._waiters[0]
+            if future.done():  # Cancelled while waiting.
+                heapq.heappop(self._waiters)
+                continue
+            if self._max_concurrency is not None and self._in_flight >= self._max_concurrency:
+                return  # `release` dispatches again.
+            delay = self._blocked_until - now
+            if self._requests is not None:
+                delay = max(delay, self._requests.delay_for(1, now))
+            if self._tokens is not None:
+                delay = max(delay, self._tokens.delay_for(tokens, now))
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            if self._requests is not None:
+                self._requests.take(1, now)
+            if self._tokens is not None:
+                self._tokens.take(tokens, now)
+            self._in_flight += 1
+            self._admitted += 1
+            future.set_result(LimiterPermit(tokens=tokens, priority=LLMPriority(priority)))
+
+
+class RateLimiterRegistry:
+    """
+    Per-provider limiters built from configuration.
+
+    `limits` maps a provider name (e.g. "openrouter") to keyword arguments of
+    `ProviderRateLimiter`; the "default" entry applies to unlisted providers.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        self._limits = limits or {}
+        self._limiters: Dict[str, ProviderRateLimiter] = {}
+
+    def get(self, provider: str) -> ProviderRateLimiter:
+        limiter = self._limiters.get(provider)
+        if limiter is None:
+            conf = self._limits.get(provider, self._limits.get("default", {}))
+            limiter = ProviderRateLimiter(provider, **conf)
+            self._limiters[provider] = limiter
+        return limiter
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: limiter.stats() for name, limiter in self._limiters.items()}
+
+
+class ProviderUnavailableError(ValueError):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Rolling-window circuit breaker for one provider.
+
+    States:
+        closed: calls pass; outcomes are recorded over the last `window_seconds`.
+            Once at least `min_calls` outcomes are recorded and the share of
+            failures reaches `failure_rate`, the breaker opens.
+        open: calls are refused for `open_seconds`.
+        half_open: a single probe call is let through; its success closes the
+            breaker, its failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = 0.5,
+        min_calls: int = 5,
+        window_seconds: float = 60.0,
+        open_seconds: float = 30.0,
+    ) -> None:
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = max(1, min_calls)
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self.state = self.CLOSED
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._rejected = 0
+        self._opened = 0
+
+    def allow(self) -> bool:
+        """
+        Admits a call; False while the breaker is open.
+
+        In the half-open state the first admitted call becomes the probe;
+        pair every admitted call with `record`.
+        """
+        now = time_module.monotonic()
+        if self.state == self.CLOSED:
+            return True
+        if self._probe_due(now):
+            self.state = self.HALF_OPEN
+            self._probe_started = now
+            logger.info(f"{self.name} circuit half-open; probing the provider.")
+            return True
+        self._rejected += 1
+        return False
+
+    def available(self) -> bool:
+        """Whether `allow` would admit a call now (without admitting it)."""
+        return self.state == self.CLOSED or self._probe_due(time_module.monotonic())
+
+    def record(self, success: Optional[bool]) -> None:
+        """
+        Records the outcome of an admitted call.
+
+        Args:
+            success: True/False for a provider success/failure; None when the
+                call ended without a verdict (e.g. cancelled).
+        """
+        now = time_module.monotonic()
+        if self.state == self.HALF_OPEN:
+            if success is None:
+                self._probe_started = None  # Let another call probe.
+            elif success:
+                logger.info(f"{self.name} circuit closed; provider recovered.")
+                self.state = self.CLOSED
+                self._outcomes.clear()
+                self._failures = 0
+            else:
+                self._open(now)
+            return
+        if success is None or self.state == self.OPEN:
+            return
+        self._outcomes.append((now, success))
+        if not success:
+            self._failures += 1
+        self._prune(now)
+        if len(self._outcomes) >= self.min_calls and self._failures / len(self._outcomes) >= self.failure_rate:
+            self._open(now)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "window_calls": len(self._outcomes),
+            "window_failures": self._failures,
+            "opened": self._opened,
+            "rejected": self._rejected,
+        }
+
+    def _probe_due(self, now: float) -> bool:
+        if self.state == self.OPEN:
+            return now - self._opened_at >= self.open_seconds
+        if self.state == self.HALF_OPEN:
+            # A probe that never reported back is replaced after a cool-down.
+            return self._probe_started is None or now - self._probe_started >= self.open_seconds
+        return False
+
+    def _open(self, now: float) -> None:
+        logger.warning(
+            f"{self.name} circuit open: {self._failures}/{len(self._outcomes)} recent calls failed; "
+            f"refusing calls for {self.open_seconds:.0f}s."
+        )
+        self.state = self.OPEN
+        self._opened_at = now
+        self._probe_started = None
+        self._outcomes.clear()
+        self._failures = 0
+        self._opened += 1
+
+    def _prune(self, now: float) -> None:
+        while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+            _, success = self._outcomes.popleft()
+            if not success:
+                self._failures -= 1
+
+
+class CircuitBreakerRegistry:
+    """
+    Per-provider circuit breakers built from configuration.
+
+    `settings` maps a provider name to keyword arguments of `CircuitBreaker`;
+    the "default" entry applies to unlisted providers.
+    """
+
+    def __init__(self, settings: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        self._settings = settings or {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, provider: str) -> CircuitBreaker:
+        breaker = self._breakers.get(provider)
+        if breaker is None:
+            conf = self._settings.get(provider, self._settings.get("default", {}))
+            breaker = CircuitBreaker(provider, **conf)
+            self._breakers[provider] = breaker
+        return breaker
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: breaker.stats() for name, breaker in self._breakers.items()}
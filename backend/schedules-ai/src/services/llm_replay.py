@@ -0,0 +1,286 @@
+# === File: schedules-ai/src/services/llm_replay.py ===
+
+"""
+Record/Replay LLM Provider.
+
+Lets the whole scheduling pipeline, including refinement, run offline. This
+is meant for load and latency tests and CI benchmarks: no provider is paid
+for and nothing goes over the network.
+
+- `ReplayStore` keeps recorded completions in a JSON Lines file, keyed by the
+  SHA-256 of the rendered prompt. An engine configured with
+  `LLM_REPLAY_RECORD=true` appends every non-streamed completion it receives
+  from a real provider to the store.
+- `ReplaySession` stands in for the `aiohttp.ClientSession` of an engine with
+  `LLM_PROVIDER=replay`. It answers OpenAI-style chat completion requests,
+  plain or streamed, from the store, and can add synthetic latency, server
+  errors and 429 responses with `Retry-After`. Requests still go through
+  `LLMEngine._call_llm_api`, so retries, rate limiting and circuit breaking
+  behave as they do against a real provider.
+
+Latency distributions (`LLM_REPLAY_LATENCY`, in seconds):
+``none``, ``fixed:0.8``, ``uniform:0.5,3``, ``lognormal:1.5,0.6``
+(median, sigma) and ``recorded`` (the latency measured when recording).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+LATENCY_KINDS = ("none", "fixed", "uniform", "lognormal", "recorded")
+
+
+def prompt_key(prompt: str) -> str:
+    """SHA-256 hex digest of the rendered prompt."""
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+@dataclass(frozen=True)
+class LatencyDistribution:
+    """Synthetic response latency (seconds)."""
+
+    kind: str = "none"
+    a: float = 0.0
+    b: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: Optional[str]) -> "LatencyDistribution":
+        """
+        Parses a spec such as ``"lognormal:1.5,0.6"``.
+
+        Raises:
+            ValueError: If the kind is unknown or its parameters are missing.
+        """
+        if not spec:
+            return cls()
+        kind, _, raw_params = spec.strip().partition(":")
+        kind = kind.strip().lower()
+        if kind not in LATENCY_KINDS:
+            raise ValueError(f"Unknown replay latency distribution '{kind}' (expected one of {LATENCY_KINDS}).")
+        params = [float(value) for value in raw_params.split(",") if value.strip()]
+        required = {"none": 0, "recorded": 0, "fixed": 1, "uniform": 2, "lognormal": 2}[kind]
+        if len(params) < required:
+            raise ValueError(f"Replay latency '{kind}' needs {required} parameter(s), got '{spec}'.")
+        params += [0.0] * (2 - len(params))
+        return cls(kind, params[0], params[1])
+
+    def sample(self, rng: random.Random, recorded: Optional[float] = None) -> float:
+        if self.kind == "fixed":
+            return max(0.0, self.a)
+        if self.kind == "uniform":
+            return max(0.0, rng.uniform(self.a, self.b))
+        if self.kind == "lognormal":
+            return rng.lognormvariate(math.log(max(self.a, 1e-6)), self.b)
+        if self.kind == "recorded":
+            return max(0.0, recorded or 0.0)
+        return 0.0
+
+
+@dataclass
+class ReplayProfile:
+    """
+    Behaviour of the replay provider.
+
+    Attributes:
+        latency: Latency added to every response.
+        error_rate: Fraction of requests answered with HTTP 500.
+        rate_limit_rate: Fraction of requests answered with HTTP 429.
+        retry_after: `Retry-After` seconds sent with injected 429 responses.
+        strict: If True, unrecorded prompts get HTTP 404. Otherwise a recorded
+            completion is picked deterministically from the prompt hash, so
+            freshly rendered prompts (new dates, users) still get an answer.
+        seed: Seed of the latency and fault injection (None: nondeterministic).
+    """
+
+    latency: LatencyDistribution = LatencyDistribution()
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after: float = 1.0
+    strict: bool = False
+    seed: Optional[int] = None
+
+    @classmethod
+    def from_config(cls, config: Any) -> "ReplayProfile":
+        """Builds the profile from the `llm_replay_*` fields of a ModelConfig."""
+        return cls(
+            latency=LatencyDistribution.parse(config.llm_replay_latency),
+            error_rate=config.llm_replay_error_rate,
+            rate_limit_rate=config.llm_replay_rate_limit_rate,
+            retry_after=config.llm_replay_retry_after,
+            strict=config.llm_replay_strict,
+            seed=config.llm_replay_seed,
+        )
+
+
+class ReplayStore:
+    """Recorded completions keyed by prompt hash, optionally backed by a JSON Lines file."""
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as handle:
+                for line_number, line in enumerate(handle, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry
+                    except (ValueError, KeyError, TypeError):
+                        logger.warning(f"Skipping malformed replay record {path}:{line_number}.")
+        logger.info(f"Replay store loaded {len(self._entries)} recorded responses from {path or 'memory'}.")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, prompt: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(prompt_key(prompt))
+
+    def nearest(self, prompt: str) -> Optional[Dict[str, Any]]:
+        """A recorded entry chosen deterministically from the prompt hash (None if empty)."""
+        if not self._entries:
+            return None
+        keys = sorted(self._entries)
+        return self._entries[keys[int(prompt_key(prompt), 16) % len(keys)]]
+
+    def record(self, prompt: str, completion: str, latency: Optional[float] = None) -> None:
+        """Stores a completion, appending it to the backing file if there is one."""
+        entry: Dict[str, Any] = {"key": prompt_key(prompt), "completion": completion}
+        if latency is not None:
+            entry["latency"] = round(latency, 4)
+        self._entries[entry["key"]] = entry
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as handle:
+                handle.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+class _ReplayContent:
+    def __init__(self, chunks: List[bytes]) -> None:
+        self._chunks = chunks
+
+    async def iter_any(self) -> AsyncIterator[bytes]:
+        for chunk in self._chunks:
+            yield chunk
+
+
+class ReplayResponse:
+    """Response of `ReplaySession.post`, delayed by the sampled latency on entry."""
+
+    def __init__(
+        self,
+        status: int,
+        payload: Any,
+        delay: float,
+        timeout: Optional[float],
+        headers: Optional[Dict[str, str]] = None,
+        chunks: Optional[List[bytes]] = None,
+    ) -> None:
+        self.status = status
+        self.headers = {"Content-Type": "text/event-stream" if chunks else "application/json", **(headers or {})}
+        self.content = _ReplayContent(chunks or [])
+        self._payload = payload
+        self._delay = delay
+        self._timeout = timeout
+
+    async def json(self) -> Any:
+        return self._payload
+
+    async def text(self) -> str:
+        return json.dumps(self._payload, ensure_ascii=False)
+
+    async def __aenter__(self) -> "ReplayResponse":
+        if self._timeout is not None and self._delay > self._timeout:
+            await asyncio.sleep(self._timeout)
+            raise asyncio.TimeoutError()
+        if self._delay > 0:
+            await asyncio.sleep(self._delay)
+        return self
+
+    async def __aexit__(self, *exc: Any) -> bool:
+        return False
+
+
+def _sse_chunks(completion: str, total_tokens: int, piece: int = 64) -> List[bytes]:
+    events = [
+        {"choices": [{"delta": {"content": completion[i:i + piece]}}]}
+        for i in range(0, len(completion), piece)
+    ]
+    events.append({"choices": [], "usage": {"total_tokens": total_tokens}})
+    body = "".join(f"data: {json.dumps(event, ensure_ascii=False)}\n\n" for event in events)
+    return [(body + "data: [DONE]\n\n").encode("utf-8")]
+
+
+class ReplaySession:
+    """
+    Stand-in for `aiohttp.ClientSession` serving recorded chat completions.
+
+    Only `post` (used by `LLMEngine`) is implemented.
+    """
+
+    def __init__(self, store: ReplayStore, profile: Optional[ReplayProfile] = None) -> None:
+        self.store = store
+        self.profile = profile or ReplayProfile()
+        self.closed = False
+        self._rng = random.Random(self.profile.seed)
+        self.counters: Dict[str, int] = {
+            "requests": 0, "hits": 0, "misses": 0, "injected_errors": 0, "injected_rate_limits": 0,
+        }
+
+    @classmethod
+    def from_config(cls, config: Any) -> "ReplaySession":
+        return cls(ReplayStore(config.llm_replay_path), ReplayProfile.from_config(config))
+
+    def post(self, url: str, json: Optional[Dict[str, Any]] = None, headers: Optional[Dict] = None,
+             timeout: Any = None) -> ReplayResponse:
+        payload = json or {}
+        self.counters["requests"] += 1
+        total_timeout = getattr(timeout, "total", None)
+        roll = self._rng.random()
+        if roll < self.profile.rate_limit_rate:
+            self.counters["injected_rate_limits"] += 1
+            return ReplayResponse(
+                429, {"error": "injected rate limit"}, 0.0, total_timeout,
+                headers={"Retry-After": f"{self.profile.retry_after:g}"},
+            )
+
+        messages = payload.get("messages") or [{}]
+        prompt = str(messages[-1].get("content", payload.get("prompt", "")))
+        entry = self.store.get(prompt)
+        if entry is not None:
+            self.counters["hits"] += 1
+        else:
+            self.counters["misses"] += 1
+            entry = None if self.profile.strict else self.store.nearest(prompt)
+        delay = self.profile.latency.sample(self._rng, entry.get("latency") if entry else None)
+
+        if roll < self.profile.rate_limit_rate + self.profile.error_rate:
+            self.counters["injected_errors"] += 1
+            return ReplayResponse(500, {"error": "injected server error"}, delay, total_timeout)
+        if entry is None:
+            return ReplayResponse(404, {"error": "no recorded response for prompt"}, delay, total_timeout)
+
+        completion = entry["completion"]
+        total_tokens = (len(prompt) + len(completion)) // 4
+        if payload.get("stream"):
+            return ReplayResponse(200, None, delay, total_timeout, chunks=_sse_chunks(completion, total_tokens))
+        return ReplayResponse(200, {
+            "choices": [{"message": {"role": "assistant", "content": completion}}],
+            "usage": {"total_tokens": total_tokens},
+        }, delay, total_timeout)
+
+    def stats(self) -> Dict[str, int]:
+        return dict(self.counters)
+
+    async def close(self) -> None:
+        self.closed = True
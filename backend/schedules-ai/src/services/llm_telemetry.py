@@ -0,0 +1,271 @@
+# === File: schedules-ai/src/services/llm_telemetry.py ===
+
+"""
+LLM Call Telemetry.
+
+Every logical LLM call produces one `LLMCallTrace`. It records the provider,
+model, number of attempts, time spent waiting for the rate limiter, time to
+first byte, total time, prompt and completion tokens, cache hit or miss, and
+the outcome. The trace is logged as one JSON line and aggregated per
+provider/model in `LLMTelemetry`; `stats()` feeds the metrics endpoint.
+
+Provider-reported token usage is used where available. Otherwise tokens are
+estimated from the text (~4 characters per token) and the trace is flagged
+`tokens_estimated`. Cost is derived from the configured per-model prices
+(USD per 1000 tokens).
+"""
+
+import asyncio
+import json
+import logging
+import time as time_module
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from typing import Any, Deque, Dict, Iterator, Optional, Tuple
+
+from src.services.llm_limits import ProviderUnavailableError
+from src.services.prompt_compaction import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+ERROR = "error"
+RATE_LIMITED = "rate_limited"
+UNAVAILABLE = "unavailable"
+CANCELLED = "cancelled"
+
+CACHE_HIT = "hit"
+CACHE_MISS = "miss"
+CACHE_NONE = "none"
+
+_current_trace: ContextVar[Optional["LLMCallTrace"]] = ContextVar("llm_call_trace", default=None)
+_cache_status: ContextVar[str] = ContextVar("llm_cache_status", default=CACHE_NONE)
+
+
+def current_trace() -> Optional["LLMCallTrace"]:
+    """Trace of the LLM call running in this context, if telemetry is enabled."""
+    return _current_trace.get()
+
+
+def current_cache_status() -> str:
+    """CACHE_MISS inside `cache_missed()`, CACHE_NONE for calls that bypass the response cache."""
+    return _cache_status.get()
+
+
+@contextmanager
+def cache_missed() -> Iterator[None]:
+    """Marks provider calls made in this context as response-cache misses."""
+    token = _cache_status.set(CACHE_MISS)
+    try:
+        yield
+    finally:
+        _cache_status.reset(token)
+
+
+def usage_breakdown(result: Any) -> Tuple[Optional[int], Optional[int]]:
+    """(prompt, completion) tokens reported in a provider response or stream event."""
+    if not isinstance(result, dict) or not isinstance(result.get("usage"), dict):
+        return None, None
+    usage = result["usage"]
+    prompt = usage.get("prompt_tokens", usage.get("input_tokens"))
+    completion = usage.get("completion_tokens", usage.get("output_tokens"))
+    return (
+        int(prompt) if prompt is not None else None,
+        int(completion) if completion is not None else None,
+    )
+
+
+@dataclass
+class LLMCallTrace:
+    """Measurements of one logical LLM call (all of its attempts)."""
+
+    provider: str
+    model: Optional[str]
+    cache: str = CACHE_NONE
+    streamed: bool = False
+    attempts: int = 0
+    rate_limited: int = 0
+    queue_wait_seconds: float = 0.0
+    ttfb_seconds: Optional[float] = None
+    total_seconds: float = 0.0
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    tokens_estimated: bool = False
+    cost_usd: Optional[float] = None
+    outcome: str = OK
+    started: float = field(default_factory=time_module.monotonic, repr=False)
+    _request_sent: float = field(default=0.0, repr=False)
+
+    def attempt_started(self) -> None:
+        self.attempts += 1
+
+    def queue_waited(self, seconds: float) -> None:
+        self.queue_wait_seconds += seconds
+        self._request_sent = time_module.monotonic()
+
+    def first_byte(self) -> None:
+        """Marks the response headers (or first stream event) of the current attempt."""
+        self.ttfb_seconds = time_module.monotonic() - (self._request_sent or self.started)
+
+    def usage(self, result: Any) -> None:
+        prompt, completion = usage_breakdown(result)
+        if prompt is not None:
+            self.prompt_tokens = prompt
+        if completion is not None:
+            self.completion_tokens = completion
+
+    def complete(self, prompt: str, completion: str) -> None:
+        """Estimates the token counts the provider did not report."""
+        if self.prompt_tokens is None or self.completion_tokens is None:
+            self.tokens_estimated = True
+            if self.prompt_tokens is None:
+                self.prompt_tokens = estimate_tokens(prompt)
+            if self.completion_tokens is None:
+                self.completion_tokens = estimate_tokens(completion)
+
+    def as_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data.pop("started")
+        data.pop("_request_sent")
+        return data
+
+
+class _Summary:
+    """Rolling window of one latency measurement."""
+
+    def __init__(self, window: int) -> None:
+        self._values: Deque[float] = deque(maxlen=window)
+
+    def add(self, value: Optional[float]) -> None:
+        if value is not None:
+            self._values.append(value)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        if not self._values:
+            return {"p50": None, "p95": None, "max": None}
+        ordered = sorted(self._values)
+        return {
+            "p50": round(ordered[len(ordered) // 2], 4),
+            "p95": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 4),
+            "max": round(ordered[-1], 4),
+        }
+
+
+class _ModelStats:
+    def __init__(self, window: int) -> None:
+        self.calls = 0
+        self.outcomes: Dict[str, int] = {}
+        self.cache_hits = 0
+        self.attempts = 0
+        self.rate_limited = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated_calls = 0
+        self.cost_usd = 0.0
+        self.queue_wait = _Summary(window)
+        self.ttfb = _Summary(window)
+        self.total = _Summary(window)
+
+    def add(self, trace: LLMCallTrace) -> None:
+        self.calls += 1
+        self.outcomes[trace.outcome] = self.outcomes.get(trace.outcome, 0) + 1
+        if trace.cache == CACHE_HIT:
+            self.cache_hits += 1
+            return
+        self.attempts += trace.attempts
+        self.rate_limited += trace.rate_limited
+        self.prompt_tokens += trace.prompt_tokens or 0
+        self.completion_tokens += trace.completion_tokens or 0
+        self.estimated_calls += trace.tokens_estimated
+        self.cost_usd += trace.cost_usd or 0.0
+        self.queue_wait.add(trace.queue_wait_seconds)
+        self.ttfb.add(trace.ttfb_seconds)
+        self.total.add(trace.total_seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        provider_calls = self.calls - self.cache_hits
+        return {
+            "calls": self.calls,
+            "outcomes": dict(self.outcomes),
+            "cache_hits": self.cache_hits,
+            "cache_hit_ratio": round(self.cache_hits / self.calls, 4) if self.calls else 0.0,
+            "attempts": self.attempts,
+            "rate_limited": self.rate_limited,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "mean_prompt_tokens": round(self.prompt_tokens / provider_calls, 1) if provider_calls else 0.0,
+            "estimated_token_calls": self.estimated_calls,
+            "cost_usd": round(self.cost_usd, 6),
+            "queue_wait_seconds": self.queue_wait.stats(),
+            "ttfb_seconds": self.ttfb.stats(),
+            "total_seconds": self.total.stats(),
+        }
+
+
+class LLMTelemetry:
+    """
+    In-process aggregation of LLM call traces, shared by all engines.
+
+    Settings (all optional): `window` (latency samples kept per model) and
+    `prices_per_1k_tokens` ({model: {"prompt": usd, "completion": usd}}).
+    """
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None) -> None:
+        settings = settings or {}
+        self.window = int(settings.get("window", 1000))
+        self.prices: Dict[str, Dict[str, float]] = settings.get("prices_per_1k_tokens") or {}
+        self._models: Dict[str, _ModelStats] = {}
+
+    def cost(self, model: Optional[str], prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+        price = self.prices.get(model or "")
+        if price is None:
+            return None
+        return (prompt_tokens * price.get("prompt", 0.0) + completion_tokens * price.get("completion", 0.0)) / 1000
+
+    @contextmanager
+    def trace(self, provider: str, model: Optional[str], cache: str = CACHE_NONE,
+              streamed: bool = False) -> Iterator[LLMCallTrace]:
+        """
+        Measures one logical call; `current_trace()` returns it inside the block.
+
+        The outcome is derived from the exception leaving the block, if any.
+        Streamed calls are not bound to the context (an async generator may be
+        closed from another task), so their trace has to be passed on explicitly.
+        """
+        trace = LLMCallTrace(provider=provider, model=model, cache=cache, streamed=streamed)
+        token = None if streamed else _current_trace.set(trace)
+        try:
+            yield trace
+        except (asyncio.CancelledError, GeneratorExit):
+            trace.outcome = CANCELLED
+            raise
+        except Exception as e:
+            if isinstance(e, ProviderUnavailableError):
+                trace.outcome = UNAVAILABLE
+            else:
+                trace.outcome = RATE_LIMITED if trace.rate_limited >= trace.attempts > 0 else ERROR
+            raise
+        finally:
+            if token is not None:
+                _current_trace.reset(token)
+            trace.total_seconds = time_module.monotonic() - trace.started
+            self.record(trace)
+
+    def record_cache_hit(self, provider: str, model: Optional[str]) -> None:
+        self.record(LLMCallTrace(provider=provider, model=model, cache=CACHE_HIT))
+
+    def record(self, trace: LLMCallTrace) -> None:
+        if trace.prompt_tokens is not None and trace.completion_tokens is not None:
+            trace.cost_usd = self.cost(trace.model, trace.prompt_tokens, trace.completion_tokens)
+        key = f"{trace.provider}/{trace.model}"
+        stats = self._models.get(key)
+        if stats is None:
+            stats = self._models[key] = _ModelStats(self.window)
+        stats.add(trace)
+        logger.info(f"LLM call telemetry: {json.dumps(trace.as_dict(), separators=(',', ':'))}")
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Aggregates per `provider/model`."""
+        return {key: stats.stats() for key, stats in self._models.items()}
@@ -0,0 +1,257 @@
+# === File: schedules-ai/src/services/prompt_compaction.py ===
+
+"""
+Compact Prompt Encoding.
+
+Encodes the schedule context for the LLM prompts in a dense, structured form
+instead of verbose natural-language lists: times as minutes after midnight,
+the 24-hour energy pattern run-length encoded, insights as short `key=value`
+pairs with missing values dropped, and JSON without indentation.
+
+`TRIM_ORDER` lists the optional prompt sections from lowest to highest value;
+`LLMEngine._build_prompt` drops them in that order while the rendered prompt
+exceeds the configured token budget.
+
+The energy pattern and sleep recommendation encodings repeat across a user's
+requests, so they are memoized per distinct input; the templates only
+interpolate strings.
+"""
+
+import json
+from datetime import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Optional sections, least valuable first. Skeleton, instructions and output
+# format are never trimmed.
+TRIM_ORDER: Tuple[str, ...] = (
+    "day_patterns",
+    "historical",
+    "rag",
+    "wearables",
+    "previous_feedback",
+    "activity_goals",
+    "energy",
+)
+
+WEARABLE_KEYS: Tuple[Tuple[str, str], ...] = (
+    ("sleep_quality", "sleep_q"),
+    ("stress_level", "stress"),
+    ("readiness_score", "readiness"),
+    ("steps_yesterday", "steps"),
+    ("avg_heart_rate", "hr"),
+    ("recovery_needed", "recovery"),
+    ("activity_recommendation", "activity"),
+    ("focus_periods", "focus"),
+)
+
+HISTORICAL_KEYS: Tuple[Tuple[str, str], ...] = (
+    ("typical_lunch", "lunch"),
+    ("common_activity", "habit"),
+    ("productive_hours", "productive"),
+    ("common_breaks", "breaks"),
+    ("task_completion_success_rate", "completion"),
+    ("optimal_task_duration", "focus_min"),
+    ("typical_sleep_duration", "sleep_h"),
+)
+
+DAY_PATTERN_KEYS: Tuple[Tuple[str, str], ...] = (
+    ("productivity", "productivity"),
+    ("common_activities", "activities"),
+    ("typical_end_time", "end"),
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token)."""
+    return len(text) // 4
+
+
+def to_minutes(value: Any) -> Optional[int]:
+    """Minutes after midnight of a `time` or "HH:MM" string; None if unparseable."""
+    if isinstance(value, time):
+        return value.hour * 60 + value.minute
+    if isinstance(value, str):
+        try:
+            hours, minutes = value.strip().split(":")[:2]
+            return int(hours) * 60 + int(minutes)
+        except ValueError:
+            return None
+    return None
+
+
+def compact_json(value: Any) -> str:
+    """JSON without whitespace."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, (list, tuple)):
+        return "/".join(str(v) for v in value)
+    if isinstance(value, float):
+        return f"{value:g}"
+    return str(value)
+
+
+def encode_pairs(values: Optional[Dict[str, Any]], keys: Iterable[Tuple[str, str]]) -> str:
+    """Encodes selected entries as `short=value;...`, skipping missing ones."""
+    if not values:
+        return ""
+    parts = []
+    for key, short in keys:
+        value = values.get(key)
+        if value is None or value == "" or value == []:
+            continue
+        parts.append(f"{short}={_format_value(value)}")
+    return ";".join(parts)
+
+
+def encode_energy_rle(energy_pattern: Optional[Dict[int, float]], precision: int = 1) -> str:
+    """
+    Run-length encodes an hourly energy pattern.
+
+    Example: {0: 0.2, 1: 0.2, ..., 9: 0.9} -> "0-5:0.2 6-8:0.5 9:0.9 ..."
+
+    Args:
+        energy_pattern: Hour (0-23) -> level (0-1).
+        precision: Decimal places kept; neighbouring hours that round to the
+            same level are merged.
+    """
+    if not energy_pattern:
+        return ""
+    return _energy_rle(tuple(sorted((int(hour), float(level)) for hour, level in energy_pattern.items())), precision)
+
+
+@lru_cache(maxsize=1024)
+def _energy_rle(pattern: Tuple[Tuple[int, float], ...], precision: int) -> str:
+    runs: List[List[Any]] = []
+    for hour, level in pattern:
+        level = round(level, precision)
+        if runs and runs[-1][2] == level and runs[-1][1] == hour - 1:
+            runs[-1][1] = hour
+        else:
+            runs.append([hour, hour, level])
+    return " ".join(
+        f"{start}:{level:g}" if start == end else f"{start}-{end}:{level:g}"
+        for start, end, level in runs
+    )
+
+
+def encode_skeleton(solver_schedule: Optional[Sequence[Any]], tasks: Sequence[Any]) -> str:
+    """
+    Encodes the solver skeleton as `start-end|name|task_id` lines (minutes).
+
+    Solver output only carries task ids; names come from the input tasks.
+    """
+    if not solver_schedule:
+        return ""
+    titles = {str(getattr(task, "id", "")): getattr(task, "title", "") for task in tasks}
+    lines = []
+    for item in sorted(solver_schedule, key=lambda entry: entry.start_time):
+        task_id = str(item.task_id)
+        lines.append(
+            f"{to_minutes(item.start_time)}-{to_minutes(item.end_time)}|{titles.get(task_id, 'Task')}|{task_id}"
+        )
+    return "\n".join(lines)
+
+
+def encode_fixed_events(fixed_events: Sequence[Dict[str, Any]]) -> str:
+    """Encodes fixed events as `start-end|name` lines (minutes)."""
+    lines = []
+    for event in fixed_events:
+        start, end = to_minutes(event.get("start_time")), to_minutes(event.get("end_time"))
+        if start is None or end is None:
+            continue
+        lines.append(f"{start}-{end}|{event.get('name', event.get('id', 'Fixed Event'))}")
+    return "\n".join(lines)
+
+
+def encode_tasks(tasks: Sequence[Any]) -> str:
+    """Encodes tasks as `title|minutes|priority|energy[|deadline]` lines."""
+    lines = []
+    for task in tasks:
+        fields = [
+            str(task.title),
+            str(int(task.duration.total_seconds() // 60)),
+            task.priority.name,
+            task.energy_level.name,
+        ]
+        if getattr(task, "deadline", None):
+            fields.append(task.deadline.strftime("%Y-%m-%d %H:%M"))
+        lines.append("|".join(fields))
+    return "\n".join(lines)
+
+
+def encode_standard_activities(preferences: Dict[str, Any]) -> str:
+    """Encodes meal and routine preferences as `name@HH:MM/minutes` entries."""
+    meals = preferences.get("meals", {})
+    routines = preferences.get("routines", {})
+    return ", ".join([
+        f"breakfast@{meals.get('breakfast_time', '08:00')}/{meals.get('duration_minutes', 30)}",
+        f"lunch@{meals.get('lunch_time', '13:00')}/{meals.get('duration_minutes', 45)}",
+        f"dinner@{meals.get('dinner_time', '19:00')}/{meals.get('duration_minutes', 45)}",
+        f"morning_routine/{routines.get('morning_duration_minutes', 30)} (after waking)",
+        f"evening_routine/{routines.get('evening_duration_minutes', 45)} (before sleep)",
+    ])
+
+
+def encode_activity_goals(goals: Sequence[Dict[str, Any]]) -> str:
+    """Encodes activity goals as `name|minutes|frequency|preferred times` lines."""
+    return "\n".join(
+        f"{goal.get('name', 'Unnamed Activity')}|{goal.get('duration_minutes', 60)}|"
+        f"{goal.get('frequency', 'as possible')}|{_format_value(goal.get('preferred_time', ['any']))}"
+        for goal in goals
+    )
+
+
+def encode_sleep(sleep_recommendation: Any) -> str:
+    """Encodes a sleep recommendation as `HH:MM-HH:MM (N.Nh)`; empty if not available."""
+    if sleep_recommendation is None:
+        return ""
+    duration = getattr(sleep_recommendation, "ideal_duration", None)
+    return _sleep(
+        getattr(sleep_recommendation, "ideal_bedtime", None),
+        getattr(sleep_recommendation, "ideal_wake_time", None),
+        duration.total_seconds() if duration else None,
+    )
+
+
+@lru_cache(maxsize=1024)
+def _sleep(bedtime: Optional[time], wake_time: Optional[time], seconds: Optional[float]) -> str:
+    bed = bedtime.strftime("%H:%M") if bedtime else "N/A"
+    wake = wake_time.strftime("%H:%M") if wake_time else "N/A"
+    hours = f"{seconds / 3600:.1f}h" if seconds else "N/A"
+    return f"{bed}-{wake} ({hours})"
+
+
+def compact_context(
+    context: Any,
+    solver_schedule: Optional[Sequence[Any]] = None,
+) -> Dict[str, Any]:
+    """
+    Precomputes the compact encodings of a ScheduleGenerationContext.
+
+    Returns:
+        Dict[str, Any]: Template variables (strings; empty when not available).
+    """
+    historical = context.historical_insights or {}
+    rag = context.rag_context
+    profile = context.user_profile
+    return {
+        "chronotype": profile.primary_chronotype.value if profile else "Unknown",
+        "age": getattr(profile, "age", None) or "Unknown",
+        "date_iso": context.target_date.isoformat(),
+        "weekday": context.target_date.strftime("%A"),
+        "sleep_compact": encode_sleep(context.sleep_recommendation),
+        "skeleton_compact": encode_skeleton(solver_schedule, context.tasks),
+        "tasks_compact": encode_tasks(context.tasks),
+        "fixed_events_compact": encode_fixed_events(context.fixed_events),
+        "standard_activities_compact": encode_standard_activities(context.preferences),
+        "activity_goals_compact": encode_activity_goals(context.preferences.get("activity_goals", [])),
+        "energy_rle": encode_energy_rle(context.energy_pattern),
+        "wearables_compact": encode_pairs(context.wearable_insights, WEARABLE_KEYS),
+        "historical_compact": encode_pairs(historical, HISTORICAL_KEYS),
+        "day_patterns_compact": encode_pairs(historical.get("day_specific_patterns"), DAY_PATTERN_KEYS),
+        "rag_compact": "; ".join(rag.best_practices) if rag and getattr(rag, "best_practices", None) else "",
+        "previous_feedback_compact": compact_json(context.previous_feedback) if context.previous_feedback else "",
+    }
@@ -0,0 +1,98 @@
+# === File: schedules-ai/src/utils/async_bridge.py ===
+
+"""
+Sync-to-Async Bridge.
+
+Runs coroutines from synchronous code on one long-lived event loop in a
+daemon thread, so blocking entry points (scripts, legacy sync APIs) reuse the
+async implementation - and its connection pool - instead of keeping a second,
+blocking I/O path. A fresh `asyncio.run` per call would pay loop and session
+setup every time.
+
+Coroutines submitted here run on the background loop; loop-bound resources
+(e.g. aiohttp sessions) must be created on it (see `in_background_loop`).
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Any, Coroutine, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
+
+class BackgroundLoop:
+    """Event loop running forever on a daemon thread, started on first use."""
+
+    def __init__(self, name: str = "async-bridge") -> None:
+        self._name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._thread is None or not self._thread.is_alive():
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run() -> None:
+                    asyncio.set_event_loop(loop)
+                    ready.set()
+                    loop.run_forever()
+
+                thread = threading.Thread(target=run, name=self._name, daemon=True)
+                thread.start()
+                ready.wait()
+                self._loop, self._thread = loop, thread
+                logger.debug(f"Started background event loop '{self._name}'.")
+            return self._loop
+
+    def is_current(self) -> bool:
+        """Whether the caller is running on this background loop."""
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def run(self, coro: Coroutine[Any, Any, _T], timeout: Optional[float] = None) -> _T:
+        """
+        Runs `coro` on the background loop and blocks until it finishes.
+
+        Args:
+            coro: Coroutine to run.
+            timeout: Seconds to wait; the coroutine is cancelled on timeout.
+
+        Raises:
+            RuntimeError: If called from a running event loop (await the
+                coroutine there instead; blocking would stall that loop).
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            coro.close()
+            raise RuntimeError("Synchronous wrapper called from a running event loop; await the async API instead.")
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise
+
+
+_default_loop = BackgroundLoop()
+
+
+def run_sync(coro: Coroutine[Any, Any, _T], timeout: Optional[float] = None) -> _T:
+    """Runs `coro` on the shared background loop (see `BackgroundLoop.run`)."""
+    return _default_loop.run(coro, timeout)
+
+
+def in_background_loop() -> bool:
+    """Whether the caller is running on the shared background loop."""
+    return _default_loop.is_current()
@@ -156,6 +156,12 @@ def test_generate_schedule_endpoint(
               pytest.fail(f"Test ID '{test_id}': Failed to parse 422 JSON response or assertions failed: {e}\nResponse: {response.text}")
 
 
+def test_generate_schedules_bulk_rejects_empty_batch(client: TestClient):
+    """POST /v1/schedule/generate/bulk requires at least one item."""
+    response = client.post("/v1/schedule/generate/bulk", json={"requests": []})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+
 # TODO: Add test for GET /v1/schedule/{user_id}/{target_date} endpoint
 # This will require mocking the data storage layer or setting up test data.
 
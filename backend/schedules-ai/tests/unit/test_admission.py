@@ -0,0 +1,54 @@
+# === File: schedules-ai/tests/unit/test_admission.py ===
+
+"""
+Unit Tests for Admission Control of Generation Endpoints.
+"""
+
+import asyncio
+
+import pytest
+
+from api.admission import AdmissionController, AdmissionRejected
+
+
+@pytest.mark.asyncio
+async def test_over_capacity_requests_wait_in_order_then_are_shed():
+    controller = AdmissionController({"max_concurrent": 1, "max_per_user": 5, "max_queued": 1})
+    first = await controller.acquire("ada")
+    waiting = asyncio.ensure_future(controller.acquire("bea"))
+    await asyncio.sleep(0)
+    assert controller.stats()["queued"] == 1
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        await controller.acquire("cid")
+    assert rejected.value.status_code == 503 and rejected.value.retry_after >= 1
+
+    first.release()
+    first.release()  # Idempotent.
+    second = await waiting
+    assert second.user_id == "bea"
+    assert controller.stats()["running"] == 1 and controller.stats()["queued"] == 0
+    second.release()
+    assert controller.stats()["running"] == 0
+    assert controller.stats()["rejected"] == {"user_limit": 0, "queue_full": 1, "queue_timeout": 0}
+
+
+@pytest.mark.asyncio
+async def test_per_user_limit_and_queue_timeout():
+    controller = AdmissionController(
+        {"max_concurrent": 1, "max_per_user": 1, "max_queued": 4, "queue_timeout_seconds": 0.05}
+    )
+    async with controller.admit("ada"):
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("ada")
+        assert rejected.value.status_code == 429
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("bea")
+        assert rejected.value.status_code == 503
+    assert controller.stats()["running"] == 0 and controller.stats()["queued"] == 0
+
+    # Slots of timed-out waiters are not leaked.
+    async with controller.admit("bea") as ticket:
+        assert ticket.queue_wait == 0.0
+    assert controller.stats()["rejected"] == {"user_limit": 1, "queue_full": 0, "queue_timeout": 1}
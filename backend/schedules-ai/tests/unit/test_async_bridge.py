@@ -0,0 +1,55 @@
+# === File: schedules-ai/tests/unit/test_async_bridge.py ===
+
+"""
+Unit Tests for the Sync-to-Async Bridge.
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from src.utils.async_bridge import BackgroundLoop, in_background_loop, run_sync
+
+
+def test_run_sync_reuses_one_background_loop():
+    async def where():
+        return threading.current_thread().name, asyncio.get_running_loop(), in_background_loop()
+
+    first = run_sync(where())
+    second = run_sync(where())
+
+    assert first[0] != threading.current_thread().name
+    assert first[1] is second[1]
+    assert first[2] is True
+    assert in_background_loop() is False
+
+
+def test_errors_propagate_and_timeouts_cancel():
+    bridge = BackgroundLoop(name="test-bridge")
+    cancelled = threading.Event()
+
+    async def fail():
+        raise ValueError("boom")
+
+    async def slow():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    with pytest.raises(ValueError, match="boom"):
+        bridge.run(fail())
+    with pytest.raises(TimeoutError):
+        bridge.run(slow(), timeout=0.05)
+    assert cancelled.wait(1.0)
+
+
+@pytest.mark.asyncio
+async def test_run_sync_refuses_to_block_a_running_loop():
+    async def noop():
+        return None
+
+    with pytest.raises(RuntimeError):
+        run_sync(noop())
@@ -0,0 +1,99 @@
+# === File: schedules-ai/tests/unit/test_generation_queue.py ===
+
+"""
+Unit Tests for the Asynchronous Generation Job Queue (in-process broker).
+"""
+
+import asyncio
+from uuid import uuid4
+
+import pytest
+
+from api.jobs.generation_queue import (
+    GenerationJobQueue,
+    InProcessBroker,
+    JobBrokerProtocol,
+    JobStatus,
+    QueueFullError,
+)
+
+
+async def wait_terminal(queue, job_id):
+    for _ in range(100):
+        job = queue.get(job_id)
+        if job.status.is_terminal:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("Job did not finish.")
+
+
+@pytest.mark.asyncio
+async def test_workers_run_jobs_and_record_result_or_error():
+    async def handler(payload):
+        if payload.get("fail"):
+            raise ValueError("no feasible schedule")
+        return {"echo": payload["value"]}
+
+    queue = GenerationJobQueue({"workers": 2})
+    await queue.start(handler)
+    try:
+        ok = await queue.submit(uuid4(), {"value": 7})
+        bad = await queue.submit(uuid4(), {"fail": True})
+        assert queue.get(ok.job_id).status in (JobStatus.QUEUED, JobStatus.RUNNING)
+
+        ok_job, bad_job = await wait_terminal(queue, ok.job_id), await wait_terminal(queue, bad.job_id)
+    finally:
+        await queue.stop()
+
+    assert ok_job.status is JobStatus.SUCCEEDED and ok_job.result == {"echo": 7}
+    assert bad_job.status is JobStatus.FAILED and bad_job.error == "no feasible schedule"
+    assert queue.stats()["jobs"] == {"succeeded": 1, "failed": 1}
+    assert queue.get(uuid4()) is None
+
+
+@pytest.mark.asyncio
+async def test_submit_rejects_jobs_over_capacity():
+    queue = GenerationJobQueue({"workers": 0, "max_queued": 2})
+    await queue.submit(uuid4(), {})
+    await queue.submit(uuid4(), {})
+
+    with pytest.raises(QueueFullError):
+        await queue.submit(uuid4(), {})
+    assert queue.stats()["queue_depth"] == 2
+    assert queue.stats()["jobs"] == {"queued": 2}
+
+
+def test_queue_restarts_on_a_new_event_loop():
+    async def handler(payload):
+        return {"echo": payload["value"]}
+
+    queue = GenerationJobQueue({"workers": 1})
+
+    async def lifespan(value):
+        await queue.start(handler)
+        try:
+            job = await queue.submit(uuid4(), {"value": value})
+            return await wait_terminal(queue, job.job_id)
+        finally:
+            await queue.stop()
+
+    # E.g. two test clients: each lifespan runs on its own loop.
+    for value in (1, 2):
+        job = asyncio.run(lifespan(value))
+        assert job.status is JobStatus.SUCCEEDED and job.result == {"echo": value}
+
+
+def test_incomplete_broker_fails_on_construction():
+    class NoStatusBroker(JobBrokerProtocol):
+        async def start(self, on_status, consume=True):
+            pass
+
+        async def publish(self, message):
+            pass
+
+        async def receive(self):
+            pass
+
+    with pytest.raises(TypeError):
+        NoStatusBroker()
+    assert InProcessBroker().depth() == 0
@@ -0,0 +1,69 @@
+# === File: schedules-ai/tests/unit/test_idempotency.py ===
+
+"""
+Unit Tests for Idempotency Keys.
+"""
+
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+from api.idempotency import (
+    IdempotencyKeyConflict,
+    IdempotencyStore,
+    request_fingerprint,
+)
+
+
+@pytest.mark.asyncio
+async def test_duplicates_wait_for_the_first_result_and_replay_it():
+    store = IdempotencyStore()
+    calls = []
+
+    async def produce():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"schedule_id": "s1"}
+
+    fingerprint = request_fingerprint({"user": "ada"})
+    results = await asyncio.gather(*(store.run("generate:ada", "k1", fingerprint, produce, 201) for _ in range(3)))
+    later, replayed = await store.run("generate:ada", "k1", fingerprint, produce, 201)
+
+    assert len(calls) == 1
+    assert [r[1] for r in results] == [False, True, True] and replayed
+    assert later.status_code == 201 and later.body == {"schedule_id": "s1"}
+    response = later.to_response(replayed)
+    assert response.headers["Idempotent-Replayed"] == "true" and json.loads(response.body) == later.body
+    assert store.stats() == {"entries": 1, "executed": 1, "replayed": 3, "coalesced": 2, "conflicts": 0}
+
+    with pytest.raises(IdempotencyKeyConflict):
+        await store.run("generate:ada", "k1", request_fingerprint({"user": "bea"}), produce)
+    _, replayed = await store.run("generate:bea", "k1", fingerprint, produce)  # Scoped per user.
+    assert not replayed and len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_failures_are_not_stored_and_entries_expire():
+    store = IdempotencyStore(ttl_seconds=0.05)
+    outcomes = [HTTPException(status_code=503), JSONResponse(status_code=409, content={}), {"ok": True}]
+
+    async def produce():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    with pytest.raises(HTTPException):
+        await store.run("create:ada", "k", "f", produce)
+    stored, _ = await store.run("create:ada", "k", "f", produce)
+    assert stored.status_code == 409
+    stored, replayed = await store.run("create:ada", "k", "f", produce)
+    assert stored.body == {"ok": True} and not replayed
+
+    await asyncio.sleep(0.06)
+    outcomes.append({"ok": "again"})
+    stored, replayed = await store.run("create:ada", "k", "f", produce)
+    assert stored.body == {"ok": "again"} and not replayed
@@ -0,0 +1,85 @@
+# === File: schedules-ai/tests/unit/test_llm_batching.py ===
+
+"""
+Unit Tests for Multi-user Batching of LLM Refinements.
+"""
+
+import asyncio
+import json
+from datetime import date
+from uuid import uuid4
+
+import pytest
+
+from src.services.llm_batching import pack_batches
+from src.services.llm_cache import LLMResponseCache
+from src.services.llm_engine import LLMEngine, ModelConfig, ScheduleGenerationContext
+from src.services.llm_limits import LLMPriority, llm_priority
+from tests.unit.test_llm_engine import FakeResponse, FakeSession
+
+
+def completion(content):
+    return FakeResponse({"choices": [{"message": {"content": content}}]})
+
+
+def refined(name):
+    return {"schedule": [{"type": "meal", "name": name, "start_time": "12:00", "end_time": "12:30"}]}
+
+
+@pytest.mark.asyncio
+async def test_background_refinements_share_one_call_and_are_split_per_user():
+    session = FakeSession(responses=[
+        completion(json.dumps({"u1": refined("Lunch A"), "u2": refined("Lunch B"), "u3": {"plan": []}})),
+        completion(json.dumps(refined("Lunch C"))),
+    ])
+    engine = LLMEngine(
+        ModelConfig(
+            LLM_PROVIDER="openrouter", OPENROUTER_API_KEY="test-key", LLM_MAX_RETRIES=0,
+            LLM_BATCH_WINDOW=0.01, LLM_MAX_OUTPUT_TOKENS=16384,
+        ),
+        session=session,
+        response_cache=LLMResponseCache(),
+    )
+    contexts = [
+        ScheduleGenerationContext(user_id=uuid4(), user_name=name, target_date=date.today())
+        for name in ("Ada", "Bea", "Cid")
+    ]
+
+    def repair(output):
+        return {**output, "repaired": True}
+
+    with llm_priority(LLMPriority.BACKGROUND):
+        results = await asyncio.gather(*(
+            engine.refine_and_complete_schedule([], context, repair=repair) for context in contexts
+        ))
+
+    assert [r["schedule"][0]["name"] for r in results] == ["Lunch A", "Lunch B", "Lunch C"]
+    assert all(r["repaired"] for r in results)
+    assert len(session.calls) == 2  # u3's entry was unusable, so it was refined individually.
+    batch_prompt = session.calls[0]["json"]["messages"][0]["content"]
+    assert "=== u1 ===" in batch_prompt and "Bea" in batch_prompt and "Cid" in batch_prompt
+    assert session.calls[0]["json"]["max_tokens"] == 3 * engine.config.llm_max_tokens
+    assert engine.batcher.stats() == {
+        "calls": 1, "batched_requests": 2, "unbatched_requests": 0, "failed_requests": 1,
+    }
+
+    # Batched results are cached under the individual prompt.
+    assert await engine.refine_and_complete_schedule([], contexts[0], repair=repair) == results[0]
+    assert len(session.calls) == 2
+
+
+def test_batches_are_bounded_by_context_window_and_size():
+    assert pack_batches([100, 100, 100, 100], 200, 400, 1100, 8) == [[0], [1], [2], [3]]
+    assert pack_batches([100, 100, 100, 100], 200, 400, 2300, 8) == [[0, 1, 2, 3]]
+    assert pack_batches([100, 100, 100, 100], 200, 400, 2300, 3) == [[0, 1, 2], [3]]
+    assert pack_batches([5000, 100, 100], 200, 400, 2300, 8) == [[0], [1, 2]]
+
+
+def test_batches_are_bounded_by_completion_cap():
+    assert pack_batches([100] * 5, 200, 2048, 32768, 8, max_output_tokens=4096) == [[0, 1], [2, 3], [4]]
+    assert pack_batches([100, 100], 200, 5000, 32768, 8, max_output_tokens=4096) == [[0], [1]]
+
+    engine = LLMEngine(ModelConfig(
+        LLM_PROVIDER="openrouter", OPENROUTER_API_KEY="test-key", LLM_MAX_TOKENS=2048, LLM_MAX_OUTPUT_TOKENS=4096,
+    ))
+    assert engine.batcher.max_output_tokens == 4096
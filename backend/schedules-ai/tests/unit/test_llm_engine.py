@@ -0,0 +1,392 @@
+# === File: schedules-ai/tests/unit/test_llm_engine.py ===
+
+"""
+Unit Tests for the LLMEngine Transport.
+
+Provider HTTP calls go through an in-memory fake session; no network access.
+"""
+
+import asyncio
+import json
+from datetime import date
+from typing import Any, Dict, List, Optional
+from uuid import uuid4
+
+import pytest
+
+from src.services.llm_cache import LLMResponseCache
+from src.services.llm_engine import (
+    EXPLANATION_FALLBACK,
+    InvalidLLMOutputError,
+    LLMEngine,
+    LLMRequestRejectedError,
+    ModelConfig,
+    ScheduleGenerationContext,
+)
+from src.services.llm_hedging import HEDGE, PRIMARY, HedgingPolicy
+from src.services.llm_limits import (
+    CircuitBreakerRegistry,
+    ProviderUnavailableError,
+    RateLimiterRegistry,
+)
+
+
+class FakeResponse:
+    def __init__(self, payload: Dict[str, Any], status: int = 200, headers: Optional[Dict[str, str]] = None):
+        self.status = status
+        self.headers = {"Content-Type": "application/json", **(headers or {})}
+        self._payload = payload
+
+    async def json(self):
+        return self._payload
+
+    async def text(self):
+        return str(self._payload)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeStreamContent:
+    def __init__(self, chunks: List[bytes]):
+        self._chunks = chunks
+
+    async def iter_any(self):
+        for chunk in self._chunks:
+            yield chunk
+
+
+class FakeStreamResponse(FakeResponse):
+    """Server-sent event stream split into arbitrary byte chunks."""
+
+    def __init__(self, events: List[Dict[str, Any]], chunk_size: int = 7):
+        super().__init__({})
+        body = "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+        raw = body.encode()
+        self.content = FakeStreamContent([raw[i:i + chunk_size] for i in range(0, len(raw), chunk_size)])
+
+
+class FakeSession:
+    """Minimal stand-in for aiohttp.ClientSession returning canned completions."""
+
+    def __init__(self, content: str = "hello", responses: Optional[List[FakeResponse]] = None):
+        self.closed = False
+        self.calls: List[Dict[str, Any]] = []
+        self.content = content
+        self.responses = list(responses or [])
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        self.calls.append({"url": url, "json": json, "headers": headers})
+        if self.responses:
+            return self.responses.pop(0)
+        return FakeResponse({"choices": [{"message": {"content": self.content}}]})
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def model_config():
+    return ModelConfig(LLM_PROVIDER="openrouter", OPENROUTER_API_KEY="test-key", LLM_MAX_RETRIES=0)
+
+
+@pytest.mark.asyncio
+async def test_engine_uses_injected_session_and_leaves_it_open(model_config):
+    session = FakeSession(content="refined")
+    engine = LLMEngine(model_config, session=session)
+
+    result = await engine._call_llm_async("prompt", temperature=0.1, max_tokens=10)
+    await engine.close()
+
+    assert result == "refined"
+    assert len(session.calls) == 1
+    assert session.calls[0]["url"].endswith("/chat/completions")
+    assert session.calls[0]["json"]["max_tokens"] == 10
+    assert session.closed is False
+
+
+@pytest.mark.asyncio
+async def test_response_cache_skips_provider_for_identical_prompt(model_config, tmp_path):
+    session = FakeSession(content="Because energy peaks in the morning.")
+    cache = LLMResponseCache(max_entries=4, sqlite_path=str(tmp_path / "llm_cache.sqlite"))
+    engine = LLMEngine(model_config, session=session, response_cache=cache)
+
+    first = await engine._call_llm_cached("prompt", lambda r: r.strip())
+    second = await engine._call_llm_cached("prompt", lambda r: r.strip())
+    other = await engine._call_llm_cached("prompt", lambda r: r.strip(), temperature=0.9)
+
+    assert first == second == other
+    assert len(session.calls) == 2  # Different temperature is a different key.
+
+    cache.clear()  # Memory tier gone; the SQLite tier still answers.
+    assert await engine._call_llm_cached("prompt", lambda r: r.strip()) == first
+    assert len(session.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_response_cache_ignores_unparseable_responses(model_config):
+    session = FakeSession(content="not json")
+    engine = LLMEngine(model_config, session=session, response_cache=LLMResponseCache())
+
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            await engine._call_llm_cached("prompt", lambda r: engine._process_schedule_response(r, "json"))
+
+    assert len(session.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins_are_not_cached_as_primary_responses(model_config):
+    def parse(response):
+        if response == "garbled":
+            raise ValueError("unparseable completion")
+        return response
+
+    session = FakeSession(content="garbled")
+    hedge = LLMEngine(
+        ModelConfig(LLM_PROVIDER="openrouter", OPENROUTER_API_KEY="test-key", LLM_MODEL_NAME="hedge/model"),
+        session=FakeSession(content="from hedge"),
+    )
+    cache = LLMResponseCache()
+    engine = LLMEngine(
+        model_config, session=session, response_cache=cache,
+        hedge_engine=hedge, hedging=HedgingPolicy(initial_delay=5),
+    )
+
+    assert await engine._call_llm_cached("prompt", parse) == "from hedge"  # Failed over.
+    temperature, max_tokens = model_config.llm_temperature, model_config.llm_max_tokens
+    assert await cache.get(engine._cache_key(PRIMARY, temperature, max_tokens, "prompt")) is None
+    assert await cache.get(engine._cache_key(HEDGE, temperature, max_tokens, "prompt")) == "from hedge"
+
+    session.content = "from primary"
+    assert await engine._call_llm_cached("prompt", parse) == "from primary"
+    assert len(session.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_share_one_request(model_config):
+    session = FakeSession(content="shared")
+    release = asyncio.Event()
+    original_post = session.post
+
+    def slow_post(*args, **kwargs):
+        response = original_post(*args, **kwargs)
+        enter = response.__aenter__
+
+        async def delayed_enter():
+            await release.wait()
+            return await enter()
+
+        response.__aenter__ = delayed_enter
+        return response
+
+    session.post = slow_post
+    engine = LLMEngine(model_config, session=session)
+
+    calls = [asyncio.ensure_future(engine._call_llm_async("same prompt")) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*calls)
+
+    assert results == ["shared"] * 5
+    assert len(session.calls) == 1
+    assert await engine._call_llm_async("same prompt") == "shared"
+    assert len(session.calls) == 2  # Not in flight any more: a new request is made.
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_call_honours_retry_after(model_config):
+    session = FakeSession(
+        content="after retry",
+        responses=[FakeResponse({"error": "rate limited"}, status=429, headers={"Retry-After": "0.05"})],
+    )
+    limits = RateLimiterRegistry({"default": {"requests_per_minute": 6000, "max_concurrency": 2}})
+    engine = LLMEngine(model_config.model_copy(update={"llm_max_retries": 1}), session=session, rate_limits=limits)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    result = await engine._call_llm_async("prompt")
+
+    assert result == "after retry"
+    assert len(session.calls) == 2
+    assert loop.time() - started >= 0.05
+    assert limits.stats()["openrouter"]["throttled"] == 1
+    assert limits.stats()["openrouter"]["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_breaker_fails_fast_without_provider_calls(model_config):
+    session = FakeSession(responses=[FakeResponse({"error": "down"}, status=502) for _ in range(2)])
+    breakers = CircuitBreakerRegistry({"default": {"min_calls": 2, "open_seconds": 60}})
+    engine = LLMEngine(model_config, session=session, circuit_breakers=breakers)
+
+    for prompt in ("a", "b"):
+        with pytest.raises(ValueError):
+            await engine._call_llm_async(prompt)
+    assert not engine.is_available()
+
+    with pytest.raises(ProviderUnavailableError):
+        await engine._call_llm_async("c")
+    assert len(session.calls) == 2
+    assert breakers.stats()["openrouter"]["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_not_retried_and_leave_the_breaker_closed():
+    session = FakeSession(responses=[FakeResponse({"error": "max_tokens too large"}, status=400) for _ in range(6)])
+    breakers = CircuitBreakerRegistry({"default": {"min_calls": 2, "open_seconds": 60}})
+    engine = LLMEngine(
+        ModelConfig(LLM_PROVIDER="openrouter", OPENROUTER_API_KEY="test-key", LLM_MAX_RETRIES=3, LLM_RETRY_DELAY=0),
+        session=session,
+        circuit_breakers=breakers,
+    )
+
+    for prompt in ("a", "b", "c"):
+        with pytest.raises(LLMRequestRejectedError):
+            await engine._call_llm_async(prompt)
+
+    assert len(session.calls) == 3  # No retries.
+    assert engine.is_available()
+    assert breakers.stats()["openrouter"]["state"] == "closed"
+
+
+@pytest.mark.asyncio
+async def test_stream_refined_schedule_emits_items_before_completion(model_config):
+    completion = json.dumps({
+        "schedule": [
+            {"type": "meal", "name": "Breakfast", "start_time": "07:30", "end_time": "08:00"},
+            {"type": "break", "name": "Walk", "start_time": "12:00", "end_time": "12:30"},
+        ],
+        "metrics": {},
+    })
+    deltas = [completion[i:i + 10] for i in range(0, len(completion), 10)]
+    session = FakeSession(responses=[
+        FakeStreamResponse([{"choices": [{"delta": {"content": delta}}]} for delta in deltas])
+    ])
+    engine = LLMEngine(model_config, session=session, response_cache=LLMResponseCache())
+    context = ScheduleGenerationContext(user_id=uuid4(), user_name="Test", target_date=date.today())
+
+    events = [event async for event in engine.stream_refined_schedule([], context)]
+
+    assert [e["type"] for e in events] == ["item", "item", "complete"]
+    assert events[0]["item"]["name"] == "Breakfast"
+    assert len(events[2]["schedule"]["schedule"]) == 2
+    assert session.calls[0]["json"]["stream"] is True
+
+    replayed = [event async for event in engine.stream_refined_schedule([], context)]
+    assert replayed == events
+    assert len(session.calls) == 1  # Served from the response cache.
+
+
+@pytest.mark.asyncio
+async def test_explain_schedule_items_batches_and_caches_per_item(model_config):
+    items = [
+        {"type": "task", "name": "Report", "start_time": "09:00", "end_time": "11:00"},
+        {"type": "meal", "name": "Lunch", "start_time": "12:30", "end_time": "13:00"},
+        {"type": "break", "name": "Walk", "start_time": "15:00", "end_time": "15:15"},
+    ]
+    session = FakeSession(content=json.dumps(
+        {"explanations": {"1": "Peak focus.", "2": "Midday meal.", "3": "Afternoon dip."}}
+    ))
+    engine = LLMEngine(model_config, session=session, response_cache=LLMResponseCache())
+    context = ScheduleGenerationContext(user_id=uuid4(), user_name="Test", target_date=date.today())
+
+    first = await engine.explain_schedule_items(items, context)
+    assert first == ["Peak focus.", "Midday meal.", "Afternoon dip."]
+    assert len(session.calls) == 1
+
+    session.content = json.dumps({"explanations": {"1": "Evening wind-down."}})
+    moved = dict(items[2], start_time="20:00", end_time="20:15")
+    second = await engine.explain_schedule_items([items[0], moved], context)
+
+    assert second == ["Peak focus.", "Evening wind-down."]
+    assert len(session.calls) == 2
+    prompt = session.calls[1]["json"]["messages"][0]["content"]
+    assert "Walk" in prompt and "Report" not in prompt
+
+
+def explanations_json(numbers, text):
+    return json.dumps({"explanations": {number: text for number in numbers}})
+
+
+class TruncatingSession(FakeSession):
+    """Explains every numbered item of the prompt, cutting the output at `max_tokens` (4 chars each)."""
+
+    def __init__(self, text: str, cut_first: Optional[int] = None):
+        super().__init__()
+        self.text = text
+        self.cut_first = cut_first
+
+    def post(self, url, json=None, headers=None, timeout=None):
+        self.calls.append({"url": url, "json": json, "headers": headers})
+        prompt = json["messages"][0]["content"]
+        numbers = [line.split(".")[0].strip() for line in prompt.splitlines() if line.strip()[:1].isdigit()]
+        content = explanations_json(numbers, self.text)
+        limit = json["max_tokens"] * 4
+        if self.cut_first is not None and len(self.calls) == 1:
+            limit = self.cut_first
+        return FakeResponse({"choices": [{"message": {"content": content[:limit]}}]})
+
+
+@pytest.mark.asyncio
+async def test_explanation_batches_fit_the_completion_cap_and_truncated_items_are_rerequested():
+    items = [
+        {"type": "task", "name": f"Task {n}", "start_time": f"{6 + n // 3:02d}:{n % 3 * 20:02d}", "end_time": "23:00"}
+        for n in range(40)
+    ]
+    context = ScheduleGenerationContext(user_id=uuid4(), user_name="Test", target_date=date.today())
+    config = ModelConfig(LLM_PROVIDER="openrouter", OPENROUTER_API_KEY="test-key", LLM_MAX_RETRIES=0, LLM_MAX_TOKENS=2048)
+    text = "Scheduled here because your energy is highest and nothing else competes for this slot. " * 3
+
+    session = TruncatingSession(text)
+    engine = LLMEngine(config, session=session)
+    assert EXPLANATION_FALLBACK not in await engine.explain_schedule_items(items, context)
+    assert len(session.calls) == 2  # (2048 - 50) // 80 = 24 items per batch.
+    assert all(call["json"]["max_tokens"] <= 2048 for call in session.calls)
+
+    # A response cut inside a key keeps its complete entries; the rest is asked again.
+    session = TruncatingSession(text, cut_first=len(text) * 10)
+    engine = LLMEngine(config, session=session)
+    assert EXPLANATION_FALLBACK not in await engine.explain_schedule_items(items, context)
+    assert len(session.calls) == 4
+    rerequested = session.calls[-1]["json"]["messages"][0]["content"]
+    assert "Task 23 " in rerequested and "Task 0 " not in rerequested
+
+
+@pytest.mark.asyncio
+async def test_refinement_is_rerequested_only_for_irreparable_output(model_config):
+    def completion(name):
+        return FakeResponse({"choices": [{"message": {"content": json.dumps(
+            {"schedule": [{"type": "meal", "name": name, "start_time": "12:00", "end_time": "12:30"}]}
+        )}}]})
+
+    session = FakeSession(responses=[completion("garbage"), completion("Lunch"), completion("Dinner")])
+    engine = LLMEngine(model_config, session=session, response_cache=LLMResponseCache())
+    context = ScheduleGenerationContext(user_id=uuid4(), user_name="Test", target_date=date.today())
+
+    def repair(output):
+        if output["schedule"][0]["name"] == "garbage":
+            raise InvalidLLMOutputError("ignored the skeleton")
+        return {**output, "repaired": True}
+
+    result = await engine.refine_and_complete_schedule([], context, repair=repair)
+
+    assert result["schedule"][0]["name"] == "Lunch"
+    assert result["repaired"] is True
+    assert len(session.calls) == 2
+    assert await engine.refine_and_complete_schedule([], context, repair=repair) == result
+    assert len(session.calls) == 2  # The repaired result is cached.
+
+
+@pytest.mark.asyncio
+async def test_local_model_uses_the_async_transport():
+    config = ModelConfig(LLM_PROVIDER="local", LLM_MAX_RETRIES=0)
+    session = FakeSession(responses=[FakeResponse({"choices": [{"text": "local answer"}]})])
+    engine = LLMEngine(config, session=session)
+
+    assert await engine._call_llm_async("prompt", temperature=0.1, max_tokens=10) == "local answer"
+    assert session.calls[0]["json"]["prompt"] == "prompt"
+    assert session.calls[0]["json"]["max_tokens"] == 10
@@ -0,0 +1,66 @@
+# === File: schedules-ai/tests/unit/test_llm_hedging.py ===
+
+"""
+Unit Tests for Hedged LLM Requests.
+"""
+
+import asyncio
+
+import pytest
+
+from src.services.llm_hedging import HEDGE, PRIMARY, HedgingPolicy, hedged_call
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_and_cancelled():
+    policy = HedgingPolicy(initial_delay=0.01)
+    primary_cancelled = asyncio.Event()
+
+    async def primary():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            primary_cancelled.set()
+            raise
+        return "primary"
+
+    async def fallback():
+        return "hedge"
+
+    result, origin = await hedged_call(primary, fallback, policy)
+    await asyncio.sleep(0)
+
+    assert (result, origin) == ("hedge", HEDGE)
+    assert primary_cancelled.is_set()
+    assert policy.stats()["hedged"] == policy.stats()["hedge_wins"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_primary_fails_over_and_fast_primary_is_not_hedged():
+    policy = HedgingPolicy(initial_delay=5)
+    fallback_calls = []
+
+    async def failing():
+        raise ValueError("unparseable completion")
+
+    async def fast():
+        return "primary"
+
+    async def fallback():
+        fallback_calls.append(1)
+        return "hedge"
+
+    assert await hedged_call(failing, fallback, policy) == ("hedge", HEDGE)
+    assert await hedged_call(fast, fallback, policy) == ("primary", PRIMARY)
+    assert len(fallback_calls) == 1
+    assert policy.stats()["samples"] == 1
+
+
+def test_delay_follows_latency_quantile():
+    policy = HedgingPolicy(quantile=0.9, initial_delay=8, min_delay=0.5, max_delay=30, min_samples=10)
+    assert policy.delay() == 8
+    for latency in range(1, 11):
+        policy.record(float(latency))
+    assert policy.delay() == 10.0
+    policy.record(100.0)
+    assert policy.delay() == 10.0
@@ -0,0 +1,94 @@
+# === File: schedules-ai/tests/unit/test_llm_limits.py ===
+
+"""
+Unit Tests for the LLM Provider Rate Limiter and Circuit Breaker.
+"""
+
+import asyncio
+
+import pytest
+
+from src.services.llm_limits import (
+    CircuitBreaker,
+    LLMPriority,
+    ProviderRateLimiter,
+    estimate_request_tokens,
+    llm_priority,
+    parse_retry_after,
+)
+
+
+@pytest.mark.asyncio
+async def test_interactive_calls_are_admitted_before_background():
+    limiter = ProviderRateLimiter("test", max_concurrency=1)
+    order = []
+
+    async def call(name, priority):
+        async with limiter.slot(priority=priority):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    blocker = await limiter.acquire()
+    waiting = [
+        asyncio.ensure_future(call("background-1", LLMPriority.BACKGROUND)),
+        asyncio.ensure_future(call("background-2", LLMPriority.BACKGROUND)),
+        asyncio.ensure_future(call("interactive", LLMPriority.INTERACTIVE)),
+    ]
+    await asyncio.sleep(0)
+    assert limiter.stats()["waiting"] == 3
+
+    limiter.release(blocker)
+    await asyncio.gather(*waiting)
+
+    assert order == ["interactive", "background-1", "background-2"]
+    assert limiter.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_penalty_pauses_admissions_and_priority_follows_context():
+    limiter = ProviderRateLimiter("test", requests_per_minute=6000)
+    limiter.penalize(0.05)
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    with llm_priority(LLMPriority.BACKGROUND):
+        permit = await limiter.acquire(estimated_tokens=10)
+    limiter.release(permit)
+
+    assert loop.time() - started >= 0.04
+    assert permit.priority is LLMPriority.BACKGROUND
+    assert limiter.stats()["throttled"] == 1
+
+
+def test_parse_retry_after_and_token_estimate():
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0  # In the past.
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after(None) is None
+    payload = {"messages": [{"role": "user", "content": "x" * 400}], "max_tokens": 50}
+    assert estimate_request_tokens(payload) == 150
+
+
+def test_circuit_breaker_opens_on_error_rate_and_recovers_through_probe():
+    breaker = CircuitBreaker("test", failure_rate=0.5, min_calls=4, open_seconds=0.0)
+    for success in (True, False, True):
+        assert breaker.allow()
+        breaker.record(success)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    breaker.record(False)  # 2 of 4 failed.
+    assert breaker.state == CircuitBreaker.OPEN
+
+    assert breaker.allow()  # Cool-down elapsed: this call is the probe.
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    breaker.open_seconds = 60.0
+    assert not breaker.allow()  # Only one probe at a time.
+    breaker.record(False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.available()
+
+    breaker.open_seconds = 0.0
+    assert breaker.allow()
+    breaker.record(True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.stats()["opened"] == 2
@@ -0,0 +1,77 @@
+# === File: schedules-ai/tests/unit/test_llm_parsing.py ===
+
+"""
+Unit Tests for LLM Schedule Response Parsing.
+
+`tests/fixtures/llm_responses` holds representative completions (clean,
+fenced, lenient JSON, truncated) shared with `scripts/benchmark_llm_parsing.py`.
+"""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from src.services.llm_parsing import (
+    REPAIRED,
+    STRICT,
+    IncrementalScheduleParser,
+    parse_llm_json,
+    parse_llm_json_tiered,
+)
+
+DOCUMENT = 'Here is the plan:\n```json\n' + json.dumps({
+    "schedule": [
+        {"type": "meal", "name": "Breakfast {light}", "start_time": "07:30", "end_time": "08:00"},
+        {"type": "task", "name": "Report \"Q3\"", "start_time": "09:00", "end_time": "11:00",
+         "details": {"tags": ["deep", "work"]}},
+    ],
+    "metrics": {"total_tasks": 1},
+}) + '\n```\nEnjoy!'
+
+
+def test_items_are_emitted_as_soon_as_they_close():
+    parser = IncrementalScheduleParser()
+    emitted_at = []
+    items = []
+    for position, char in enumerate(DOCUMENT):
+        for item in parser.feed(char):
+            emitted_at.append(position)
+            items.append(item)
+
+    assert [item["name"] for item in items] == ["Breakfast {light}", 'Report "Q3"']
+    assert items[1]["details"] == {"tags": ["deep", "work"]}
+    assert emitted_at[0] < DOCUMENT.index('"metrics"')
+    assert parser.text == DOCUMENT
+
+
+def test_nested_schedule_keys_and_broken_items_are_ignored():
+    parser = IncrementalScheduleParser()
+    text = '{"meta": {"schedule": [{"a": 1}]}, "schedule": [{"name": "ok"}, {"name": bad}]}'
+
+    assert parser.feed(text) == [{"name": "ok"}]
+    assert parser.items_emitted == 1
+
+
+CORPUS = Path(__file__).resolve().parent.parent / "fixtures" / "llm_responses"
+
+
+@pytest.mark.parametrize("path", sorted(CORPUS.glob("*.txt")), ids=lambda p: p.stem)
+def test_corpus_responses_parse_to_a_schedule(path):
+    data, tier = parse_llm_json_tiered(path.read_text(encoding="utf-8"))
+
+    assert isinstance(data, dict) and data["schedule"]
+    assert all(isinstance(item, dict) and "name" in item for item in data["schedule"])
+    if path.stem.endswith(("bare", "pretty", "fenced", "prose_around")):
+        assert tier == STRICT
+
+
+def test_truncated_response_keeps_complete_items_only():
+    text = '```json\n{"schedule": [{"name": "A"}, {"name": "B", "start_time": "09:'
+
+    data, tier = parse_llm_json_tiered(text)
+
+    assert tier == REPAIRED
+    assert data == {"schedule": [{"name": "A"}]}
+    with pytest.raises(ValueError):
+        parse_llm_json("no json here")
@@ -0,0 +1,74 @@
+# === File: schedules-ai/tests/unit/test_llm_replay.py ===
+
+"""
+Unit Tests for the Record/Replay LLM Provider.
+"""
+
+import json
+
+import pytest
+
+from src.services.llm_engine import LLMEngine, ModelConfig
+from src.services.llm_limits import RateLimiterRegistry
+from src.services.llm_replay import LatencyDistribution, ReplayStore, prompt_key
+from tests.unit.test_llm_engine import FakeSession
+
+
+def replay_config(path, **overrides):
+    settings = {"LLM_PROVIDER": "replay", "LLM_REPLAY_PATH": str(path), "LLM_MAX_RETRIES": 0, "LLM_RETRY_DELAY": 0}
+    return ModelConfig(**{**settings, **overrides})
+
+
+@pytest.mark.asyncio
+async def test_recorded_completions_are_replayed(tmp_path):
+    path = tmp_path / "recordings.jsonl"
+    ReplayStore(str(path)).record("known prompt", '{"schedule": []}', latency=0.01)
+    engine = LLMEngine(replay_config(path))
+
+    result = await engine._call_llm_async("known prompt")
+    streamed = "".join([delta async for delta in engine._stream_llm_async("known prompt", 0.3, 100)])
+    nearest = await engine._call_llm_async("prompt that was never recorded")
+
+    assert result == streamed == nearest == '{"schedule": []}'
+    assert engine._get_session().stats()["hits"] == 2
+    assert json.loads(path.read_text().splitlines()[0])["key"] == prompt_key("known prompt")
+
+    strict = LLMEngine(replay_config(path, LLM_REPLAY_STRICT=True))
+    with pytest.raises(ValueError):
+        await strict._call_llm_async("prompt that was never recorded")
+
+
+@pytest.mark.asyncio
+async def test_injected_rate_limits_go_through_retries_and_limiter(tmp_path):
+    path = tmp_path / "recordings.jsonl"
+    ReplayStore(str(path)).record("prompt", "answer")
+    limits = RateLimiterRegistry({"default": {"requests_per_minute": 6000, "max_concurrency": 4}})
+    engine = LLMEngine(
+        replay_config(path, LLM_MAX_RETRIES=2, LLM_REPLAY_RATE_LIMIT_RATE=1.0, LLM_REPLAY_RETRY_AFTER=0),
+        rate_limits=limits,
+    )
+
+    with pytest.raises(ValueError):
+        await engine._call_llm_async("prompt")
+
+    assert engine._get_session().stats()["injected_rate_limits"] == 3
+
+
+@pytest.mark.asyncio
+async def test_real_provider_completions_are_recorded(tmp_path):
+    path = tmp_path / "recordings.jsonl"
+    recording = LLMEngine(
+        ModelConfig(
+            LLM_PROVIDER="openrouter", OPENROUTER_API_KEY="test-key", LLM_MAX_RETRIES=0,
+            LLM_REPLAY_PATH=str(path), LLM_REPLAY_RECORD=True,
+        ),
+        session=FakeSession(content="recorded answer"),
+    )
+    await recording._call_llm_async("prompt")
+
+    replay = LLMEngine(replay_config(path, LLM_REPLAY_LATENCY="recorded", LLM_REPLAY_STRICT=True))
+
+    assert await replay._call_llm_async("prompt") == "recorded answer"
+    assert LatencyDistribution.parse("lognormal:1.5,0.6") == LatencyDistribution("lognormal", 1.5, 0.6)
+    with pytest.raises(ValueError):
+        LatencyDistribution.parse("uniform:1")
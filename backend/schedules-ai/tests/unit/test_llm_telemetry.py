@@ -0,0 +1,68 @@
+# === File: schedules-ai/tests/unit/test_llm_telemetry.py ===
+
+"""
+Unit Tests for LLM Call Telemetry.
+"""
+
+import pytest
+
+from src.services.llm_cache import LLMResponseCache
+from src.services.llm_engine import LLMEngine, ModelConfig
+from src.services.llm_telemetry import LLMTelemetry
+from tests.unit.test_llm_engine import FakeResponse, FakeSession
+
+MODEL = "mistralai/mixtral-8x7b-instruct"
+
+
+def config(**overrides):
+    settings = {
+        "LLM_PROVIDER": "openrouter", "OPENROUTER_API_KEY": "test-key", "LLM_MODEL_NAME": MODEL,
+        "LLM_MAX_RETRIES": 1, "LLM_RETRY_DELAY": 0,
+    }
+    return ModelConfig(**{**settings, **overrides})
+
+
+@pytest.mark.asyncio
+async def test_call_records_attempts_tokens_cost_and_cache_hits():
+    telemetry = LLMTelemetry({"prices_per_1k_tokens": {MODEL: {"prompt": 1.0, "completion": 2.0}}})
+    session = FakeSession(responses=[
+        FakeResponse({}, status=429, headers={"Retry-After": "0"}),
+        FakeResponse({
+            "choices": [{"message": {"content": "42"}}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150},
+        }),
+    ])
+    engine = LLMEngine(config(), session=session, response_cache=LLMResponseCache(), telemetry=telemetry)
+
+    assert await engine._call_llm_cached("prompt", int) == 42
+    assert await engine._call_llm_cached("prompt", int) == 42
+
+    stats = telemetry.stats()[f"openrouter/{MODEL}"]
+    assert stats["calls"] == 2
+    assert stats["cache_hits"] == 1
+    assert stats["outcomes"] == {"ok": 2}
+    assert (stats["attempts"], stats["rate_limited"]) == (2, 1)
+    assert (stats["prompt_tokens"], stats["completion_tokens"]) == (100, 50)
+    assert stats["cost_usd"] == pytest.approx(0.2)
+    assert stats["ttfb_seconds"]["p50"] is not None
+
+
+@pytest.mark.asyncio
+async def test_failures_are_classified_and_missing_usage_is_estimated():
+    telemetry = LLMTelemetry()
+    session = FakeSession(content="x" * 40)
+    engine = LLMEngine(config(), session=session, telemetry=telemetry)
+    await engine._call_llm_async("p" * 400)
+
+    throttled = FakeSession(responses=[
+        FakeResponse({}, status=429, headers={"Retry-After": "0"}),
+        FakeResponse({}, status=429, headers={"Retry-After": "0"}),
+    ])
+    engine = LLMEngine(config(), session=throttled, telemetry=telemetry)
+    with pytest.raises(ValueError):
+        await engine._call_llm_async("other prompt")
+
+    stats = telemetry.stats()[f"openrouter/{MODEL}"]
+    assert stats["outcomes"] == {"ok": 1, "rate_limited": 1}
+    assert stats["estimated_token_calls"] == 1
+    assert (stats["prompt_tokens"], stats["completion_tokens"]) == (100, 10)
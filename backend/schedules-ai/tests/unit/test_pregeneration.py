@@ -0,0 +1,74 @@
+# === File: schedules-ai/tests/unit/test_pregeneration.py ===
+
+"""
+Unit Tests for the Week-ahead Pre-generation Job.
+
+Uses an in-memory storage stand-in for `api.db` and a mocked Scheduler.
+"""
+
+from datetime import date, timedelta
+from unittest.mock import AsyncMock, MagicMock
+from uuid import uuid4
+
+import pytest
+
+from api.jobs.pregeneration import PregenerationJob, input_fingerprint
+from src.core.scheduler import GeneratedSchedule, ScheduleInputData
+
+
+class InMemoryStorage:
+    """Implements the pre-generation subset of `api.db` in memory."""
+
+    def __init__(self):
+        self.rows = {}
+
+    async def save_pregenerated_schedule(self, user_id, target_date, input_hash, schedule_data):
+        self.rows[(user_id, target_date)] = {"input_hash": input_hash, "schedule_data": schedule_data}
+        return True
+
+    async def get_pregenerated_schedule(self, user_id, target_date):
+        return self.rows.get((user_id, target_date))
+
+    async def delete_pregenerated_schedules(self, user_id, keep_input_hash=None):
+        stale = [k for k, v in self.rows.items() if k[0] == user_id and v["input_hash"] != keep_input_hash]
+        for key in stale:
+            del self.rows[key]
+        return len(stale)
+
+
+@pytest.fixture
+def job():
+    scheduler = MagicMock(name="MockScheduler")
+
+    async def generate(input_data, defer_refinement=None):
+        return GeneratedSchedule(
+            user_id=input_data.user_id,
+            target_date=input_data.target_date,
+            scheduled_items=[{"type": "task", "name": "Task", "start_time": "09:00", "end_time": "10:00"}],
+        )
+
+    scheduler.generate_schedule = AsyncMock(side_effect=generate)
+    return PregenerationJob(
+        scheduler_factory=lambda: scheduler,
+        config={"enabled": True, "days_ahead": 2, "max_per_minute": 0},
+        storage=InMemoryStorage(),
+    )
+
+
+@pytest.mark.asyncio
+async def test_run_once_pregenerates_and_serves_until_inputs_change(job):
+    """Schedules are generated for the next days, served while fresh and dropped on input change."""
+    today = date.today()
+    input_data = ScheduleInputData(user_id=uuid4(), target_date=today, tasks=[])
+    await job.note_request(input_data, input_fingerprint({"tasks": []}))
+
+    assert await job.run_once(today=today) == 2
+    assert await job.run_once(today=today) == 0  # Already up to date.
+
+    served = await job.get_fresh(input_data.user_id, today + timedelta(days=1))
+    assert served is not None
+    assert served.target_date == today + timedelta(days=1)
+    assert served.scheduled_items[0]["name"] == "Task"
+
+    await job.note_request(input_data, input_fingerprint({"tasks": ["changed"]}))
+    assert await job.get_fresh(input_data.user_id, today + timedelta(days=1)) is None
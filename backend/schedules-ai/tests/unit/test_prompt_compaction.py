@@ -0,0 +1,71 @@
+# === File: schedules-ai/tests/unit/test_prompt_compaction.py ===
+
+"""
+Unit Tests for Compact Prompt Encoding and Token Budgeting.
+"""
+
+from datetime import date, time, timedelta
+from uuid import uuid4
+
+import pytest
+from jinja2.exceptions import SecurityError
+
+from src.core.constraint_solver import ScheduledTaskInfo
+from src.core.task_prioritizer import Task
+from src.services.llm_engine import (
+    LLMEngine,
+    ModelConfig,
+    ScheduleGenerationContext,
+    jinja_env,
+)
+from src.services.prompt_compaction import (
+    WEARABLE_KEYS,
+    _energy_rle,
+    encode_energy_rle,
+    encode_pairs,
+    encode_skeleton,
+)
+
+
+def test_energy_pattern_is_run_length_encoded():
+    pattern = {h: 0.2 for h in range(6)} | {6: 0.51, 7: 0.49, 8: 0.5} | {h: 0.9 for h in range(9, 24)}
+    assert encode_energy_rle(pattern) == "0-5:0.2 6-8:0.5 9-23:0.9"
+    assert encode_energy_rle(None) == ""
+
+
+def test_skeleton_uses_minute_offsets_and_task_titles():
+    task = Task(title="Report", duration=timedelta(hours=2))
+    skeleton = [ScheduledTaskInfo(task_id=task.id, start_time=time(9), end_time=time(11), task_date=date.today())]
+    assert encode_skeleton(skeleton, [task]) == f"540-660|Report|{task.id}"
+    assert encode_pairs({"sleep_quality": "Good", "steps_yesterday": None}, WEARABLE_KEYS) == "sleep_q=Good"
+
+
+def test_prompt_over_budget_drops_low_value_sections_first():
+    context = ScheduleGenerationContext(
+        user_id=uuid4(), user_name="Test", target_date=date.today(),
+        energy_pattern={h: 0.5 for h in range(24)},
+        wearable_insights={"sleep_quality": "Good"},
+        historical_insights={"typical_lunch": "13:05", "day_specific_patterns": {"productivity": "high"}},
+    )
+    roomy = LLMEngine(ModelConfig(LLM_PROVIDER="openrouter", OPENROUTER_API_KEY="x"))
+    full = roomy._build_prompt(roomy._prompt_template_refine, context)
+
+    budget = (len(full) - 60) // 4
+    tight = LLMEngine(ModelConfig(LLM_PROVIDER="openrouter", OPENROUTER_API_KEY="x", LLM_PROMPT_TOKEN_BUDGET=budget))
+    trimmed = tight._build_prompt(tight._prompt_template_refine, context)
+
+    assert "Historical Patterns" in full and "Patterns:** productivity=high" in full
+    assert "productivity=high" not in trimmed
+    assert "Energy (hour-range" in trimmed and "Wearables" in trimmed
+    assert len(trimmed) < len(full)
+
+
+def test_templates_are_sandboxed_and_profile_encodings_memoized():
+    with pytest.raises(SecurityError):
+        jinja_env.from_string("{% set levels = [] %}{{ levels.append(1) }}").render()
+
+    pattern = {h: 0.4 for h in range(24)}
+    encode_energy_rle(pattern)
+    hits = _energy_rle.cache_info().hits
+    assert encode_energy_rle(dict(pattern)) == "0-23:0.4"
+    assert _energy_rle.cache_info().hits == hits + 1
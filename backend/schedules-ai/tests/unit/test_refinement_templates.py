@@ -0,0 +1,63 @@
+# === File: schedules-ai/tests/unit/test_refinement_templates.py ===
+
+"""
+Unit Tests for Structural Templates of LLM Refinements.
+"""
+
+from src.core.refinement_templates import RefinementTemplateStore
+from src.core.schedule_repair import format_minutes
+
+
+def skeleton(shift=0):
+    """Sleep until 07:00, two adjacent tasks and sleep from 23:00, shifted by `shift` minutes."""
+    def block(start, end, meta):
+        return (start, end, {**meta, "start_time": format_minutes(start), "end_time": format_minutes(end)})
+
+    return [
+        block(0, 420 + shift, {"type": "fixed_event", "event_id": "sleep_next", "name": "Sleep Next"}),
+        block(540 + shift, 600 + shift, {"type": "task", "task_id": "a", "name": "Write"}),
+        block(600 + shift, 660 + shift, {"type": "task", "task_id": "b", "name": "Review"}),
+        block(1380, 1440, {"type": "fixed_event", "event_id": "sleep_prev", "name": "Sleep Prev"}),
+    ]
+
+
+REFINED = [
+    {"type": "routine", "name": "Morning Routine", "start_time": "07:00", "end_time": "07:30"},
+    {"type": "meal", "name": "Breakfast", "start_time": "07:30", "end_time": "08:00", "description": "Oats"},
+    {"type": "break", "name": "Walk", "start_time": "11:00", "end_time": "11:15"},
+    {"type": "meal", "name": "Lunch", "start_time": "12:30", "end_time": "13:15"},
+    {"type": "free_time", "name": "Free Time", "start_time": "13:15", "end_time": "22:00"},
+]
+PREFERENCES = {"meals": {"lunch_time": "12:30"}}
+
+
+def test_template_is_shifted_onto_matching_skeleton():
+    store = RefinementTemplateStore()
+    key, segments = store.signature(skeleton(), PREFERENCES, "intermediate")
+    store.put(key, REFINED, segments)
+
+    shifted = skeleton(shift=10)
+    shifted_key, shifted_segments = store.signature(shifted, PREFERENCES, "intermediate")
+    items = store.apply(shifted_key, shifted, shifted_segments)
+
+    assert shifted_key == key
+    by_name = {item["name"]: item for item in items}
+    assert (by_name["Breakfast"]["start_time"], by_name["Breakfast"]["end_time"]) == ("07:40", "08:10")
+    assert (by_name["Walk"]["start_time"], by_name["Write"]["start_time"]) == ("11:10", "09:10")
+    assert "description" not in by_name["Breakfast"]
+    assert store.stats()["hits"] == 1
+
+
+def test_different_structure_or_preferences_miss():
+    store = RefinementTemplateStore()
+    key, segments = store.signature(skeleton(), PREFERENCES, "intermediate")
+    store.put(key, REFINED, segments)
+
+    other_prefs_key, _ = store.signature(skeleton(), {"meals": {"lunch_time": "14:00"}}, "intermediate")
+    one_task = skeleton()[:2] + skeleton()[3:]
+    one_task_key, one_task_segments = store.signature(one_task, PREFERENCES, "intermediate")
+
+    assert other_prefs_key != key
+    assert one_task_key != key
+    assert store.apply(one_task_key, one_task, one_task_segments) is None
+    assert store.stats()["misses"] == 1
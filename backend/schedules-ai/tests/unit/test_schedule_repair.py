@@ -0,0 +1,61 @@
+# === File: schedules-ai/tests/unit/test_schedule_repair.py ===
+
+"""
+Unit Tests for Local Repair of LLM-Refined Schedules.
+"""
+
+from src.core.schedule_repair import parse_minutes, repair_llm_schedule
+
+ANCHORS = [
+    (540, 660, {"type": "task", "task_id": "t1", "name": "Report", "start_time": "09:00", "end_time": "11:00", "duration_minutes": 120}),
+    (720, 780, {"type": "fixed_event", "event_id": "team_lunch", "name": "Team Lunch", "start_time": "12:00", "end_time": "13:00", "duration_minutes": 60}),
+]
+
+
+def _assert_consistent(items):
+    spans = [(parse_minutes(i["start_time"]), parse_minutes(i["end_time"])) for i in items]
+    assert spans[0][0] == 0 and spans[-1][1] == 1440
+    assert all(prev[1] == nxt[0] for prev, nxt in zip(spans, spans[1:]))  # No overlaps, no holes.
+
+
+def test_moved_anchors_snap_back_and_flexible_items_are_shifted():
+    llm_items = [
+        {"type": "routine", "name": "Morning Routine", "start_time": "07:00", "end_time": "07:30"},
+        {"type": "meal", "name": "Breakfast", "start_time": "07:30", "end_time": "08:00"},
+        {"type": "task", "task_id": "t1", "name": "Report", "start_time": "09:30", "end_time": "11:30",
+         "description": "Deep work"},
+        {"type": "activity", "name": "Walk", "start_time": "11:40", "end_time": "12:10"},
+        {"type": "fixed_event", "name": "Team lunch", "start_time": "12:00", "end_time": "13:00"},
+        {"type": "task", "name": "Invented task", "start_time": "15:00", "end_time": "16:00"},
+        {"type": "activity", "name": "Gym", "start_time": "17:30", "end_time": "18:30"},
+        {"type": "meal", "name": "Dinner", "start_time": "19:00", "end_time": "18:00"},
+        {"type": "routine", "name": "Evening Routine", "start_time": "22:00", "end_time": "22:45"},
+    ]
+
+    items, report = repair_llm_schedule(llm_items, ANCHORS)
+
+    _assert_consistent(items)
+    report_task = next(i for i in items if i.get("task_id") == "t1")
+    assert (report_task["start_time"], report_task["end_time"]) == ("09:00", "11:00")
+    assert report_task["description"] == "Deep work"
+    walk = next(i for i in items if i["name"] == "Walk")
+    assert (walk["start_time"], walk["end_time"]) == ("11:30", "12:00")
+    assert not any(i["name"] in ("Invented task", "Dinner") for i in items)
+    assert (report.moved_anchors, report.shifted, report.dropped_unknown, report.dropped_invalid) == (1, 1, 1, 1)
+    assert report.restored_anchors == 0
+    assert not report.irreparable
+
+
+def test_output_ignoring_the_skeleton_is_irreparable():
+    llm_items = [
+        {"type": "task", "name": "Something else", "start_time": "08:00", "end_time": "09:00"},
+        {"type": "task", "task_id": "t1", "start_time": "14:00", "end_time": "16:00"},
+        {"type": "meal", "name": "Lunch", "start_time": "25:00", "end_time": "26:00"},
+    ]
+
+    items, report = repair_llm_schedule(llm_items, ANCHORS)
+
+    assert report.irreparable
+    assert report.restored_anchors == 1  # The fixed event was missing entirely.
+    _assert_consistent(items)
+    assert repair_llm_schedule([], ANCHORS)[1].irreparable
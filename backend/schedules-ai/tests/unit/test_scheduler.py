@@ -10,8 +10,9 @@ data preparation, and output formatting.
 """
 
 import logging
+from dataclasses import replace as dc_replace
 from datetime import date, time, timedelta
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 from uuid import uuid4
 
 import pytest
@@ -23,6 +24,9 @@ try:
     from src.core.chronotype import Chronotype, ChronotypeProfile
     from src.core.sleep import SleepMetrics
     from src.core.constraint_solver import ScheduledTaskInfo, SolverInput
+    from src.core.profile_cache import ProfileCache
+    from src.core.refinement import RefinementStatus, RefinementStore
+    from src.core.refinement_templates import RefinementTemplateStore
     # Import other necessary types
     SCHEDULER_AVAILABLE = True
 except ImportError as e:
@@ -40,6 +44,10 @@ except ImportError as e:
     class SleepMetrics: pass
     class ScheduledTaskInfo: pass
     class SolverInput: pass
+    class RefinementStatus: pass
+    class RefinementStore: pass
+    class ProfileCache: pass
+    class RefinementTemplateStore: pass
 
 
 # Skip all tests in this file if the core scheduler module isn't available
@@ -231,6 +239,147 @@ async def test_generate_schedule_invalid_fixed_event(scheduler_instance, sample_
     assert any(item['type'] == 'fixed_event' and item['event_id'] == 'lunch' for item in result.scheduled_items)
 
 
+@pytest.fixture
+def valid_input_data():
+    """Provides a ScheduleInputData built with the current field names."""
+    task = Task(id=uuid4(), title="Task 1", priority=TaskPriority.HIGH, energy_level=EnergyLevel.HIGH, duration=timedelta(hours=1))
+    return ScheduleInputData(
+        user_id=uuid4(),
+        target_date=date.today() + timedelta(days=1),
+        tasks=[task],
+        fixed_events_input=[{"id": "lunch", "start_time": "12:00", "end_time": "13:00"}],
+        user_profile_data={"age": 30, "meq_score": 50},
+    )
+
+
+@pytest.fixture
+def deferred_scheduler(mock_dependencies):
+    """Scheduler with an async LLM mock and a refinement store."""
+    mock_dependencies["llm_engine"].refine_and_complete_schedule = AsyncMock(
+        return_value={
+            "schedule": [{"type": "task", "name": "Task 1", "start_time": "09:00", "end_time": "10:00"}],
+            "metrics": {"energy_alignment_score": 90},
+            "explanations": {"optimization_focus": "energy"},
+        }
+    )
+    return Scheduler(**mock_dependencies, refinement_store=RefinementStore())
+
+
+@pytest.mark.asyncio
+async def test_generate_schedule_deferred_returns_deterministic_first(deferred_scheduler, valid_input_data):
+    """Deferred mode returns the solver schedule as version 1 and stores the LLM version later."""
+    result = await deferred_scheduler.generate_schedule(valid_input_data, defer_refinement=True)
+
+    assert result.version == 1
+    assert result.refinement_status == "pending"
+    assert result.scheduled_items
+    assert any(item["type"] == "task" for item in result.scheduled_items)
+
+    store = deferred_scheduler.refinement_store
+    record = await store.wait_for_change(result.schedule_id, timeout=1.0)
+    while record is not None and not record.status.is_terminal:
+        record = await store.wait_for_change(result.schedule_id, timeout=1.0)
+
+    assert record.status == RefinementStatus.COMPLETED
+    assert record.version == 2
+    assert record.schedule.schedule_id == result.schedule_id
+    assert record.schedule.refinement_status == "completed"
+    assert record.schedule.metrics == {"energy_alignment_score": 90}
+
+
+@pytest.mark.asyncio
+async def test_generate_schedule_deferred_failure_keeps_deterministic(deferred_scheduler, valid_input_data):
+    """A failed background refinement is recorded and the deterministic version stays current."""
+    deferred_scheduler.llm_engine.refine_and_complete_schedule.side_effect = RuntimeError("provider down")
+
+    result = await deferred_scheduler.generate_schedule(valid_input_data, defer_refinement=True)
+    store = deferred_scheduler.refinement_store
+    record = await store.wait_for_change(result.schedule_id, timeout=1.0)
+    while record is not None and not record.status.is_terminal:
+        record = await store.wait_for_change(result.schedule_id, timeout=1.0)
+
+    assert record.status == RefinementStatus.FAILED
+    assert "provider down" in record.error
+    assert record.version == 1
+    assert record.schedule is result
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_breaker_skips_refinement(deferred_scheduler, valid_input_data):
+    """While the provider's breaker is open the deterministic schedule is returned without an LLM call."""
+    deferred_scheduler.llm_engine.is_available = MagicMock(return_value=False)
+
+    result = await deferred_scheduler.generate_schedule(valid_input_data, defer_refinement=True)
+
+    assert result.refinement_status is None
+    assert any(item["type"] == "task" for item in result.scheduled_items)
+    assert any("niedostępny" in warning for warning in result.warnings)
+    deferred_scheduler.llm_engine.refine_and_complete_schedule.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_generate_many_shares_profile_per_user(deferred_scheduler, valid_input_data):
+    """Bulk generation prepares the profile once per user and yields every input."""
+    other_day = dc_replace(valid_input_data, target_date=valid_input_data.target_date + timedelta(days=1))
+    other_user = dc_replace(valid_input_data, user_id=uuid4())
+    inputs = [valid_input_data, other_day, other_user]
+
+    results = {index: schedule async for index, schedule in deferred_scheduler.generate_many(inputs)}
+
+    assert sorted(results) == [0, 1, 2]
+    assert results[1].target_date == other_day.target_date
+    assert results[2].user_id == other_user.user_id
+    assert all(r.scheduled_items for r in results.values())
+    assert deferred_scheduler.chronotype_analyzer.create_chronotype_profile.call_count == 2
+    assert deferred_scheduler.constraint_solver.solve.call_count == 3
+    assert deferred_scheduler.llm_engine.refine_and_complete_schedule.await_count == 3
+
+
+@pytest.mark.asyncio
+async def test_profile_cache_reused_until_invalidated(mock_dependencies, valid_input_data):
+    """Profile, sleep window and energy pattern are computed once per user until invalidated."""
+    mock_dependencies["llm_engine"] = None
+    cache = ProfileCache(max_entries=8)
+    scheduler = Scheduler(**mock_dependencies, profile_cache=cache)
+    analyzer = mock_dependencies["chronotype_analyzer"]
+    prioritizer = mock_dependencies["task_prioritizer"]
+
+    await scheduler.generate_schedule(valid_input_data)
+    await scheduler.generate_schedule(valid_input_data)
+
+    assert analyzer.create_chronotype_profile.call_count == 1
+    assert mock_dependencies["sleep_calculator"].calculate_sleep_window.call_count == 1
+    assert prioritizer.get_energy_pattern.call_count == 1
+
+    assert cache.invalidate_user(valid_input_data.user_id) == 1
+    await scheduler.generate_schedule(valid_input_data)
+    assert analyzer.create_chronotype_profile.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_matching_skeleton_reuses_refinement_template(mock_dependencies, valid_input_data):
+    """A second user with the same skeleton shape gets the LLM additions without another LLM call."""
+    mock_dependencies["llm_engine"].is_available = MagicMock(return_value=True)
+    mock_dependencies["llm_engine"].refine_and_complete_schedule = AsyncMock(
+        return_value={
+            "schedule": [
+                {"type": "meal", "name": "Breakfast", "start_time": "07:30", "end_time": "08:00"},
+                {"type": "task", "name": "Task", "start_time": "09:00", "end_time": "10:00"},
+            ],
+            "metrics": {"energy_alignment_score": 90},
+        }
+    )
+    templates = RefinementTemplateStore()
+    scheduler = Scheduler(**mock_dependencies, refinement_templates=templates)
+
+    await scheduler.generate_schedule(valid_input_data)
+    result = await scheduler.generate_schedule(dc_replace(valid_input_data, user_id=uuid4()))
+
+    mock_dependencies["llm_engine"].refine_and_complete_schedule.assert_awaited_once()
+    assert templates.stats()["hits"] == 1
+    breakfast = next(item for item in result.scheduled_items if item.get("name") == "Breakfast")
+    assert (breakfast["start_time"], breakfast["end_time"]) == ("07:30", "08:00")
+
 # TODO: Add more tests:
 # - Test with different chronotypes affecting results (requires mocking profile creation/loading).
 # - Test with different preferences affecting the scheduling window.
@@ -0,0 +1,104 @@
+# === File: schedules-ai/tests/unit/test_simulation.py ===
+
+"""
+Unit Tests for What-if Schedule Simulation.
+
+Covers applying variant deltas, diffing schedules and running a simulation
+batch without the LLM.
+"""
+
+from datetime import date, time, timedelta
+from unittest.mock import MagicMock
+from uuid import uuid4
+
+import pytest
+
+from src.core.chronotype import Chronotype, ChronotypeProfile
+from src.core.constraint_solver import ScheduledTaskInfo
+from src.core.scheduler import ScheduleInputData, Scheduler
+from src.core.simulation import ScheduleVariant, apply_variant, diff_schedules, simulate
+from src.core.sleep import SleepMetrics
+from src.core.task_prioritizer import Task
+
+
+@pytest.fixture
+def base_input():
+    return ScheduleInputData(
+        user_id=uuid4(),
+        target_date=date.today(),
+        tasks=[Task(title="Gym", duration=timedelta(hours=1)), Task(title="Report", duration=timedelta(hours=2))],
+        fixed_events_input=[{"id": "lunch", "start_time": "12:00", "end_time": "13:00"}],
+        preferences={"preferred_wake_time": "07:00"},
+    )
+
+
+def test_apply_variant_changes_only_the_copy(base_input):
+    gym, report = base_input.tasks
+    variant = ScheduleVariant(
+        name="Gym in the morning, no report",
+        remove_task_ids=(report.id,),
+        task_updates={gym.id: {"earliest_start": time(7, 30)}},
+        remove_fixed_event_ids=("lunch",),
+        preference_overrides={"preferred_wake_time": "06:30"},
+    )
+
+    result = apply_variant(base_input, variant)
+
+    assert [t.title for t in result.tasks] == ["Gym"]
+    assert result.tasks[0].earliest_start.replace(tzinfo=None) == time(7, 30)
+    assert result.fixed_events_input == []
+    assert result.preferences["preferred_wake_time"] == "06:30"
+    assert gym.earliest_start is None
+    assert len(base_input.tasks) == 2
+
+    with pytest.raises(ValueError):
+        apply_variant(base_input, ScheduleVariant(name="bad", remove_task_ids=(uuid4(),)))
+
+
+def test_diff_schedules_reports_added_removed_and_moved():
+    base = [
+        {"type": "task", "task_id": "a", "name": "Gym", "start_time": "18:00", "end_time": "19:00"},
+        {"type": "task", "task_id": "b", "name": "Report", "start_time": "09:00", "end_time": "11:00"},
+    ]
+    variant = [
+        {"type": "task", "task_id": "a", "name": "Gym", "start_time": "07:00", "end_time": "08:00"},
+        {"type": "break", "name": "Coffee", "start_time": "10:00", "end_time": "10:15"},
+    ]
+
+    changes = {c["change"]: c for c in diff_schedules(base, variant)}
+
+    assert changes["moved"]["previous_start_time"] == "18:00"
+    assert changes["moved"]["start_time"] == "07:00"
+    assert changes["added"]["name"] == "Coffee"
+    assert changes["removed"]["name"] == "Report"
+
+
+@pytest.mark.asyncio
+async def test_simulate_skips_llm_and_shares_profile(base_input):
+    analyzer = MagicMock()
+    analyzer.create_chronotype_profile.return_value = ChronotypeProfile(user_id=base_input.user_id, primary_chronotype=Chronotype.INTERMEDIATE)
+    sleep = MagicMock()
+    sleep.calculate_sleep_window.return_value = SleepMetrics(
+        ideal_duration=timedelta(hours=8), ideal_bedtime=time(23, 0), ideal_wake_time=time(7, 0)
+    )
+    prioritizer = MagicMock()
+    prioritizer.get_energy_pattern.return_value = {h: 0.5 for h in range(24)}
+    solver = MagicMock()
+    solver.solve.return_value = [
+        ScheduledTaskInfo(task_id=base_input.tasks[0].id, start_time=time(9, 0), end_time=time(10, 0), task_date=base_input.target_date)
+    ]
+    llm = MagicMock()
+    scheduler = Scheduler(
+        sleep_calculator=sleep, chronotype_analyzer=analyzer, task_prioritizer=prioritizer,
+        constraint_solver=solver, llm_engine=llm,
+    )
+    variants = [ScheduleVariant(name="A"), ScheduleVariant(name="B", remove_task_ids=(base_input.tasks[1].id,))]
+
+    result = await simulate(scheduler, base_input, variants)
+
+    assert [v.name for v in result.variants] == ["A", "B"]
+    assert all(not v.failed for v in result.variants)
+    assert result.variants[0].changes == []
+    assert solver.solve.call_count == 3
+    assert analyzer.create_chronotype_profile.call_count == 1
+    llm.refine_and_complete_schedule.assert_not_called()